@@ -83,7 +83,10 @@ create table cs425.tblCourses(
     description text,
     Credits int,
     Level varchar(25),
-	Requirements text
+	Requirements text,
+    updatedAt timestamp not null default current_timestamp on update current_timestamp,
+    index idx_courses_updated (updatedAt),
+    fulltext index ft_courses_text (courseName, description, Requirements)
 );
 
 /*Course Schedule*/
@@ -98,6 +101,8 @@ create table cs425.tblcourseSchedule(
     meetingDays varchar(75),
     startTime time,
     endTime time,
+    startMinute smallint as (hour(startTime) * 60 + minute(startTime)) stored, /*minute of the day*/
+    endMinute smallint as (hour(endTime) * 60 + minute(endTime)) stored,
     meetingTimes varchar(30),
     Location varchar(10),
     Instructor varchar(75),
@@ -107,12 +112,14 @@ create table cs425.tblcourseSchedule(
     enrollmentTotal int,
     availableSeats int,
     waitList int,
+    seatShards tinyint not null default 0, /*open seats are kept in tblSeatCounterShards when > 0*/
     classAttributes varchar(256),
     instructorID int,
     semesterID int,
     foreign key (courseID) references tblCourses(courseID),
 	foreign key (instructorID) references tblInstructor(instructorID),
-    foreign key (semesterID) references tblSemesters(semesterID)
+    foreign key (semesterID) references tblSemesters(semesterID),
+    index idx_courseSchedule_start (startMinute)
 );
 
 /*Semesters table*/
@@ -131,7 +138,8 @@ create table cs425.tblUserSchedule(
     scheduleID int,
     studentID int,
     foreign key (scheduleID) references tblcourseSchedule(scheduleID),
-    foreign key (studentID) references tblStudents(studentID)
+    foreign key (studentID) references tblStudents(studentID),
+    unique (studentID, scheduleID)
 );
 
 /*Custom Schedules table*/
@@ -152,6 +160,7 @@ create table cs425.tblCustomEvents(
     startTime varchar(10),
     endTime varchar(10),
     daysOfWeek varchar(255),
+    weekMask varbinary(252), /*7 days of 5 minute slots, see week_mask in backend.py*/
     foreign key (scheduleID) references tblCustomSchedules(scheduleID)
 );
 
@@ -173,6 +182,24 @@ CREATE TABLE cs425.tblUserCompletedCourses(
     foreign key (studentID) references tblStudents(studentID)
 );
 
+/*Degree progress summary of each student, kept current by the tblUserCompletedCourses triggers in triggers.sql.
+  Course levels are counted by the first digit of tblCourses.Level, RebuildDegreeProgress recomputes every row*/
+create table cs425.tblDegreeProgress(
+    studentID int primary key,
+    majorID int,
+    creditsReq int not null default 0,
+    completedCredits int not null default 0,
+    completedCourses int not null default 0,
+    courses100 int not null default 0,
+    courses200 int not null default 0,
+    courses300 int not null default 0,
+    courses400 int not null default 0,
+    coursesOther int not null default 0, /*graduate courses and courses without a level*/
+    percentComplete decimal(5,2) as (if(creditsReq > 0, least(100, completedCredits * 100 / creditsReq), 0)),
+    updatedAt timestamp not null default current_timestamp on update current_timestamp,
+    foreign key (studentID) references tblStudents(studentID)
+);
+
 /*Ratings table*/
 create table cs425.tblRatings(
     ratingID int primary key auto_increment,
@@ -309,3 +336,157 @@ create table cs425.tblGPA(
     unique (studentID, semesterID)
 );
 
+
+/*Rating summary per course, maintained by RefreshCourseRatingSummary*/
+create table cs425.tblCourseRatingSummary(
+    courseID int primary key,
+    ratingCount int not null default 0,
+    ratingTotal int not null default 0,
+    averageRating decimal(3,1) not null default 0,
+    frequentTags text,
+    tagCount int,
+    ratingVersion int not null default 0, /*tblCatalogVersion.ratingVersion of the last change*/
+    index idx_ratingSummary_version (ratingVersion),
+    foreign key (courseID) references tblCourses(courseID)
+);
+
+/*Materialized copy of vwCourseDetails used by course search, one row per section and major*/
+create table cs425.tblCourseDetails(
+    scheduleID int,
+    courseID int,
+    Section int,
+    courseName varchar(100),
+    courseCode varchar(25),
+    courseMajor varchar(50),
+    majorID int,
+    department varchar(75),
+    professors text,
+    term varchar(75),
+    format varchar(75),
+    units int,
+    meetingTime varchar(30),
+    startMinute smallint,
+    endMinute smallint,
+    Location varchar(10),
+    days varchar(75),
+    classCapacity int,
+    enrollmentTotal int,
+    availableSeats int,
+    averageRating decimal(3,1),
+    courseLevel varchar(25),
+    frequentTags text,
+    tagCount int,
+    primary key (scheduleID, majorID),
+    index idx_courseDetails_course (courseID),
+    index idx_courseDetails_major (courseMajor),
+    index idx_courseDetails_majorID (majorID),
+    index idx_courseDetails_order (courseLevel, courseCode),
+    index idx_courseDetails_term (term),
+    index idx_courseDetails_format (format),
+    index idx_courseDetails_location (Location),
+    index idx_courseDetails_rating (averageRating),
+    index idx_courseDetails_start (startMinute)
+);
+
+/*One row per section meeting, minutes counted from Monday 00:00*/
+create table cs425.tblSectionMeetings(
+    scheduleID int,
+    dayOfWeek tinyint, /*0 = Monday*/
+    weekStart smallint,
+    weekEnd smallint,
+    primary key (scheduleID, dayOfWeek),
+    index idx_sectionMeetings_interval (weekStart, weekEnd),
+    foreign key (scheduleID) references tblcourseSchedule(scheduleID)
+);
+
+/*Single row version counters, catalogVersion is bumped whenever tblCourseDetails changes apart from
+  seat counts and ratings, ratingVersion whenever a rating summary changes*/
+create table cs425.tblCatalogVersion(
+    id int primary key,
+    catalogVersion int not null default 0,
+    ratingVersion int not null default 0
+);
+
+insert into cs425.tblCatalogVersion (id, catalogVersion) values (1, 0);
+
+/*Version of each cached reference dataset (majors, tags, semesters), bumped by the triggers on
+  tblMajor, tblTags and tblSemesters so every backend process reloads its copy. 'users' is bumped by the
+  backend when a profile changes and clears the user caches*/
+create table cs425.tblReferenceVersions(
+    name varchar(20) primary key,
+    version int not null default 0
+);
+
+insert into cs425.tblReferenceVersions (name, version) values ('majors', 0), ('tags', 0), ('semesters', 0), ('users', 0);
+
+/*Waitlist, one row per student waiting for a full section, waitlistID gives the arrival order*/
+create table cs425.tblWaitlist(
+    waitlistID bigint primary key auto_increment,
+    scheduleID int not null,
+    studentID int not null,
+    status varchar(10) not null default 'waiting', /*waiting, promoted or cancelled*/
+    createdAt timestamp not null default current_timestamp,
+    promotedAt timestamp null,
+    notifyBatch varchar(32),
+    notifiedAt timestamp null,
+    unique key uq_waitlist_student (scheduleID, studentID),
+    index idx_waitlist_queue (scheduleID, status, waitlistID),
+    index idx_waitlist_notify (status, notifiedAt),
+    foreign key (scheduleID) references tblcourseSchedule(scheduleID),
+    foreign key (studentID) references tblStudents(studentID)
+);
+
+/*Responses of POST requests sent with an Idempotency-Key header, statusCode is null while the request runs*/
+create table cs425.tblIdempotencyKeys(
+    idempotencyKey varchar(200) primary key, /*userID:endpoint:key*/
+    requestHash char(64) not null,
+    statusCode smallint,
+    responseBody mediumtext,
+    createdAt timestamp not null default current_timestamp,
+    index idx_idempotency_created (createdAt)
+);
+
+/*Open seats of large sections split over several rows so enrollments do not all lock the same row,
+  ReconcileSeatCounters creates them*/
+create table cs425.tblSeatCounterShards(
+    scheduleID int,
+    shard tinyint,
+    availableSeats int not null,
+    primary key (scheduleID, shard),
+    foreign key (scheduleID) references tblcourseSchedule(scheduleID)
+);
+
+/*Emails sent from the admin dashboard, the counts follow delivery of the tblMailOutbox rows queued for them*/
+create table cs425.tblOutboundEmails(
+    emailID int primary key auto_increment,
+    subject varchar(255),
+    recipient_group varchar(150),
+    content text,
+    sent_date timestamp default current_timestamp,
+    status varchar(10) not null default 'queued', /*queued, sending, sent or partial*/
+    recipientCount int not null default 0,
+    sentCount int not null default 0,
+    failedCount int not null default 0,
+    completedAt timestamp null
+);
+
+/*Emails waiting to be sent, written in the transaction of the change they announce and sent by the backend's mail outbox workers*/
+create table cs425.tblMailOutbox(
+    outboxID bigint primary key auto_increment,
+    recipients mediumtext not null, /*JSON list of addresses*/
+    subject varchar(255),
+    body mediumtext,
+    html mediumtext,
+    outboundEmailID int, /*tblOutboundEmails row of an admin email*/
+    bcc boolean not null default false, /*recipients of a bulk email are sent as Bcc*/
+    status varchar(10) not null default 'queued', /*queued, sending, sent or failed*/
+    attempts int not null default 0,
+    nextAttemptAt timestamp not null default current_timestamp,
+    claimToken varchar(32),
+    claimedAt timestamp null,
+    lastError varchar(255),
+    createdAt timestamp not null default current_timestamp,
+    sentAt timestamp null,
+    index idx_outbox_due (status, nextAttemptAt),
+    index idx_outbox_claim (claimToken)
+);
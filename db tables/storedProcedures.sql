@@ -70,6 +70,230 @@ call GetEnrolledCourses(1)--studentID as argument
 -----------------------------------------------------------------------------------------------------------
 
 
+/*takes one seat of a section if one is left, p_claimed is 1 when it did.
+  Sections with seatShards > 0 keep their open seats in tblSeatCounterShards and take the seat from
+  one shard row, starting at a random shard, so enrollments in a large section do not all wait on one row*/
+delimiter //
+create procedure ClaimSeat(
+    in p_scheduleID int,
+    out p_claimed int
+)
+begin
+    declare v_shards int;
+    declare v_start int;
+    declare v_offset int default 0;
+
+    set p_claimed = 0;
+    select seatShards into v_shards from tblcourseSchedule where scheduleID = p_scheduleID;
+
+    if v_shards > 0 then
+        set v_start = floor(rand() * v_shards);
+        while p_claimed = 0 and v_offset < v_shards do
+            update tblSeatCounterShards
+            set availableSeats = availableSeats - 1
+            where scheduleID = p_scheduleID and shard = (v_start + v_offset) % v_shards and availableSeats > 0;
+            set p_claimed = row_count();
+            set v_offset = v_offset + 1;
+        end while;
+    else
+        update tblcourseSchedule
+        set enrollmentTotal = enrollmentTotal + 1,
+            availableSeats = availableSeats - 1
+        where scheduleID = p_scheduleID and availableSeats > 0;
+        set p_claimed = row_count();
+    end if;
+end //
+delimiter ;
+
+/*use case*/
+call ClaimSeat(508, @claimed)
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*gives one seat of a section back*/
+delimiter //
+create procedure ReleaseSeat(
+    in p_scheduleID int
+)
+begin
+    declare v_shards int;
+    declare v_shard int;
+
+    select seatShards into v_shards from tblcourseSchedule where scheduleID = p_scheduleID;
+
+    if v_shards > 0 then
+        --rand() in the where clause would be evaluated again for every shard row
+        set v_shard = floor(rand() * v_shards);
+        update tblSeatCounterShards
+        set availableSeats = availableSeats + 1
+        where scheduleID = p_scheduleID and shard = v_shard;
+    else
+        update tblcourseSchedule
+        set enrollmentTotal = enrollmentTotal - 1,
+            availableSeats = availableSeats + 1
+        where scheduleID = p_scheduleID;
+    end if;
+end //
+delimiter ;
+
+/*use case*/
+call ReleaseSeat(508)
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*copies the open seats of a sharded section back to tblcourseSchedule so availableSeats and enrollmentTotal
+  stay current for readers, run after the transaction that claimed or released seats so the section row
+  is only locked for this one statement. Does nothing for sections without shards*/
+delimiter //
+create procedure SyncSeatCounters(
+    in p_scheduleID int
+)
+begin
+    update tblcourseSchedule cs
+    set cs.availableSeats = (select coalesce(sum(sh.availableSeats), 0) from tblSeatCounterShards sh where sh.scheduleID = p_scheduleID),
+        cs.enrollmentTotal = cs.classCapacity - cs.availableSeats
+    where cs.scheduleID = p_scheduleID and cs.seatShards > 0;
+end //
+delimiter ;
+
+/*use case*/
+call SyncSeatCounters(508)
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*moves students from the waitlist into the open seats of a section in arrival order,
+  called inside the transaction that freed the seats so no one else can take them first.
+  A student who enrolled since joining in a section that overlaps this one is taken off the waitlist,
+  overlaps are checked on the 5 minute slots of tblSectionMeetings with the backend's 15 minute buffer*/
+delimiter //
+create procedure PromoteWaitlist(
+    in p_scheduleID int
+)
+begin
+    declare v_waitlistID bigint;
+    declare v_studentID int;
+    declare v_claimed int default 1;
+
+    promote: while v_claimed > 0 do
+        set v_waitlistID = null;
+        select waitlistID, studentID
+        into v_waitlistID, v_studentID
+        from tblWaitlist
+        where scheduleID = p_scheduleID and status = 'waiting'
+        order by waitlistID
+        limit 1
+        for update;
+
+        if v_waitlistID is null then
+            leave promote;
+        end if;
+
+        if exists (select 1 from tblUserSchedule where studentID = v_studentID and scheduleID = p_scheduleID) then
+            update tblWaitlist set status = 'cancelled' where waitlistID = v_waitlistID;
+        elseif exists (
+            select 1
+            from tblUserSchedule us
+            join tblcourseSchedule other on other.scheduleID = us.scheduleID
+            join tblcourseSchedule cs on cs.scheduleID = p_scheduleID and cs.semesterID = other.semesterID
+            join tblSectionMeetings om on om.scheduleID = us.scheduleID
+            join tblSectionMeetings wm on wm.scheduleID = p_scheduleID
+            where us.studentID = v_studentID
+                and floor(wm.weekStart / 5) - 3 < ceiling(om.weekEnd / 5)
+                and floor(om.weekStart / 5) < ceiling(wm.weekEnd / 5) + 3
+        ) then
+            update tblWaitlist set status = 'cancelled' where waitlistID = v_waitlistID;
+        else
+            call ClaimSeat(p_scheduleID, v_claimed);
+            if v_claimed > 0 then
+                insert into tblUserSchedule (studentID, scheduleID) values (v_studentID, p_scheduleID);
+                update tblWaitlist set status = 'promoted', promotedAt = now() where waitlistID = v_waitlistID;
+            end if;
+        end if;
+    end while;
+
+    update tblcourseSchedule
+    set waitList = (select count(*) from tblWaitlist where scheduleID = p_scheduleID and status = 'waiting')
+    where scheduleID = p_scheduleID;
+end //
+delimiter ;
+
+/*use case*/
+call PromoteWaitlist(508)
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*changes the capacity of a section, new seats go to the waitlist first.
+  A capacity below the seats already taken is rejected*/
+delimiter //
+create procedure SetClassCapacity(
+    in p_scheduleID int,
+    in p_classCapacity int
+)
+begin
+    declare v_change int;
+    declare v_shards int;
+    declare v_available int;
+    declare v_shard int default 0;
+    declare v_take int;
+
+    select p_classCapacity - classCapacity, seatShards, availableSeats
+    into v_change, v_shards, v_available
+    from tblcourseSchedule
+    where scheduleID = p_scheduleID
+    for update;
+
+    if v_shards > 0 then
+        select coalesce(sum(availableSeats), 0) into v_available
+        from tblSeatCounterShards
+        where scheduleID = p_scheduleID
+        for update;
+    end if;
+
+    if v_available + v_change < 0 then
+        signal sqlstate '45000' set message_text = 'Class capacity is below the seats already taken';
+    end if;
+
+    --seats are added or removed relative to the current count so concurrent enrollments are not lost
+    if v_shards > 0 then
+        update tblcourseSchedule set classCapacity = p_classCapacity where scheduleID = p_scheduleID;
+        if v_change >= 0 then
+            --new seats are spread evenly over the shards
+            update tblSeatCounterShards
+            set availableSeats = availableSeats + floor(v_change / v_shards) + (shard < v_change % v_shards)
+            where scheduleID = p_scheduleID;
+        else
+            --removed seats come out of the shards that still have open seats, no shard goes below 0
+            set v_change = -v_change;
+            while v_change > 0 and v_shard < v_shards do
+                select least(availableSeats, v_change) into v_take
+                from tblSeatCounterShards
+                where scheduleID = p_scheduleID and shard = v_shard;
+                update tblSeatCounterShards
+                set availableSeats = availableSeats - v_take
+                where scheduleID = p_scheduleID and shard = v_shard;
+                set v_change = v_change - v_take;
+                set v_shard = v_shard + 1;
+            end while;
+        end if;
+    else
+        update tblcourseSchedule
+        set classCapacity = p_classCapacity,
+            availableSeats = availableSeats + v_change
+        where scheduleID = p_scheduleID;
+    end if;
+
+    call PromoteWaitlist(p_scheduleID);
+    call SyncSeatCounters(p_scheduleID);
+
+    commit;
+end //
+delimiter ;
+
+/*use case*/
+call SetClassCapacity(508, 40)
+-------------------------------------------------------------------------------------------------------------------
+
+
 /*student unenrolls from a course*/
 delimiter //
 create procedure UnenrollCourse(
@@ -77,24 +301,17 @@ create procedure UnenrollCourse(
     in p_scheduleID int
 )
 begin
-    declare v_enrollmentTotal int;
-    declare v_availableSeats int;
-    
     --Delete the enrollment record from tblUserSchedule
     delete from tblUserSchedule
     where studentID = p_studentID and scheduleID = p_scheduleID;
-    
-    --Get the current enrollment total and available seats for the course
-    select enrollmentTotal, availableSeats
-    into v_enrollmentTotal, v_availableSeats
-    from tblcourseSchedule
-    where scheduleID = p_scheduleID;
-    
-    --Update the enrollment total and available seats in tblCourseSchedule
-    update tblcourseSchedule
-    set enrollmentTotal = v_enrollmentTotal - 1,
-        availableSeats = v_availableSeats + 1
-    where scheduleID = p_scheduleID;
+
+    --Only give the seat back when the student was enrolled, relative to the current count so concurrent changes are kept
+    if row_count() > 0 then
+        call ReleaseSeat(p_scheduleID);
+
+        --Give the freed seat to the first student on the waitlist before committing
+        call PromoteWaitlist(p_scheduleID);
+    end if;
 
     commit;
 end //
@@ -355,4 +572,345 @@ begin
         substring(courseCode, 1, locate(' ', courseCode) - 1);
 end //
 delimiter ;
----------------------------------------------------------------------------------------------------------------------------------------------------------
\ No newline at end of file
+---------------------------------------------------------------------------------------------------------------------------------------------------------
+
+/*Recompute the rating summary for one course and copy it into tblCourseDetails.
+  The summary is stamped with a new ratingVersion so the backend patches only this course's ratings,
+  the version row is bumped first so concurrent refreshes get their versions in commit order*/
+delimiter //
+create procedure RefreshCourseRatingSummary(
+    in p_courseID int
+)
+refresh: begin
+    declare v_ratingVersion int;
+
+    if p_courseID is null then
+        leave refresh;
+    end if;
+
+    update tblCatalogVersion set ratingVersion = ratingVersion + 1 where id = 1;
+    select ratingVersion into v_ratingVersion from tblCatalogVersion where id = 1;
+
+    insert into tblCourseRatingSummary (courseID, ratingCount, ratingTotal, averageRating, frequentTags, tagCount, ratingVersion)
+    select
+        p_courseID,
+        count(r.rating),
+        coalesce(sum(r.rating), 0),
+        round(coalesce(avg(r.rating), 0), 1),
+        (
+            select group_concat(t.tagName order by tag_counts.tag_count desc separator ', ')
+            from (
+                select rt.tagID, count(*) as tag_count
+                from tblRatings r2
+                join tblRatingTags rt on r2.ratingID = rt.ratingID
+                where r2.courseID = p_courseID
+                group by rt.tagID
+            ) as tag_counts
+            join tblTags t on tag_counts.tagID = t.tagID
+        ),
+        (
+            select count(*)
+            from tblRatings r3
+            join tblRatingTags rt on r3.ratingID = rt.ratingID
+            where r3.courseID = p_courseID
+        ),
+        v_ratingVersion
+    from tblRatings r
+    where r.courseID = p_courseID
+    on duplicate key update
+        ratingCount = values(ratingCount),
+        ratingTotal = values(ratingTotal),
+        averageRating = values(averageRating),
+        frequentTags = values(frequentTags),
+        tagCount = values(tagCount),
+        ratingVersion = values(ratingVersion);
+
+    update tblCourseDetails cd
+    join tblCourseRatingSummary rs on cd.courseID = rs.courseID
+    set cd.averageRating = rs.averageRating,
+        cd.frequentTags = rs.frequentTags,
+        cd.tagCount = rs.tagCount
+    where cd.courseID = p_courseID;
+end //
+delimiter ;
+
+/*use case*/
+call RefreshCourseRatingSummary(12)--courseID as argument
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*Rebuild the tblCourseDetails and tblSectionMeetings rows of one section*/
+delimiter //
+create procedure RefreshSectionDetails(
+    in p_scheduleID int
+)
+begin
+    delete from tblSectionMeetings where scheduleID = p_scheduleID;
+
+    insert into tblSectionMeetings (scheduleID, dayOfWeek, weekStart, weekEnd)
+    select cs.scheduleID, d.dayOfWeek, d.dayOfWeek * 1440 + cs.startMinute, d.dayOfWeek * 1440 + cs.endMinute
+    from tblcourseSchedule cs
+    join (
+        select 0 as dayOfWeek, 'Monday' as dayName union all
+        select 1, 'Tuesday' union all
+        select 2, 'Wednesday' union all
+        select 3, 'Thursday' union all
+        select 4, 'Friday' union all
+        select 5, 'Saturday' union all
+        select 6, 'Sunday'
+    ) d on cs.meetingDays like concat('%', d.dayName, '%')
+    where cs.scheduleID = p_scheduleID and cs.startMinute is not null and cs.endMinute is not null;
+
+    delete from tblCourseDetails where scheduleID = p_scheduleID;
+
+    insert into tblCourseDetails (scheduleID, courseID, Section, courseName, courseCode, courseMajor, majorID, department,
+        professors, term, format, units, meetingTime, startMinute, endMinute, Location, days, classCapacity, enrollmentTotal,
+        availableSeats, averageRating, courseLevel, frequentTags, tagCount)
+    select
+        cs.scheduleID,
+        c.courseID,
+        cs.Section,
+        c.courseName,
+        c.courseCode,
+        m.majorName,
+        m.majorID,
+        d.deptName,
+        group_concat(distinct concat(i.FirstName, ' ', i.LastName) separator ','),
+        cs.Term,
+        cs.meetingFormat,
+        c.Credits,
+        cs.meetingTimes,
+        cs.startMinute,
+        cs.endMinute,
+        cs.Location,
+        cs.meetingDays,
+        cs.classCapacity,
+        cs.enrollmentTotal,
+        cs.availableSeats,
+        coalesce(rs.averageRating, 0),
+        c.Level,
+        rs.frequentTags,
+        rs.tagCount
+    from
+        tblcourseSchedule cs
+        join tblCourses c on cs.courseID = c.courseID
+        join tblCourseMajor cm on c.courseID = cm.courseID
+        join tblMajor m on cm.majorID = m.majorID
+        join tblDepartment d on m.deptID = d.deptID
+        join tblCourseInstructors ci on cs.scheduleID = ci.scheduleID
+        join tblInstructor i on ci.instructorID = i.instructorID
+        left join tblCourseRatingSummary rs on c.courseID = rs.courseID
+    where
+        cs.scheduleID = p_scheduleID
+    group by
+        cs.scheduleID, m.majorID;
+
+    update tblCatalogVersion set catalogVersion = catalogVersion + 1 where id = 1;
+end //
+delimiter ;
+
+/*use case*/
+call RefreshSectionDetails(508)--scheduleID as argument
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*Full rebuild of tblCourseRatingSummary and tblCourseDetails*/
+delimiter //
+create procedure RebuildCourseDetails()
+begin
+    declare done int default false;
+    declare v_scheduleID int;
+    declare v_courseID int;
+    declare course_cursor cursor for select courseID from tblCourses;
+    declare section_cursor cursor for select distinct scheduleID from tblCourseInstructors;
+    declare continue handler for not found set done = true;
+
+    delete from tblCourseRatingSummary;
+    open course_cursor;
+    course_loop: loop
+        fetch course_cursor into v_courseID;
+        if done then
+            leave course_loop;
+        end if;
+        call RefreshCourseRatingSummary(v_courseID);
+    end loop;
+    close course_cursor;
+
+    set done = false;
+    delete from tblCourseDetails;
+    delete from tblSectionMeetings;
+    open section_cursor;
+    section_loop: loop
+        fetch section_cursor into v_scheduleID;
+        if done then
+            leave section_loop;
+        end if;
+        call RefreshSectionDetails(v_scheduleID);
+    end loop;
+    close section_cursor;
+end //
+delimiter ;
+
+/*use case*/
+call RebuildCourseDetails()
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*recomputes the seat counters of every section from tblUserSchedule.
+  Sections with a capacity over p_shardMinCapacity get p_shards seat counter rows, other sections
+  and every section when p_shards is 0 keep their counters on tblcourseSchedule*/
+delimiter //
+create procedure ReconcileSeatCounters(
+    in p_shardMinCapacity int,
+    in p_shards int
+)
+begin
+    start transaction;
+
+    update tblcourseSchedule cs
+    left join (
+        select scheduleID, count(*) as enrolled
+        from tblUserSchedule
+        group by scheduleID
+    ) us on us.scheduleID = cs.scheduleID
+    set cs.enrollmentTotal = coalesce(us.enrolled, 0),
+        cs.availableSeats = cs.classCapacity - coalesce(us.enrolled, 0),
+        cs.seatShards = if(p_shards > 0 and cs.classCapacity > p_shardMinCapacity, p_shards, 0);
+
+    --spread the open seats of sharded sections evenly over their shards
+    delete from tblSeatCounterShards;
+    insert into tblSeatCounterShards (scheduleID, shard, availableSeats)
+    with recursive shards (shard) as (
+        select 0
+        union all
+        select shard + 1 from shards where shard + 1 < p_shards
+    )
+    select cs.scheduleID, shards.shard,
+        floor(greatest(cs.availableSeats, 0) / cs.seatShards) + (shards.shard < greatest(cs.availableSeats, 0) % cs.seatShards)
+    from tblcourseSchedule cs
+    join shards on shards.shard < cs.seatShards
+    where cs.seatShards > 0;
+
+    commit;
+end //
+delimiter ;
+
+/*use case, run while enrollment is closed*/
+call ReconcileSeatCounters(200, 8)
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*recomputes one student's degree progress from tblUserCompletedCourses,
+  used by AddDegreeProgress for students who have no row yet*/
+delimiter //
+create procedure RebuildStudentProgress(
+    in p_studentID int
+)
+begin
+    insert into tblDegreeProgress (studentID, majorID, creditsReq, completedCredits, completedCourses,
+        courses100, courses200, courses300, courses400, coursesOther)
+    select s.studentID, s.majorID, coalesce(m.creditsReq, 0),
+        coalesce(sum(c.Credits), 0),
+        count(ucc.completionID),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '1'), 0),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '2'), 0),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '3'), 0),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '4'), 0),
+        coalesce(sum(ucc.completionID is not null and left(coalesce(c.Level, ''), 1) not in ('1', '2', '3', '4')), 0)
+    from tblStudents s
+    left join tblMajor m on m.majorID = s.majorID
+    left join tblUserCompletedCourses ucc on ucc.studentID = s.studentID
+    left join tblCourses c on c.courseID = ucc.courseID
+    where s.studentID = p_studentID
+    group by s.studentID, s.majorID, m.creditsReq
+    on duplicate key update
+        majorID = values(majorID),
+        creditsReq = values(creditsReq),
+        completedCredits = values(completedCredits),
+        completedCourses = values(completedCourses),
+        courses100 = values(courses100),
+        courses200 = values(courses200),
+        courses300 = values(courses300),
+        courses400 = values(courses400),
+        coursesOther = values(coursesOther);
+end //
+delimiter ;
+
+/*use case*/
+call RebuildStudentProgress(1)
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*adds (p_sign = 1) or removes (p_sign = -1) one completed course from a student's degree progress,
+  called by the tblUserCompletedCourses triggers. A student without a row (e.g. completions from before
+  tblDegreeProgress existed) gets their whole row recomputed instead, which already counts this change*/
+delimiter //
+create procedure AddDegreeProgress(
+    in p_studentID int,
+    in p_courseID int,
+    in p_sign int
+)
+begin
+    if p_studentID is not null and not exists (select 1 from tblDegreeProgress where studentID = p_studentID) then
+        call RebuildStudentProgress(p_studentID);
+    elseif p_studentID is not null then
+        insert into tblDegreeProgress (studentID, majorID, creditsReq, completedCredits, completedCourses,
+            courses100, courses200, courses300, courses400, coursesOther)
+        select s.studentID, s.majorID, coalesce(m.creditsReq, 0),
+            p_sign * coalesce(c.Credits, 0),
+            p_sign,
+            p_sign * (left(coalesce(c.Level, ''), 1) = '1'),
+            p_sign * (left(coalesce(c.Level, ''), 1) = '2'),
+            p_sign * (left(coalesce(c.Level, ''), 1) = '3'),
+            p_sign * (left(coalesce(c.Level, ''), 1) = '4'),
+            p_sign * (left(coalesce(c.Level, ''), 1) not in ('1', '2', '3', '4'))
+        from tblStudents s
+        left join tblMajor m on m.majorID = s.majorID
+        left join tblCourses c on c.courseID = p_courseID
+        where s.studentID = p_studentID
+        on duplicate key update
+            completedCredits = completedCredits + values(completedCredits),
+            completedCourses = completedCourses + values(completedCourses),
+            courses100 = courses100 + values(courses100),
+            courses200 = courses200 + values(courses200),
+            courses300 = courses300 + values(courses300),
+            courses400 = courses400 + values(courses400),
+            coursesOther = coursesOther + values(coursesOther);
+    end if;
+end //
+delimiter ;
+
+/*use case*/
+call AddDegreeProgress(1, 12, 1)--studentID 1 completed courseID 12
+-------------------------------------------------------------------------------------------------------------------
+
+
+/*recomputes the degree progress of every student from tblUserCompletedCourses,
+  run after bulk loads or after course credits or levels change*/
+delimiter //
+create procedure RebuildDegreeProgress()
+begin
+    start transaction;
+    delete from tblDegreeProgress;
+    insert into tblDegreeProgress (studentID, majorID, creditsReq, completedCredits, completedCourses,
+        courses100, courses200, courses300, courses400, coursesOther)
+    select s.studentID, s.majorID, coalesce(m.creditsReq, 0),
+        coalesce(sum(c.Credits), 0),
+        count(ucc.completionID),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '1'), 0),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '2'), 0),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '3'), 0),
+        coalesce(sum(left(coalesce(c.Level, ''), 1) = '4'), 0),
+        coalesce(sum(ucc.completionID is not null and left(coalesce(c.Level, ''), 1) not in ('1', '2', '3', '4')), 0)
+    from tblStudents s
+    left join tblMajor m on m.majorID = s.majorID
+    left join tblUserCompletedCourses ucc on ucc.studentID = s.studentID
+    left join tblCourses c on c.courseID = ucc.courseID
+    group by s.studentID, s.majorID, m.creditsReq;
+    commit;
+end //
+delimiter ;
+
+/*use case*/
+call RebuildDegreeProgress()
+-------------------------------------------------------------------------------------------------------------------
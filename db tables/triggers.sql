@@ -42,4 +42,249 @@ begin
     end if;
 end;
 //
-delimiter ;
\ No newline at end of file
+delimiter ;
+
+/*Keep tblCourseDetails in sync with ratings, tags, instructor assignments and seat counts*/
+delimiter //
+create trigger refresh_details_rating_insert
+after insert on tblRatings
+for each row
+begin
+    call RefreshCourseRatingSummary(new.courseID);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_rating_update
+after update on tblRatings
+for each row
+begin
+    call RefreshCourseRatingSummary(new.courseID);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_rating_delete
+after delete on tblRatings
+for each row
+begin
+    call RefreshCourseRatingSummary(old.courseID);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_tag_insert
+after insert on tblRatingTags
+for each row
+begin
+    call RefreshCourseRatingSummary((select courseID from tblRatings where ratingID = new.ratingID));
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_tag_delete
+after delete on tblRatingTags
+for each row
+begin
+    call RefreshCourseRatingSummary((select courseID from tblRatings where ratingID = old.ratingID));
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_instructor_insert
+after insert on tblCourseInstructors
+for each row
+begin
+    call RefreshSectionDetails(new.scheduleID);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_instructor_delete
+after delete on tblCourseInstructors
+for each row
+begin
+    call RefreshSectionDetails(old.scheduleID);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger refresh_details_schedule_update
+after update on tblcourseSchedule
+for each row
+begin
+    if new.courseID <=> old.courseID and new.Section <=> old.Section and new.Term <=> old.Term
+        and new.meetingFormat <=> old.meetingFormat and new.meetingTimes <=> old.meetingTimes
+        and new.startTime <=> old.startTime and new.endTime <=> old.endTime
+        and new.Location <=> old.Location and new.meetingDays <=> old.meetingDays then
+        --enrollment changes only touch the seat columns
+        update tblCourseDetails
+        set classCapacity = new.classCapacity,
+            enrollmentTotal = new.enrollmentTotal,
+            availableSeats = new.availableSeats
+        where scheduleID = new.scheduleID;
+    else
+        call RefreshSectionDetails(new.scheduleID);
+    end if;
+end;
+//
+delimiter ;
+
+/*Keep tblDegreeProgress in sync with completed courses and the credits each major requires*/
+delimiter //
+create trigger degree_progress_insert
+after insert on tblUserCompletedCourses
+for each row
+begin
+    call AddDegreeProgress(new.studentID, new.courseID, 1);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger degree_progress_update
+after update on tblUserCompletedCourses
+for each row
+begin
+    if not (new.studentID <=> old.studentID and new.courseID <=> old.courseID) then
+        call AddDegreeProgress(old.studentID, old.courseID, -1);
+        call AddDegreeProgress(new.studentID, new.courseID, 1);
+    end if;
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger degree_progress_delete
+after delete on tblUserCompletedCourses
+for each row
+begin
+    call AddDegreeProgress(old.studentID, old.courseID, -1);
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger degree_progress_major_change
+after update on tblStudents
+for each row
+begin
+    if not new.majorID <=> old.majorID then
+        update tblDegreeProgress
+        set majorID = new.majorID,
+            creditsReq = coalesce((select creditsReq from tblMajor where majorID = new.majorID), 0)
+        where studentID = new.studentID;
+    end if;
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger degree_progress_credits_req
+after update on tblMajor
+for each row
+begin
+    if not new.creditsReq <=> old.creditsReq then
+        update tblDegreeProgress set creditsReq = coalesce(new.creditsReq, 0) where majorID = new.majorID;
+    end if;
+end;
+//
+delimiter ;
+
+/*Bump the version of cached reference data when its table changes*/
+delimiter //
+create trigger reference_majors_insert
+after insert on tblMajor
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'majors';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_majors_update
+after update on tblMajor
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'majors';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_majors_delete
+after delete on tblMajor
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'majors';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_tags_insert
+after insert on tblTags
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'tags';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_tags_update
+after update on tblTags
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'tags';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_tags_delete
+after delete on tblTags
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'tags';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_semesters_insert
+after insert on tblSemesters
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'semesters';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_semesters_update
+after update on tblSemesters
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'semesters';
+end;
+//
+delimiter ;
+
+delimiter //
+create trigger reference_semesters_delete
+after delete on tblSemesters
+for each row
+begin
+    update tblReferenceVersions set version = version + 1 where name = 'semesters';
+end;
+//
+delimiter ;
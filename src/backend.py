@@ -1,17 +1,19 @@
 # Created by Lucas Videtto
 # Backend functionality for Course Compass
 
-from flask import Flask, jsonify, request, session, render_template
+from flask import Flask, jsonify, request, session, render_template, g, has_request_context, Response, stream_with_context, make_response
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from flask_cors import CORS
 from mysql.connector import connect, Error
 from datetime import datetime, timedelta
 from flask_bcrypt import Bcrypt
-import logging, json
+import logging, json, re, math, smtplib
 from urllib.parse import unquote
 from flask_mail import Mail, Message
-from functools import wraps
+from functools import wraps, lru_cache
+from collections import OrderedDict, deque
 import pytz
+import queue, threading, time, bisect, base64, heapq, uuid, hashlib, os
 
 
 app = Flask(__name__, template_folder='templates')
@@ -23,14 +25,61 @@ bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+app.config['JWT_ENRICHED_CLAIMS'] = False # include studentID, instructorID and majorID in the token identity
+app.config['MAIL_SERVER'] = os.environ.get('COURSECOMPASS_MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('COURSECOMPASS_MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('COURSECOMPASS_MAIL_USE_TLS', 'true') == 'true'
 app.config['MAIL_USERNAME'] = 'coursecompassunr@gmail.com'
 app.config['MAIL_PASSWORD'] = 'rlse btgk aelx uxlk' # REAL PASSWORD IS Compass2024$
 mail = Mail(app)
 
 
+# User profile cache settings
+# Every process keeps its own user_cache, User.invalidate bumps the 'users' version in tblReferenceVersions
+# and the other processes clear their cache when they read it, at most REFERENCE_VERSION_CHECK seconds later
+app.config['USER_CACHE_SIZE'] = 2048
+app.config['USER_CACHE_TTL'] = 300
+
+
+# Bounded least-recently-used cache whose entries expire after ttl seconds
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+
 # LV
 # User class to store user information
 class User:
@@ -46,8 +95,25 @@ class User:
         self.role = role
         self.instructorID = instructorID
 
+    # Profiles are memoized for the rest of the request and kept in user_cache between
+    # requests, anything that changes a profile must call User.invalidate(email)
     @staticmethod
     def get_user_by_email(email):
+        memo = g.setdefault('user_memo', {}) if has_request_context() else {}
+        if email in memo:
+            return memo[email]
+        check_user_cache_version()
+        user_data = user_cache.get(email)
+        if user_data is None:
+            user_data = User.fetch_user_data(email)
+            if user_data:
+                user_cache.set(email, user_data)
+        user = User(**user_data) if user_data else None
+        memo[email] = user
+        return user
+
+    @staticmethod
+    def fetch_user_data(email):
         connection = connectToDB()
         cursor = connection.cursor(dictionary=True)
         try:
@@ -61,10 +127,7 @@ class User:
             """, (email,))
             user_data = cursor.fetchone()
             print("FETCHED USER DATA FROM GETUSERBYEMAIL", user_data)
-            if user_data:
-                user = User(**user_data)
-                return user
-            return None
+            return user_data
         except Exception as e:
             print(e)
             return None
@@ -72,6 +135,17 @@ class User:
             cursor.close()
             connection.close()
 
+    # Drops the profile here and bumps the shared version so the other processes drop theirs
+    @staticmethod
+    def invalidate(email):
+        user_cache.pop(email)
+        if has_request_context():
+            g.setdefault('user_memo', {}).pop(email, None)
+        try:
+            bump_reference_versions(['users'])
+        except Error as err:
+            print("Error bumping the user cache version:", err)
+
     def conv_to_json(self):
         return {
             "userID": self.userID,
@@ -136,6 +210,188 @@ def role_required(allowed_roles):
         return wrapper
     return decorator
 
+
+# Idempotency settings
+# POST endpoints marked @idempotent store their response under the client's Idempotency-Key header for
+# IDEMPOTENCY_TTL seconds, in memory and in tblIdempotencyKeys so other processes see it too.
+# A claim left without a response by a crashed process is given up after IDEMPOTENCY_PENDING_TTL seconds.
+app.config['IDEMPOTENCY_CACHE_SIZE'] = 10000
+app.config['IDEMPOTENCY_TTL'] = 24 * 60 * 60
+app.config['IDEMPOTENCY_PENDING_TTL'] = 60
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self.responses = TTLCache(app.config['IDEMPOTENCY_CACHE_SIZE'], app.config['IDEMPOTENCY_TTL'])
+        self.in_progress = set()
+        self.lock = threading.Lock()
+
+    # The store has its own pooled connection, a commit on the request's connection would
+    # also commit whatever the handler wrote before it failed
+    def connect(self):
+        try:
+            return get_db_pool().connect()
+        except Error as err:
+            print("Error while connecting to database", err)
+            return None
+
+    # Stored response for a key, None when the key is new. Rows still pending belong to a request
+    # running in another process and come back with statusCode None.
+    def get(self, key):
+        stored = self.responses.get(key)
+        if stored:
+            return stored
+        connection = self.connect()
+        if not connection:
+            return None
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT requestHash, statusCode, responseBody FROM tblIdempotencyKeys
+                WHERE idempotencyKey = %s AND createdAt > NOW() - INTERVAL %s SECOND
+                    AND (statusCode IS NOT NULL OR createdAt > NOW() - INTERVAL %s SECOND)
+            """, (key, app.config['IDEMPOTENCY_TTL'], app.config['IDEMPOTENCY_PENDING_TTL']))
+            row = cursor.fetchone()
+            if row and row['statusCode'] is not None:
+                self.responses.set(key, row)
+            return row
+        except Error as err:
+            print("Error reading idempotency key:", err)
+            return None
+        finally:
+            cursor.close()
+            connection.close()
+
+    # Claims a key before the request runs, False when another request already holds it
+    def claim(self, key, request_hash):
+        with self.lock:
+            if key in self.in_progress:
+                return False
+            self.in_progress.add(key)
+        connection = self.connect()
+        if not connection:
+            return True
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                DELETE FROM tblIdempotencyKeys
+                WHERE idempotencyKey = %s AND (createdAt <= NOW() - INTERVAL %s SECOND
+                    OR (statusCode IS NULL AND createdAt <= NOW() - INTERVAL %s SECOND))
+            """, (key, app.config['IDEMPOTENCY_TTL'], app.config['IDEMPOTENCY_PENDING_TTL']))
+            cursor.execute("INSERT IGNORE INTO tblIdempotencyKeys (idempotencyKey, requestHash) VALUES (%s, %s)", (key, request_hash))
+            claimed = cursor.rowcount == 1
+            connection.commit()
+            if not claimed:
+                self.release(key)
+            return claimed
+        except Error as err:
+            print("Error claiming idempotency key:", err)
+            return True
+        finally:
+            cursor.close()
+            connection.close()
+
+    # Saves the response of a claimed key, server errors are forgotten so the client can retry
+    def finish(self, key, request_hash, response):
+        stored = {'requestHash': request_hash, 'statusCode': response.status_code, 'responseBody': response.get_data(as_text=True)}
+        connection = self.connect()
+        try:
+            if response.status_code < 500:
+                self.responses.set(key, stored)
+            if not connection:
+                return
+            cursor = connection.cursor()
+            try:
+                if response.status_code < 500:
+                    cursor.execute("""
+                        UPDATE tblIdempotencyKeys SET statusCode = %s, responseBody = %s
+                        WHERE idempotencyKey = %s
+                    """, (stored['statusCode'], stored['responseBody'], key))
+                else:
+                    cursor.execute("DELETE FROM tblIdempotencyKeys WHERE idempotencyKey = %s", (key,))
+                connection.commit()
+            except Error as err:
+                print("Error saving idempotency key:", err)
+            finally:
+                cursor.close()
+                connection.close()
+        finally:
+            self.release(key)
+
+    def release(self, key):
+        with self.lock:
+            self.in_progress.discard(key)
+
+
+idempotency_store = IdempotencyStore()
+
+
+def replay_response(stored):
+    return Response(stored['responseBody'], status=stored['statusCode'], mimetype='application/json',
+                    headers={'Idempotent-Replayed': 'true'})
+
+
+# Retries carrying the same Idempotency-Key get the first response back without running the handler again.
+# Keys are scoped to the user and endpoint, reusing one for a different request body is rejected.
+def idempotent(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return func(*args, **kwargs)
+        if len(key) > 100:
+            return jsonify({"message": "Idempotency-Key is too long"}), 400
+        key = f"{get_jwt_identity()['userID']}:{request.endpoint}:{key}"
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        for attempt in range(2):
+            stored = idempotency_store.get(key)
+            if stored and stored['requestHash'] != request_hash:
+                return jsonify({"message": "Idempotency-Key was already used for a different request"}), 422
+            if stored and stored['statusCode'] is not None:
+                return replay_response(stored)
+            if stored is None and idempotency_store.claim(key, request_hash):
+                break
+            if attempt == 0:
+                #the first request is still running, give it a moment before answering
+                time.sleep(0.5)
+        else:
+            return jsonify({"message": "A request with this Idempotency-Key is still in progress"}), 409
+
+        response = None
+        try:
+            response = make_response(func(*args, **kwargs))
+            return response
+        finally:
+            if response is not None:
+                idempotency_store.finish(key, request_hash, response)
+            else:
+                idempotency_store.finish(key, request_hash, make_response(jsonify({"message": "Internal server error"}), 500))
+    return wrapper
+
+
+# Token identity for a user, with JWT_ENRICHED_CLAIMS the profile IDs are included for the client
+def build_identity(email, userID, role):
+    identity = {"email": email, "userID": userID, "role": role}
+    if app.config['JWT_ENRICHED_CLAIMS']:
+        user = User.get_user_by_email(email)
+        if user:
+            identity["studentID"] = user.studentID
+            identity["instructorID"] = user.instructorID
+            identity["majorID"] = user.majorID
+            identity["enriched"] = True
+    return identity
+
+
+# Current user loaded with User.get_user_by_email, which user_cache makes cheap. Tokens outlive the
+# account, so a deleted account or a changed role gives None instead of trusting the claims.
+def get_current_user():
+    identity = get_jwt_identity()
+    user = User.get_user_by_email(identity['email'])
+    if not user or user.userID != identity['userID'] or user.role != identity['role']:
+        return None
+    return user
+
         
 # LV
 # Login functionality for backend
@@ -170,7 +426,7 @@ def login():
                 session['email'] = email
                 print("LOGIN SUCCESSFUL")
                 role = user['role']
-                access_token = create_access_token(identity={"email": user['Email'], "userID": user['userID'], "role": role})
+                access_token = create_access_token(identity=build_identity(user['Email'], user['userID'], role))
                 return jsonify({"message": "Login successful", "access_token": access_token, "role": role}), 200
             else:
                 print("INVALID EMAIL OR PASSWORD")
@@ -216,7 +472,7 @@ def login_verify():
                 session['email'] = email
                 print("LOGIN SUCCESSFUL")
                 role = user['role']
-                access_token = create_access_token(identity={"email": user['Email'], "userID": user['userID'], "role": role})
+                access_token = create_access_token(identity=build_identity(user['Email'], user['userID'], role))
                 return jsonify({"message": "Login successful", "access_token": access_token, "role": role}), 200
             else:
                 print("INVALID EMAIL OR PASSWORD")
@@ -232,6 +488,312 @@ def login_verify():
         return jsonify({"message": "Invalid request"}), 400
    
             
+# Mail outbox settings
+# Emails are written to tblMailOutbox in the same transaction as the change that sends them and are
+# delivered by MAIL_OUTBOX_WORKERS background threads, which claim up to MAIL_OUTBOX_BATCH rows at a time
+# and send them over one SMTP connection. A failed email is retried after
+# MAIL_OUTBOX_RETRY_DELAY * 2^(attempts - 1) seconds, at most MAIL_OUTBOX_MAX_ATTEMPTS times, and rows
+# claimed by a worker that died are claimed again after MAIL_OUTBOX_CLAIM_TIMEOUT seconds.
+# With MAIL_OUTBOX_ENABLED off nothing is sent by the backend, run `flask drain-mail` instead.
+app.config['MAIL_OUTBOX_ENABLED'] = True
+app.config['MAIL_OUTBOX_WORKERS'] = 2
+app.config['MAIL_OUTBOX_BATCH'] = 20
+app.config['MAIL_OUTBOX_POLL_INTERVAL'] = 30
+app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 6
+app.config['MAIL_OUTBOX_RETRY_DELAY'] = 30
+app.config['MAIL_OUTBOX_CLAIM_TIMEOUT'] = 600
+
+# Bulk email settings
+# Emails to a recipient group are split into outbox rows of MAIL_BULK_CHUNK_SIZE addresses sent as Bcc,
+# or one row per address when MAIL_BULK_BCC is off. MAIL_RATE_LIMIT caps the recipients per minute
+# of all outbox workers together so the SMTP provider's sending limits are not hit, 0 turns it off.
+app.config['MAIL_BULK_BCC'] = True
+app.config['MAIL_BULK_CHUNK_SIZE'] = 50
+app.config['MAIL_RATE_LIMIT'] = 100
+
+# Recipient groups of /send-email and the table their addresses come from
+MAIL_RECIPIENT_GROUPS = {'All Users': 'tblUser', 'Instructors': 'tblInstructor', 'Students': 'tblStudents'}
+
+
+# Queue an email with the caller's cursor, it is only sent once the caller commits
+def queue_email(cursor, recipients, subject, body, html=None, outbound_email_id=None):
+    cursor.execute("""
+        INSERT INTO tblMailOutbox (recipients, subject, body, html, outboundEmailID)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (json.dumps(recipients), subject, body, html, outbound_email_id))
+
+
+# Queue an email to every address of a recipient group in chunks, the addresses never leave the
+# database server. Returns the number of recipients.
+def queue_bulk_email(cursor, recipient_group, subject, body, outbound_email_id):
+    table = MAIL_RECIPIENT_GROUPS[recipient_group]
+    chunk_size = app.config['MAIL_BULK_CHUNK_SIZE'] if app.config['MAIL_BULK_BCC'] else 1
+    cursor.execute(f"""
+        INSERT INTO tblMailOutbox (recipients, subject, body, outboundEmailID, bcc)
+        SELECT JSON_ARRAYAGG(Email), %s, %s, %s, %s
+        FROM (
+            SELECT Email, ROW_NUMBER() OVER (ORDER BY Email) - 1 AS position
+            FROM (SELECT DISTINCT Email FROM {table} WHERE Email IS NOT NULL) addresses
+        ) numbered
+        GROUP BY position DIV %s
+    """, (subject, body, outbound_email_id, chunk_size > 1, chunk_size))
+    cursor.execute("""
+        UPDATE tblOutboundEmails
+        SET recipientCount = (SELECT COALESCE(SUM(JSON_LENGTH(recipients)), 0) FROM tblMailOutbox WHERE outboundEmailID = %s),
+            status = IF(recipientCount = 0, 'sent', status),
+            completedAt = IF(recipientCount = 0, NOW(), NULL)
+        WHERE emailID = %s
+    """, (outbound_email_id, outbound_email_id))
+    cursor.execute("SELECT recipientCount FROM tblOutboundEmails WHERE emailID = %s", (outbound_email_id,))
+    return cursor.fetchone()['recipientCount']
+
+
+# Counts sent or failed recipients of an admin email, the email is done once every recipient is counted
+def record_outbound_progress(cursor, outbound_email_id, sent, failed):
+    cursor.execute("""
+        UPDATE tblOutboundEmails
+        SET sentCount = sentCount + %s,
+            failedCount = failedCount + %s,
+            status = IF(sentCount + failedCount < recipientCount, 'sending', IF(failedCount > 0, 'partial', 'sent')),
+            completedAt = IF(sentCount + failedCount < recipientCount, NULL, NOW())
+        WHERE emailID = %s
+    """, (sent, failed, outbound_email_id))
+
+
+def mail_retry_delay(attempts):
+    return app.config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (attempts - 1)
+
+
+def outbox_message(row):
+    recipients = json.loads(row['recipients'])
+    if row['bcc']:
+        msg = Message(row['subject'], sender="coursecompassunr@gmail.com", recipients=["coursecompassunr@gmail.com"], bcc=recipients)
+    else:
+        msg = Message(row['subject'], sender="coursecompassunr@gmail.com", recipients=recipients)
+    msg.body = row['body']
+    msg.html = row['html']
+    return msg
+
+
+# Token bucket shared by the outbox workers, refilled at MAIL_RATE_LIMIT recipients per minute
+class MailRateLimiter:
+    def __init__(self):
+        self.tokens = None
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Blocks until count recipients may be sent
+    def acquire(self, count):
+        while True:
+            limit = app.config['MAIL_RATE_LIMIT']
+            if not limit:
+                return
+            count = min(count, limit)
+            with self.lock:
+                now = time.monotonic()
+                if self.tokens is None:
+                    self.tokens = limit
+                self.tokens = min(limit, self.tokens + (now - self.updated) * limit / 60)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                wait = (count - self.tokens) * 60 / limit
+            time.sleep(wait)
+
+
+mail_rate_limiter = MailRateLimiter()
+
+
+class MailOutbox:
+    def __init__(self):
+        self.wakeup = threading.Event()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    # Starts the missing workers, including ones that died
+    def start(self):
+        with self.lock:
+            if not app.config['MAIL_OUTBOX_ENABLED']:
+                return
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            running = {worker.name for worker in self.workers}
+            for number in range(app.config['MAIL_OUTBOX_WORKERS']):
+                if f"mail-outbox-{number}" in running:
+                    continue
+                worker = threading.Thread(target=self.work, name=f"mail-outbox-{number}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    # Called after a transaction that queued emails commits
+    def wake(self):
+        self.start()
+        self.wakeup.set()
+
+    def work(self):
+        while True:
+            #the poll picks up retries that are due
+            self.wakeup.wait(app.config['MAIL_OUTBOX_POLL_INTERVAL'])
+            self.wakeup.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                print("Error in mail outbox worker:", e)
+
+    # Claims a batch of due emails, a worker only sends the rows marked with its claim token
+    def claim(self, connection, cursor):
+        token = uuid.uuid4().hex
+        cursor.execute("""
+            UPDATE tblMailOutbox
+            SET status = 'sending', claimToken = %s, claimedAt = NOW(), attempts = attempts + 1
+            WHERE (status = 'queued' AND nextAttemptAt <= NOW())
+                OR (status = 'sending' AND claimedAt < NOW() - INTERVAL %s SECOND)
+            ORDER BY outboxID
+            LIMIT %s
+        """, (token, app.config['MAIL_OUTBOX_CLAIM_TIMEOUT'], app.config['MAIL_OUTBOX_BATCH']))
+        claimed = cursor.rowcount
+        connection.commit()
+        if not claimed:
+            return []
+        cursor.execute("""
+            SELECT outboxID, recipients, subject, body, html, bcc, outboundEmailID, attempts, claimToken
+            FROM tblMailOutbox WHERE claimToken = %s ORDER BY outboxID
+        """, (token,))
+        return cursor.fetchall()
+
+    def reschedule(self, connection, cursor, rows, error):
+        for row in rows:
+            if row['attempts'] >= app.config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+                cursor.execute("UPDATE tblMailOutbox SET status = 'failed', claimToken = NULL, lastError = %s WHERE outboxID = %s",
+                               (str(error)[:255], row['outboxID']))
+                if row['outboundEmailID']:
+                    record_outbound_progress(cursor, row['outboundEmailID'], 0, len(json.loads(row['recipients'])))
+                self.failed += 1
+            else:
+                cursor.execute("""
+                    UPDATE tblMailOutbox
+                    SET status = 'queued', claimToken = NULL, lastError = %s, nextAttemptAt = NOW() + INTERVAL %s SECOND
+                    WHERE outboxID = %s
+                """, (str(error)[:255], mail_retry_delay(row['attempts']), row['outboxID']))
+                self.retried += 1
+        connection.commit()
+
+    # Sends due emails over one SMTP connection until none are left, returns how many were sent
+    def drain(self):
+        connection = connectToDB()
+        if not connection:
+            return 0
+        cursor = connection.cursor(dictionary=True)
+        sent = 0
+        pending = []
+        try:
+            pending = self.claim(connection, cursor)
+            if pending:
+                with app.app_context(), mail.connect() as smtp:
+                    while pending:
+                        row = pending[0]
+                        message = outbox_message(row)
+                        mail_rate_limiter.acquire(len(message.send_to))
+                        try:
+                            smtp.send(message)
+                        except smtplib.SMTPServerDisconnected:
+                            raise #the connection is gone, every claimed row is retried
+                        except smtplib.SMTPException as e:
+                            print("Error sending queued email", row['outboxID'], e)
+                            self.reschedule(connection, cursor, [pending.pop(0)], e)
+                        except OSError:
+                            raise
+                        except Exception as e:
+                            print("Error sending queued email", row['outboxID'], e)
+                            self.reschedule(connection, cursor, [pending.pop(0)], e)
+                        else:
+                            cursor.execute("UPDATE tblMailOutbox SET status = 'sent', claimToken = NULL, sentAt = NOW() WHERE outboxID = %s", (row['outboxID'],))
+                            if row['outboundEmailID']:
+                                record_outbound_progress(cursor, row['outboundEmailID'], len(json.loads(row['recipients'])), 0)
+                            if len(pending) > 1:
+                                #keep the rest of the batch claimed while the rate limit holds it back
+                                cursor.execute("UPDATE tblMailOutbox SET claimedAt = NOW() WHERE claimToken = %s", (pending[1]['claimToken'],))
+                            connection.commit()
+                            pending.pop(0)
+                            sent += 1
+                            self.sent += 1
+                        if not pending:
+                            pending = self.claim(connection, cursor)
+        except Exception as e:
+            print("Error sending queued emails:", e)
+            if pending:
+                try:
+                    self.reschedule(connection, cursor, pending, e)
+                except Exception as err:
+                    #the rows stay claimed and are picked up again after MAIL_OUTBOX_CLAIM_TIMEOUT
+                    print("Error rescheduling queued emails:", err)
+        finally:
+            cursor.close()
+            connection.close()
+        return sent
+
+    # Queue depth by status, None when the database cannot be reached
+    def status(self):
+        connection = connectToDB()
+        if not connection:
+            return None
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT status, COUNT(*) AS emails, TIMESTAMPDIFF(SECOND, MIN(createdAt), NOW()) AS oldestSeconds
+                FROM tblMailOutbox
+                WHERE status <> 'sent'
+                GROUP BY status
+            """)
+            depth = {row['status']: {"emails": row['emails'], "oldestSeconds": row['oldestSeconds']} for row in cursor.fetchall()}
+            return {
+                "queued": depth.get('queued', {"emails": 0, "oldestSeconds": None}),
+                "sending": depth.get('sending', {"emails": 0, "oldestSeconds": None}),
+                "failed": depth.get('failed', {"emails": 0, "oldestSeconds": None}),
+                "workers": len(self.workers),
+                "sentSinceStart": self.sent,
+                "retriedSinceStart": self.retried,
+                "failedSinceStart": self.failed
+            }
+        finally:
+            cursor.close()
+            connection.close()
+
+
+mail_outbox = MailOutbox()
+
+
+# Workers start with the first request so emails queued before a restart are sent without
+# waiting for a new one, the first drain runs right away
+@app.before_request
+def start_mail_outbox():
+    if app.config['MAIL_OUTBOX_ENABLED'] and not mail_outbox.workers:
+        mail_outbox.wake()
+
+
+@app.cli.command('drain-mail')
+def drain_mail():
+    print(f"{mail_outbox.drain()} QUEUED EMAILS SENT")
+
+
+# Outbox queue depth for the admin dashboard
+@app.route('/mail-outbox/status', methods=['GET'])
+@jwt_required()
+@role_required(['Admin'])
+def mail_outbox_status():
+    try:
+        status = mail_outbox.status()
+        if status is None:
+            return jsonify({"message": "Failed to connect to database"}), 500
+        return jsonify(status), 200
+    except Error as err:
+        print(err)
+        return jsonify({"message": "Error reading the mail outbox"}), 500
+
+
 # LV/JU
 # Signup functionality for backend
 # Check backend development notes (Lucas)
@@ -295,22 +857,21 @@ def signup():
                 majorName = major['majorName']
 
                 cursor.execute("INSERT INTO tblStudents (userID, Email, majorName, majorID) VALUES (%s, %s, %s, %s)", (new_user['userID'], email,majorName, majorID))
-                connection.commit()
             elif userType == 'Instructor':
                 cursor.execute("INSERT INTO tblInstructor (userID, Email, FirstName, LastName, approval_status) VALUES (%s, %s, %s, %s, %s)", (new_user['userID'], email, fname, lname, 'pending'))
-                connection.commit()
                 # cursor.execute("INSERT INTO tblInstructor (userID, Email) VALUES (%s, %s)", (new_user['userID'], email))
-                # connection.commit()
-            
-            session['email'] = email
-            access_token = create_access_token(identity={"email": email, "userID": new_user['userID']})
+
             # confirm_url = f"http://localhost:8080/login?token={access_token}"
             confirm_url = f"http://localhost:8080/login/verified=true"
             html = render_template('confirm_template.html', confirm_url=confirm_url)
-            msg = Message("Course Compass - Confirm Your Email", sender="coursecompassunr@gmail.com", recipients=[email])
-            msg.body = f"Please click on the link to confirm your Course Compass account: {confirm_url}"
-            msg.html = html
-            mail.send(msg)            
+            #the confirmation email is committed with the new user and sent by the mail outbox
+            queue_email(cursor, [email], "Course Compass - Confirm Your Email",
+                        f"Please click on the link to confirm your Course Compass account: {confirm_url}", html)
+            connection.commit()
+            mail_outbox.wake()
+
+            session['email'] = email
+            access_token = create_access_token(identity={"email": email, "userID": new_user['userID']})
             print("SIGN UP SUCCESSFUL")
             return jsonify({"message": "Signup successful", "access_token": access_token}), 200
         except Error as err:
@@ -363,10 +924,10 @@ def resend_confirmation_email():
             access_token = create_access_token(identity={"email": email, "userID": user['userID']})
             confirm_url = f"http://localhost:8080/login?token={access_token}"
             html = render_template('confirm_template.html', confirm_url=confirm_url)
-            msg = Message("Course Compass - Confirm Your Email", sender="coursecompassunr@gmail.com", recipients=[email])
-            msg.body = f"Please click on the link to confirm your Course Compass account: {confirm_url}"
-            msg.html = html
-            mail.send(msg)
+            queue_email(cursor, [email], "Course Compass - Confirm Your Email",
+                        f"Please click on the link to confirm your Course Compass account: {confirm_url}", html)
+            connection.commit()
+            mail_outbox.wake()
             return jsonify({"message": "Confirmation email resent"}), 200
         else:
             return jsonify({"message": "Email address not found"}), 404
@@ -582,13 +1143,17 @@ def create_custom_event():
 
         connection = connectToDB()
         cursor = connection.cursor()
+        week_mask_bytes = mask_to_bytes(custom_event_mask(days_of_week, start_time, end_time))
         cursor.execute("""
-            INSERT INTO tblCustomEvents (scheduleID, description, color, startTime, endTime, daysOfWeek)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (schedule_id, description, color, start_time, end_time, days_of_week))
+            INSERT INTO tblCustomEvents (scheduleID, description, color, startTime, endTime, daysOfWeek, weekMask)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (schedule_id, description, color, start_time, end_time, days_of_week, week_mask_bytes))
         connection.commit()
 
         return jsonify({"message": "Custom event created successfully"}), 200
+    except ValueError as e:
+        print(e)
+        return jsonify({"message": "Invalid event time"}), 400
     except Exception as e:
         print(e)
         return jsonify({"message": "Error creating custom event"}), 500
@@ -723,8 +1288,7 @@ def delete_custom_event(event_id):
 @role_required(['Student', 'Instructor'])
 def get_enrolled_courses():
     try:
-        current_user_email = get_jwt_identity()['email']
-        user = User.get_user_by_email(current_user_email)
+        user = get_current_user()
         if not user:
             return jsonify({"message": "User not found"}), 400
 
@@ -761,16 +1325,10 @@ def get_enrolled_courses():
             LEFT JOIN
                 tblInstructor i ON ci.instructorID = i.instructorID
             WHERE 
-                us.studentID = %s AND cs.semesterID = (
-                SELECT semesterID
-                FROM tblSemesters
-                WHERE startDate < CURDATE()
-                ORDER BY startDate ASC
-                LIMIT 1
-            )
+                us.studentID = %s AND cs.semesterID = %s
             GROUP BY cs.scheduleID;
             """
-            cursor.execute(query, (user.studentID,))
+            cursor.execute(query, (user.studentID, semester_calendar.current()))
         elif user.role == 'Instructor':
             # Query for instructor's taught courses
             query = """
@@ -797,16 +1355,10 @@ def get_enrolled_courses():
             JOIN
                 tblInstructor i ON ci.instructorID = i.instructorID
             WHERE 
-                ci.instructorID = %s AND cs.semesterID = (
-                    SELECT semesterID
-                    FROM tblSemesters
-                    WHERE startDate < CURDATE()
-                    ORDER BY startDate ASC
-                    LIMIT 1
-                )
+                ci.instructorID = %s AND cs.semesterID = %s
             GROUP BY cs.scheduleID;
             """
-            cursor.execute(query, (user.instructorID,))
+            cursor.execute(query, (user.instructorID, semester_calendar.current()))
 
         result = cursor.fetchall()
         enrolled_courses = [
@@ -842,8 +1394,7 @@ def get_enrolled_courses():
 @jwt_required()
 def unenroll_course():
     try:
-        current_user_email = get_jwt_identity()['email']
-        user = User.get_user_by_email(current_user_email)
+        user = get_current_user()
         
         if not user or not user.studentID:
             return jsonify({"message": "User not found or not a student"}), 400
@@ -857,6 +1408,8 @@ def unenroll_course():
         
         cursor.callproc('UnenrollCourse', [user.studentID, schedule_id])
         connection.commit()
+        sync_seat_counters(connection, cursor, [schedule_id])
+        waitlist_notifier.wake()
         
         return jsonify({"message": "Course unenrolled successfully"}), 200
     except Error as e:
@@ -867,28 +1420,256 @@ def unenroll_course():
             cursor.close()
         if 'connection' in locals():
             connection.close()
-            
+
+
+# Reference data settings
+# Majors, tags and semesters change a few times a year. Their responses are cached for
+# REFERENCE_CACHE_TTL seconds and browsers may reuse them for REFERENCE_MAX_AGE seconds before
+# revalidating with If-None-Match. Versions in tblReferenceVersions are re-read every
+# REFERENCE_VERSION_CHECK seconds. Set COURSECOMPASS_WARM_REFERENCE_DATA=true to load them at startup.
+app.config['REFERENCE_CACHE_TTL'] = 3600
+app.config['REFERENCE_MAX_AGE'] = 300
+app.config['REFERENCE_VERSION_CHECK'] = 10
+app.config['REFERENCE_WARM_ON_STARTUP'] = os.environ.get('COURSECOMPASS_WARM_REFERENCE_DATA', 'false') == 'true'
+
+
+# Cached JSON bodies of reference data with strong ETags. Keys carry the dataset's version from
+# tblReferenceVersions, which triggers on the reference tables and invalidate() bump, so every
+# process drops its copy within REFERENCE_VERSION_CHECK seconds of a change.
+class ReferenceData:
+    def __init__(self):
+        self.loaders = {}
+        self.versions = {}
+        self.cache = TTLCache(64, app.config['REFERENCE_CACHE_TTL'])
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    # Registers a function returning the JSON payload of a dataset
+    def loader(self, name):
+        def register(func):
+            self.loaders[name] = func
+            self.versions[name] = 0
+            return func
+        return register
+
+    # Current version of a dataset, the versions of all datasets are read with one query
+    def version(self, name):
+        if time.monotonic() - self.checked_at >= app.config['REFERENCE_VERSION_CHECK']:
+            with self.lock:
+                if time.monotonic() - self.checked_at >= app.config['REFERENCE_VERSION_CHECK']:
+                    try:
+                        for row in fetch_reference_rows("SELECT name, version FROM tblReferenceVersions"):
+                            if row['name'] in self.versions:
+                                self.versions[row['name']] = row['version']
+                    except Error as err:
+                        print("Error reading reference data versions:", err)
+                    self.checked_at = time.monotonic()
+        return self.versions[name]
+
+    def get(self, name):
+        key = (name, self.version(name))
+        entry = self.cache.get(key)
+        if entry is None:
+            body = json.dumps(self.loaders[name](), sort_keys=True, default=str)
+            entry = (body, hashlib.sha256(body.encode('utf-8')).hexdigest()[:32])
+            self.cache.set(key, entry)
+        return entry
+
+    # Answers 304 when the client already has this version
+    def response(self, name):
+        body, etag = self.get(name)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['REFERENCE_MAX_AGE']
+        return response.make_conditional(request)
+
+    # Tracks the version of a cache kept outside ReferenceData
+    def watch(self, name):
+        self.versions.setdefault(name, 0)
+
+    # Bumps the shared version, this process reads it back on its next lookup
+    def invalidate(self, name=None):
+        bump_reference_versions([name] if name else list(self.loaders))
+        self.checked_at = 0
+
+    def warm(self):
+        for name in self.loaders:
+            try:
+                self.get(name)
+            except Error as err:
+                print("Error loading reference data", name, err)
+        print("REFERENCE DATA LOADED:", ', '.join(self.loaders))
+
+
+reference_data = ReferenceData()
+
+
+# Version of user_cache, tracked with the reference data versions
+reference_data.watch('users')
+user_cache_version = None
+
+
+# Clears user_cache when another process changed a profile since the last check
+def check_user_cache_version():
+    global user_cache_version
+    version = reference_data.version('users')
+    if version != user_cache_version:
+        user_cache.clear()
+        user_cache_version = version
+
+
+def bump_reference_versions(names):
+    connection = connectToDB()
+    if not connection:
+        raise Error("DB connection failed")
+    cursor = connection.cursor()
+    try:
+        for name in names:
+            cursor.execute("""
+                INSERT INTO tblReferenceVersions (name, version) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+            """, (name,))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def fetch_reference_rows(query):
+    connection = connectToDB()
+    if not connection:
+        raise Error("DB connection failed")
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+
+@reference_data.loader('tags')
+def load_tags():
+    tags = fetch_reference_rows("SELECT tagID, tagName FROM tblTags")
+    return {"tags": [{"id": tag['tagID'], "name": tag['tagName']} for tag in tags]}
+
+
+@reference_data.loader('majors')
+def load_majors():
+    majors = fetch_reference_rows("SELECT majorName FROM cs425.tblMajor")
+    return {"majors": sorted(major['majorName'] for major in majors)}
+
+
+@reference_data.loader('semesters')
+def load_semesters():
+    #dates are written as YYYY-MM-DD
+    return {"semesters": fetch_reference_rows("""
+        SELECT semesterID, semesterName, startDate, endDate, regStartDate, regEndDate
+        FROM tblSemesters ORDER BY startDate
+    """)}
+
+
+# Semester calendar settings
+# Dates of tblSemesters are compared with today's date in SEMESTER_TIMEZONE
+app.config['SEMESTER_TIMEZONE'] = 'America/Los_Angeles'
+
+
+# Resolves the current, next and registration-open semesters in memory. The current semester is the
+# last one that has started, the next one is the first that has not. A resolution is kept until the
+# next start or registration date, tblSemesters is re-read when the semesters reference data is
+# invalidated or after REFERENCE_CACHE_TTL seconds.
+class SemesterCalendar:
+    def __init__(self):
+        self.semesters = None
+        self.version = None
+        self.loaded_at = 0
+        self.resolved = None
+        self.lock = threading.Lock()
+
+    def today(self):
+        return datetime.now(pytz.timezone(app.config['SEMESTER_TIMEZONE'])).date()
+
+    def resolve(self, today=None):
+        today = today or self.today()
+        with self.lock:
+            if (self.semesters is None or self.version != reference_data.version('semesters')
+                    or time.monotonic() - self.loaded_at > app.config['REFERENCE_CACHE_TTL']):
+                self.version = reference_data.version('semesters')
+                self.semesters = fetch_reference_rows("""
+                    SELECT semesterID, semesterName, startDate, regStartDate, regEndDate
+                    FROM tblSemesters WHERE startDate IS NOT NULL ORDER BY startDate, semesterID
+                """)
+                self.loaded_at = time.monotonic()
+                self.resolved = None
+            if self.resolved is None or not self.resolved['from'] <= today < self.resolved['until']:
+                self.resolved = self.calculate(today)
+            return self.resolved
+
+    def calculate(self, today):
+        started = [semester for semester in self.semesters if semester['startDate'] < today]
+        upcoming = [semester for semester in self.semesters if semester['startDate'] >= today]
+        registration = [semester['semesterID'] for semester in self.semesters
+                        if semester['regStartDate'] and semester['regEndDate'] and semester['regStartDate'] <= today <= semester['regEndDate']]
+        #the answer changes the day after a semester starts, on a registration start and the day after a registration end
+        boundaries = [semester['startDate'] + timedelta(days=1) for semester in upcoming]
+        boundaries += [semester['regStartDate'] for semester in self.semesters if semester['regStartDate'] and semester['regStartDate'] > today]
+        boundaries += [semester['regEndDate'] + timedelta(days=1) for semester in self.semesters if semester['regEndDate'] and semester['regEndDate'] >= today]
+        return {
+            'current': started[-1]['semesterID'] if started else None,
+            'next': upcoming[0]['semesterID'] if upcoming else None,
+            'registrationOpen': registration,
+            'from': today,
+            'until': min(boundaries, default=today + timedelta(days=1))
+        }
+
+    def current(self):
+        return self.resolve()['current']
+
+    def next(self):
+        return self.resolve()['next']
+
+    def registration_open(self):
+        return self.resolve()['registrationOpen']
+
+
+semester_calendar = SemesterCalendar()
+
+
 #JU
 #get review tags
 @app.route('/getTags', methods=['GET'])
 def get_tags():
-    connection = connectToDB()
-    if not connection:
-        return jsonify({"error": "DB connection failed"}), 500
-    
     try:
-        cursor = connection.cursor()
-        cursor.execute("SELECT tagID, tagName FROM tblTags")
-        tags = cursor.fetchall()
-        
-        tag_list = [{"id": tag[0], "name": tag[1]} for tag in tags]
-        
-        return jsonify({"tags": tag_list}), 200
+        return reference_data.response('tags')
     except Error as err:
         return jsonify({"error": f"Error retrieving tags: {err}"}), 500
-    finally:
-        cursor.close()
-        connection.close()
+
+
+# List of semesters with their class and registration dates
+@app.route('/semesters', methods=['GET'])
+def get_semesters():
+    try:
+        return reference_data.response('semesters')
+    except Error as err:
+        return jsonify({"error": f"Error retrieving semesters: {err}"}), 500
+
+
+# Drops cached reference data in every process, triggers already do this for edits to tblMajor,
+# tblTags and tblSemesters
+@app.route('/reference-data/invalidate', methods=['POST'])
+@jwt_required()
+@role_required(['Admin'])
+def invalidate_reference_data():
+    name = (request.get_json(silent=True) or {}).get('name')
+    if name and name not in reference_data.loaders:
+        return jsonify({"error": f"Unknown reference data {name}"}), 400
+    try:
+        reference_data.invalidate(name)
+    except Error as err:
+        print(err)
+        return jsonify({"error": "Error invalidating reference data"}), 500
+    return jsonify({"message": "Reference data invalidated", "names": [name] if name else list(reference_data.loaders)}), 200
 
 #JU
 #mark a course as completed
@@ -927,6 +1708,47 @@ def mark_course_completed_endpoint():
         return jsonify({"error": "An internal server error occurred"}), 500
     
 
+# Columns of tblDegreeProgress returned by fetch_degree_progress
+DEGREE_PROGRESS_COLUMNS = ['creditsReq', 'completedCredits', 'completedCourses', 'courses100', 'courses200',
+                           'courses300', 'courses400', 'coursesOther', 'percentComplete']
+
+
+# Same sums as RebuildDegreeProgress for one student, used when their tblDegreeProgress row is missing
+DEGREE_PROGRESS_QUERY = """
+    SELECT COALESCE(m.creditsReq, 0),
+        COALESCE(SUM(c.Credits), 0),
+        COUNT(ucc.completionID),
+        COALESCE(SUM(LEFT(COALESCE(c.Level, ''), 1) = '1'), 0),
+        COALESCE(SUM(LEFT(COALESCE(c.Level, ''), 1) = '2'), 0),
+        COALESCE(SUM(LEFT(COALESCE(c.Level, ''), 1) = '3'), 0),
+        COALESCE(SUM(LEFT(COALESCE(c.Level, ''), 1) = '4'), 0),
+        COALESCE(SUM(ucc.completionID IS NOT NULL AND LEFT(COALESCE(c.Level, ''), 1) NOT IN ('1', '2', '3', '4')), 0)
+    FROM tblStudents s
+    LEFT JOIN tblMajor m ON m.majorID = s.majorID
+    LEFT JOIN tblUserCompletedCourses ucc ON ucc.studentID = s.studentID
+    LEFT JOIN tblCourses c ON c.courseID = ucc.courseID
+    WHERE s.studentID = %s
+    GROUP BY s.studentID, s.majorID, m.creditsReq
+"""
+
+
+# Degree progress of a student from one primary key lookup, the row is kept current by triggers on
+# tblUserCompletedCourses. Students without a row yet (e.g. before RebuildDegreeProgress ran on this
+# database) are summed from tblUserCompletedCourses, their next completion stores the full row.
+def fetch_degree_progress(cursor, user):
+    cursor.execute(f"SELECT {', '.join(DEGREE_PROGRESS_COLUMNS)} FROM tblDegreeProgress WHERE studentID = %s", (user.studentID,))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(DEGREE_PROGRESS_QUERY, (user.studentID,))
+        row = cursor.fetchone() or [0] * (len(DEGREE_PROGRESS_COLUMNS) - 1)
+        credits_req, completed_credits = int(row[0]), int(row[1])
+        percent = round(min(100, completed_credits * 100 / credits_req), 2) if credits_req > 0 else 0
+        row = [int(value) for value in row] + [percent]
+    progress = dict(zip(DEGREE_PROGRESS_COLUMNS, row))
+    progress['percentComplete'] = float(progress['percentComplete'])
+    return progress
+
+
 def mark_course_completed(user_email, course_code, review, tags, student_rating, letter_grade):
     try:
         connection = connectToDB()
@@ -935,24 +1757,14 @@ def mark_course_completed(user_email, course_code, review, tags, student_rating,
         
         cursor = connection.cursor()
         
-        #get the total required credits for the student's major
-        cursor.execute("""
-            SELECT m.creditsReq
-            FROM tblStudents s
-            JOIN tblMajor m ON s.majorID = m.majorID
-            JOIN tblUser u ON s.Email = u.Email
-            WHERE u.Email = %s
-        """, (user_email,))
-        total_required_credits = cursor.fetchone()[0]
+        user = User.get_user_by_email(user_email)
+        if not user or not user.studentID:
+            return False, "User is not a student"
         
-        #calculate the total completed credits for the student
-        cursor.execute("""
-            SELECT SUM(c.Credits)
-            FROM tblUserCompletedCourses ucc
-            JOIN tblCourses c ON ucc.courseID = c.courseID
-            WHERE ucc.Email = %s
-        """, (user_email,))
-        total_completed_credits = cursor.fetchone()[0] or 0
+        #required and completed credits for the student's major
+        progress = fetch_degree_progress(cursor, user)
+        total_required_credits = progress['creditsReq']
+        total_completed_credits = progress['completedCredits']
         
         #credits for the current course
         cursor.execute("""
@@ -1077,20 +1889,10 @@ def fetch_user_course_tags(email):
 # Retrieve majors
 @app.route('/majors', methods=['GET'])
 def get_majors():
-    connection = connectToDB()
-    if connection:
-        cursor = connection.cursor()
-        try:
-            cursor.execute("SELECT majorName FROM cs425.tblMajor")
-            majors = [row[0] for row in cursor.fetchall()]
-            return jsonify({"majors": sorted(majors)}), 200  
-        except Error as err:
-            return jsonify({"error": "Error while fetching majors: " + str(err)}), 500
-        finally:
-            cursor.close()
-            connection.close()
-    else:
-        return jsonify({"error": "DB connection failed"}), 500
+    try:
+        return reference_data.response('majors')
+    except Error as err:
+        return jsonify({"error": "Error while fetching majors: " + str(err)}), 500
    
     
 # LV/JU
@@ -1181,6 +1983,7 @@ def editProfile():
 
         updates = []
         params = []
+        major_changed = False
         if 'firstname' in data:
             updates.append("u.Fname = %s")
             params.append(data['firstname'])
@@ -1196,6 +1999,7 @@ def editProfile():
             updates.append("s.majorName = %s")
             params.append(major_id)
             params.append(major_name)
+            major_changed = True
             print("MAJOR ID MAJOR ID MAJOR ID", data['majorID'])
             print("MAJOR ID NUM NUM NUM", major_id)
         
@@ -1222,8 +2026,13 @@ def editProfile():
             print("With params:", params)    
             cursor.execute(query, params)
             connection.commit()
+            User.invalidate(current_user_email)
 
-        return jsonify({"message": "Profile updated successfully"}), 200
+        response = {"message": "Profile updated successfully"}
+        if major_changed and app.config['JWT_ENRICHED_CLAIMS']:
+            #reissue the token so the majorID claim matches the new major
+            response["access_token"] = create_access_token(identity=build_identity(current_user_email, user_information.userID, user_role))
+        return jsonify(response), 200
     except Error as err:
         print("Error updating profile:", err)
         return jsonify({"message": "An error occurred"}), 500
@@ -1255,6 +2064,7 @@ def changePassword():
         update_query = "UPDATE tblUser SET Passwd = %s WHERE Email = %s"
         cursor.execute(update_query, (hashed_password, email))
         connection.commit()
+        User.invalidate(email)
         if cursor.rowcount == 0:
             return jsonify({"message": "User not found"}), 404
         return jsonify({"message": "Password updated successfully"}), 200
@@ -1282,8 +2092,7 @@ def courses_for_progress_page():
     if connection:
         cursor = connection.cursor()
         try:
-            cursor.execute("SELECT creditsReq FROM tblMajor WHERE majorName = %s", (user.majorName,))
-            total_credits_req = cursor.fetchone()[0]
+            progress = fetch_degree_progress(cursor, user)
 
             cursor.callproc('GetCoursesForProgress', [current_user_email])
             user_courses = []
@@ -1303,7 +2112,8 @@ def courses_for_progress_page():
 
             return jsonify({
                 "majorName": user.majorName,
-                "totalCreditsReq": total_credits_req,
+                "totalCreditsReq": progress['creditsReq'],
+                "progress": progress,
                 "user_courses": course_list
             }), 200
         except Error as err:
@@ -1314,6 +2124,27 @@ def courses_for_progress_page():
     else:
         return jsonify({"error": "DB connection failed"}), 500
     
+# Completed credits, per level course counts and percentage of the student's degree
+@app.route('/degree-progress', methods=['GET'])
+@jwt_required()
+def get_degree_progress():
+    user = get_current_user()
+    if not user or not user.studentID:
+        return jsonify({"error": "User not found or not a student"}), 404
+
+    connection = connectToDB()
+    if not connection:
+        return jsonify({"error": "DB connection failed"}), 500
+    cursor = connection.cursor()
+    try:
+        progress = fetch_degree_progress(cursor, user)
+        return jsonify(progress), 200
+    except Error as err:
+        return jsonify({"error": "Error while fetching degree progress: " + str(err)}), 500
+    finally:
+        cursor.close()
+        connection.close()
+
 #JU
 #get career variables for progress page (left hand side of page)
 @app.route('/getCareerProgress', methods=['GET'])
@@ -1361,17 +2192,11 @@ def get_career_progress():
                 ) g ON us.studentID = g.studentID
             WHERE
                 us.studentID = %s
-                AND cs.semesterID = (
-                    SELECT semesterID
-                    FROM tblSemesters
-                    WHERE startDate < CURDATE()
-                    ORDER BY startDate DESC
-                    LIMIT 1
-                )
+                AND cs.semesterID = %s
             GROUP BY
                 cs.Term, g.cumulativeGPA;
             """
-            cursor.execute(query, (user.studentID,))
+            cursor.execute(query, (user.studentID, semester_calendar.current()))
             result = cursor.fetchone()
 
             if result:
@@ -1392,28 +2217,1018 @@ def get_career_progress():
     else:
         return jsonify({"error": "DB connection failed"}), 500
     
-# LV / JU
-# Retrieve courses related to user input at department search
-@app.route('/search-departments', methods=['GET'])
-@jwt_required()
-def search_departments():
-    query_param = request.args.get('query', '')
-    level_param = request.args.get('level', None)
-    start_time_param = request.args.get('startTime', None)
-    format_param = request.args.get('format', None)
-    location_param = request.args.get('location', None)
-    term_param = request.args.get('term', None)
-    rating_param = request.args.get('rating', None)
-    keywords_param = request.args.get('keywords', '')
-    professor_param = request.args.get('professor', '')
-    course_name_param = request.args.get('courseName', '')
-    
+# Full rebuild of the materialized course search table
+# tblCourseDetails is kept current by triggers, run with: flask --app backend rebuild-course-details
+@app.cli.command('rebuild-course-details')
+def rebuild_course_details():
     connection = connectToDB()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        try:
-            query = """
-            SELECT
+    if not connection:
+        print("DB connection failed")
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.callproc('RebuildCourseDetails')
+        connection.commit()
+        cursor.execute("SELECT COUNT(*) FROM tblCourseDetails")
+        print(f"tblCourseDetails rebuilt with {cursor.fetchone()[0]} rows")
+    except Error as err:
+        connection.rollback()
+        print("Error rebuilding course details:", err)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+# Full rebuild of the degree progress summaries
+# tblDegreeProgress is kept current by triggers, run with: flask --app backend rebuild-degree-progress
+@app.cli.command('rebuild-degree-progress')
+def rebuild_degree_progress():
+    connection = connectToDB()
+    if not connection:
+        print("DB connection failed")
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.callproc('RebuildDegreeProgress')
+        connection.commit()
+        cursor.execute("SELECT COUNT(*) FROM tblDegreeProgress")
+        print(f"tblDegreeProgress rebuilt with {cursor.fetchone()[0]} rows")
+    except Error as err:
+        connection.rollback()
+        print("Error rebuilding degree progress:", err)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minutes(hour, minute, period=None):
+    if period:
+        hour = hour % 12 + (12 if period.upper() == 'PM' else 0)
+    return hour * 60 + minute
+
+
+# meetingDays is stored as 'Monday, Wednesday', returns [0, 2]
+def meeting_day_numbers(days):
+    numbers = []
+    for day in (days or '').split(','):
+        day = day.strip().capitalize()
+        if day in DAY_NAMES:
+            numbers.append(DAY_NAMES.index(day))
+    return numbers
+
+
+# Meeting intervals of a section in minutes from Monday 00:00
+def week_intervals(days, start_minute, end_minute):
+    if start_minute is None or end_minute is None:
+        return []
+    return [(day * MINUTES_PER_DAY + start_minute, day * MINUTES_PER_DAY + end_minute) for day in meeting_day_numbers(days)]
+
+
+# Week masks
+# A week is 7 days of 5 minute slots packed into one integer, bit day * SLOTS_PER_DAY + slot
+# is set when the section or event meets during that slot. Conflict checks are a bitwise AND.
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = MINUTES_PER_DAY // SLOT_MINUTES
+WEEK_MASK_BYTES = 7 * SLOTS_PER_DAY // 8
+WEEK_MASK_ALL = (1 << 7 * SLOTS_PER_DAY) - 1
+
+# Minimum gap between two courses on the same day
+ENROLLMENT_BUFFER_MINUTES = 15
+
+
+@lru_cache(maxsize=4096)
+def week_mask(days, start_minute, end_minute):
+    if start_minute is None or end_minute is None or end_minute <= start_minute:
+        return 0
+    first = start_minute // SLOT_MINUTES
+    last = -(-end_minute // SLOT_MINUTES)
+    run = ((1 << (last - first)) - 1) << first
+    mask = 0
+    for day in meeting_day_numbers(days):
+        mask |= run << day * SLOTS_PER_DAY
+    return mask
+
+
+# Widens every meeting by the buffer on both sides, dilate_mask(a) & b is non zero
+# when a and b meet less than the buffer apart
+@lru_cache(maxsize=4096)
+def dilate_mask(mask, minutes=ENROLLMENT_BUFFER_MINUTES):
+    dilated = mask
+    for shift in range(1, -(-minutes // SLOT_MINUTES) + 1):
+        dilated |= mask << shift | mask >> shift
+    return dilated & WEEK_MASK_ALL
+
+
+def mask_to_bytes(mask):
+    return mask.to_bytes(WEEK_MASK_BYTES, 'little')
+
+
+def mask_from_bytes(value):
+    return int.from_bytes(value, 'little') if value else 0
+
+
+# Custom event times are stored as '3:00 PM'
+def parse_clock(value):
+    match = re.match(r'^\s*(\d{1,2}):(\d{2})\s*(AM|PM)?\s*$', value or '', re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid time: {value}")
+    return to_minutes(int(match.group(1)), int(match.group(2)), match.group(3))
+
+
+def custom_event_mask(days, start, end):
+    return week_mask(days, parse_clock(start), parse_clock(end))
+
+
+# Fills weekMask for custom events saved before the column existed, run with: flask --app backend backfill-event-masks
+@app.cli.command('backfill-event-masks')
+def backfill_event_masks():
+    connection = connectToDB()
+    if not connection:
+        print("DB connection failed")
+        return
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT eventID, startTime, endTime, daysOfWeek FROM tblCustomEvents WHERE weekMask IS NULL")
+        updated = 0
+        for event in cursor.fetchall():
+            try:
+                mask = custom_event_mask(event['daysOfWeek'], event['startTime'], event['endTime'])
+            except ValueError as err:
+                print(f"Skipping custom event {event['eventID']}:", err)
+                continue
+            cursor.execute("UPDATE tblCustomEvents SET weekMask = %s WHERE eventID = %s", (mask_to_bytes(mask), event['eventID']))
+            updated += 1
+        connection.commit()
+        print(f"weekMask filled for {updated} custom events")
+    except Error as err:
+        connection.rollback()
+        print("Error filling custom event masks:", err)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+
+# Idle slots between the first and last class of each day as a week mask
+def gap_mask(mask):
+    gaps = 0
+    for day in range(7):
+        bits = mask >> day * SLOTS_PER_DAY & DAY_MASK
+        if bits:
+            span = (1 << bits.bit_length()) - (bits & -bits)
+            gaps |= (span & ~bits) << day * SLOTS_PER_DAY
+    return gaps
+
+
+# True when the mask has a run of at least length set bits, found with log(length) shift and ANDs
+def has_run(mask, length):
+    covered = 1
+    while mask and covered < length:
+        step = min(covered, length - covered)
+        mask &= mask >> step
+        covered += step
+    return mask != 0
+
+
+def enrollment_section(row):
+    scheduleID, availableSeats, courseCode, startMinute, endMinute, meetingDays, semesterID, *seatShards = row
+    return {'scheduleID': scheduleID, 'availableSeats': availableSeats, 'courseCode': courseCode,
+            'mask': week_mask(meetingDays, startMinute, endMinute), 'semesterID': semesterID,
+            'seatShards': seatShards[0] if seatShards else 0}
+
+
+# Two sections conflict when they meet on the same day less than the buffer apart
+def sections_conflict(first, second):
+    return dilate_mask(first['mask']) & second['mask'] != 0
+
+
+# Start time filter labels look like '8-9 AM' or '11-12 PM', the period belongs to the end hour
+# and the start hour is moved to the other period when it would otherwise come after the end
+def parse_start_time_range(value):
+    match = re.match(r'^\s*(\d{1,2})(?::(\d{2}))?\s*(AM|PM)?\s*-\s*(\d{1,2})(?::(\d{2}))?\s*(AM|PM)\s*$', value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid start time range: {value}")
+    start_hour, start_minute, start_period, end_hour, end_minute, end_period = match.groups()
+    end = to_minutes(int(end_hour), int(end_minute or 0), end_period)
+    start = to_minutes(int(start_hour), int(start_minute or 0), start_period or end_period)
+    if start > end and not start_period:
+        start = to_minutes(int(start_hour), int(start_minute or 0), 'AM' if end_period.upper() == 'PM' else 'PM')
+    return start, end
+
+
+# Free blocks are given as 'Monday 9:00-12:00,Wednesday 13:00-17:30' in 24 hour time,
+# returns merged minute of week intervals
+def parse_free_blocks(value):
+    blocks = []
+    for block in value.split(','):
+        match = re.match(r'^\s*([A-Za-z]+)\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$', block)
+        if not match or match.group(1).capitalize() not in DAY_NAMES:
+            raise ValueError(f"Invalid free block: {block}")
+        offset = DAY_NAMES.index(match.group(1).capitalize()) * MINUTES_PER_DAY
+        start = offset + to_minutes(int(match.group(2)), int(match.group(3)))
+        end = offset + to_minutes(int(match.group(4)), int(match.group(5)))
+        if end <= start:
+            raise ValueError(f"Invalid free block: {block}")
+        blocks.append((start, end))
+    blocks.sort()
+    merged = []
+    for start, end in blocks:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# Search parameters from the request in the form CourseCatalog.match expects
+def search_filters():
+    filters = {}
+    for name in ('query', 'format', 'location', 'term', 'professor', 'courseName'):
+        if request.args.get(name):
+            filters[name] = request.args.get(name)
+    if request.args.get('level'):
+        filters['level'] = int(request.args.get('level').rstrip('+'))
+    if request.args.get('rating'):
+        filters['rating'] = float(request.args.get('rating'))
+    if request.args.get('keywords'):
+        filters['keywords'] = request.args.get('keywords').split(',')
+    if request.args.get('startTime'):
+        filters['startTime'] = parse_start_time_range(unquote(request.args.get('startTime')))
+    if request.args.get('freeBlocks'):
+        filters['freeBlocks'] = parse_free_blocks(request.args.get('freeBlocks'))
+    if request.args.get('showCoursesFromMajor') == 'true':
+        user = get_current_user()
+        if user and user.majorID:
+            filters['majorID'] = user.majorID
+    #full text query, ignored when it only has stop words
+    if request.args.get('q') and text_terms(request.args.get('q')):
+        filters['q'] = request.args.get('q')
+    return filters
+
+
+# Search pagination settings, results are only paginated when limit or cursor is given
+app.config['SEARCH_PAGE_SIZE'] = 50
+app.config['SEARCH_MAX_PAGE_SIZE'] = 200
+
+SEARCH_FIELDS = ['scheduleID', 'section', 'professors', 'courseName', 'courseCode', 'courseMajor', 'department', 'term',
+                 'format', 'units', 'meetingTime', 'Location', 'days', 'classCapacity', 'enrollmentTotal',
+                 'availableSeats', 'averageRating', 'frequentTags']
+
+
+# Facets returned with facets=true and the search filter each one corresponds to
+SEARCH_FACETS = {'level': 'level', 'format': 'format', 'term': 'term', 'building': 'location', 'tag': 'keywords'}
+
+
+# Search results are ordered by this key, it is also the keyset cursor between pages
+def course_sort_key(row):
+    return (str(row['courseLevel'] or ''), row['courseCode'] or '', row['scheduleID'], row['majorID'] or 0)
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {value}")
+    #full text searches put the relevance score in front of the sort key
+    if not isinstance(key, list) or len(key) not in (4, 5):
+        raise ValueError(f"Invalid cursor: {value}")
+    return tuple(key)
+
+
+# limit, cursor, fields and includeTotal parameters of a search
+def search_page_options():
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args.get('fields').split(',') if field.strip()]
+        unknown = [field for field in fields if field not in SEARCH_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    limit = int(request.args.get('limit', app.config['SEARCH_PAGE_SIZE']))
+    if limit < 1:
+        raise ValueError(f"Invalid limit: {limit}")
+    return {
+        'paginate': 'limit' in request.args or 'cursor' in request.args,
+        'facets': request.args.get('facets') == 'true',
+        'limit': min(limit, app.config['SEARCH_MAX_PAGE_SIZE']),
+        'cursor': decode_cursor(request.args.get('cursor')) if request.args.get('cursor') else None,
+        'fields': fields,
+        'include_total': request.args.get('includeTotal') == 'true'
+    }
+
+
+def project_fields(courses, fields):
+    if not fields:
+        return courses
+    return [{field: course[field] for field in fields} for course in courses]
+
+
+def search_page_response(courses, next_cursor, total, page, facets=None):
+    response = {
+        "results": project_fields(courses, page['fields']),
+        "nextCursor": encode_cursor(next_cursor) if next_cursor else None
+    }
+    if page['include_total']:
+        response["total"] = total
+    if page['facets']:
+        response["facets"] = facets
+    return jsonify(response), 200
+
+
+# Course catalog settings
+# The catalog is a snapshot of tblCourseDetails held in memory. tblCatalogVersion is checked every
+# CATALOG_VERSION_CHECK seconds and a new snapshot is built when it changes, seat counts change with
+# every enrollment so they are reloaded on their own every CATALOG_SEATS_TTL seconds. Ratings have their
+# own ratingVersion, only the rating fields of the courses rated since the last check are patched.
+app.config['CATALOG_INDEX_ENABLED'] = True
+app.config['CATALOG_VERSION_CHECK'] = 5
+app.config['CATALOG_SEATS_TTL'] = 10
+
+
+def format_course_row(dept):
+    return {
+        'scheduleID': dept['scheduleID'],
+        'section': dept['Section'],
+        'professors': dept['professors'].split(',') if dept['professors'] else [],
+        'courseName': dept['courseName'],
+        'courseCode': dept['courseCode'],
+        'courseMajor': dept['courseMajor'],
+        'department': dept['department'],
+        'term': dept['term'],
+        'format': dept['format'],
+        'units': dept['units'],
+        'meetingTime': dept['meetingTime'],
+        'Location': dept['Location'],
+        'days': dept['days'],
+        'classCapacity': dept['classCapacity'],
+        'enrollmentTotal': dept['enrollmentTotal'],
+        'availableSeats': dept['availableSeats'],
+        'averageRating': dept['averageRating'],
+        'frequentTags': dept['frequentTags'].split(', ')[:4] if dept['frequentTags'] else [],
+    }
+
+
+def building_of(location):
+    #same as LEFT(Location, LOCATE(' ', Location) - 1) in SQL
+    if not location or ' ' not in location:
+        return ''
+    return location.split(' ', 1)[0]
+
+
+def ngrams(text, n=3):
+    text = text.lower()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# Full text search settings
+# Ranked with BM25 over the course name, description and requirements, a match in the
+# course name counts TEXT_FIELD_WEIGHTS times as much as one in the other fields
+TEXT_FIELD_WEIGHTS = {'courseName': 3, 'description': 1, 'Requirements': 1}
+BM25_K1 = 1.2
+BM25_B = 0.75
+TEXT_STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it', 'of',
+                   'on', 'or', 'that', 'the', 'this', 'to', 'with'}
+
+
+def text_terms(text):
+    terms = []
+    for word in re.findall(r'[a-z0-9]+', (text or '').lower()):
+        if word in TEXT_STOP_WORDS:
+            continue
+        #plural and singular forms index to the same term
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+# Inverted index from term to the courses containing it, courses are added and
+# replaced one at a time so edits to tblCourses never need a full rebuild
+class TextIndex:
+    def __init__(self):
+        self.postings = {}
+        self.course_terms = {}
+        self.lengths = {}
+        self.total_length = 0
+
+    def add(self, course):
+        courseID = course['courseID']
+        self.remove(courseID)
+        frequencies = {}
+        for field, weight in TEXT_FIELD_WEIGHTS.items():
+            for term in text_terms(course.get(field)):
+                frequencies[term] = frequencies.get(term, 0) + weight
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[courseID] = frequency
+        self.course_terms[courseID] = frequencies
+        self.lengths[courseID] = sum(frequencies.values())
+        self.total_length += self.lengths[courseID]
+
+    # Copy that can be changed while searches keep reading this index
+    def copy(self):
+        index = TextIndex()
+        index.postings = {term: dict(postings) for term, postings in self.postings.items()}
+        index.course_terms = dict(self.course_terms)
+        index.lengths = dict(self.lengths)
+        index.total_length = self.total_length
+        return index
+
+    def remove(self, courseID):
+        for term in self.course_terms.pop(courseID, {}):
+            postings = self.postings[term]
+            del postings[courseID]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(courseID, 0)
+
+    # BM25 score of every course matching at least one query term
+    def scores(self, text):
+        count = len(self.lengths)
+        if not count:
+            return {}
+        average_length = self.total_length / count or 1
+        scores = {}
+        for term in set(text_terms(text)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for courseID, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[courseID] / average_length)
+                scores[courseID] = scores.get(courseID, 0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+
+class TextSearchCache:
+    def __init__(self):
+        self.index = None
+        self.updated_at = None
+        #courses already indexed with updatedAt equal to updated_at
+        self.updated_ids = set()
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    # Courses changed since the last check are re-indexed every CATALOG_VERSION_CHECK seconds,
+    # None when the index could not be loaded. Only one request refreshes, the others keep
+    # scoring against the previous index.
+    def scores(self, text):
+        if self.index is None or time.monotonic() - self.checked_at >= app.config['CATALOG_VERSION_CHECK']:
+            if self.lock.acquire(blocking=self.index is None):
+                try:
+                    if self.index is None or time.monotonic() - self.checked_at >= app.config['CATALOG_VERSION_CHECK']:
+                        self.update()
+                finally:
+                    self.lock.release()
+        index = self.index
+        if index is None:
+            return None
+        return index.scores(text)
+
+    # Changes are made to a copy of the index that replaces it when done
+    def update(self):
+        connection = connectToDB()
+        if not connection:
+            return
+        cursor = connection.cursor(dictionary=True)
+        try:
+            query = "SELECT courseID, courseName, description, Requirements, updatedAt FROM tblCourses"
+            updated_at = self.updated_at
+            if self.index is not None and updated_at is not None:
+                #>= so courses changed later in the same second are not missed, the ones already indexed at that time are skipped
+                cursor.execute(query + " WHERE updatedAt >= %s", (updated_at,))
+                changed = [course for course in cursor.fetchall()
+                           if course['updatedAt'] != updated_at or course['courseID'] not in self.updated_ids]
+                #the index holds every course, so it only holds deleted ones when it has more than the table
+                indexed = set(self.index.lengths) | {course['courseID'] for course in changed}
+                cursor.execute("SELECT COUNT(*) AS courses FROM tblCourses")
+                deleted = set()
+                if cursor.fetchone()['courses'] < len(indexed):
+                    cursor.execute("SELECT courseID FROM tblCourses")
+                    deleted = indexed - {row['courseID'] for row in cursor.fetchall()}
+            else:
+                cursor.execute(query)
+                changed = cursor.fetchall()
+                deleted = set()
+            if self.index is None or changed or deleted:
+                index = self.index.copy() if self.index is not None else TextIndex()
+                for courseID in deleted:
+                    index.remove(courseID)
+                updated_ids = self.updated_ids
+                for course in changed:
+                    index.add(course)
+                    if updated_at is None or course['updatedAt'] > updated_at:
+                        updated_at = course['updatedAt']
+                        updated_ids = set()
+                    if course['updatedAt'] == updated_at:
+                        updated_ids = updated_ids | {course['courseID']}
+                self.index = index
+                self.updated_at = updated_at
+                self.updated_ids = updated_ids
+            self.checked_at = time.monotonic()
+        except Error as err:
+            print("Error updating text search index:", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+
+text_search_cache = TextSearchCache()
+
+
+# Snapshot of the course catalog with an index for every search filter,
+# rows are kept in search result order so a set of row positions sorts into results
+class CourseCatalog:
+    def __init__(self, rows, version, rating_version=0):
+        self.version = version
+        self.rating_version = rating_version
+        self.rows = sorted(rows, key=course_sort_key)
+        self.sort_keys = [course_sort_key(row) for row in self.rows]
+        rows = self.rows
+        self.results = [format_course_row(row) for row in rows]
+        self.all_rows = set(range(len(rows)))
+        self.majors = sorted(((row['courseMajor'] or '').lower(), i) for i, row in enumerate(rows))
+        self.major_keys = [major for major, i in self.majors]
+        self.ratings = sorted((float(row['averageRating'] or 0), i) for i, row in enumerate(rows))
+        self.rating_keys = [rating for rating, i in self.ratings]
+        self.start_times = sorted((row['startMinute'], i) for i, row in enumerate(rows) if row['startMinute'] is not None)
+        self.start_time_keys = [minute for minute, i in self.start_times]
+        self.meetings = sorted((start, end, i) for i, row in enumerate(rows)
+                               for start, end in week_intervals(row['days'], row['startMinute'], row['endMinute']))
+        self.meeting_keys = [start for start, end, i in self.meetings]
+        self.meeting_counts = {}
+        for start, end, i in self.meetings:
+            self.meeting_counts[i] = self.meeting_counts.get(i, 0) + 1
+        self.unscheduled = {i for i in range(len(rows)) if i not in self.meeting_counts}
+        self.levels = {}
+        self.formats = {}
+        self.terms = {}
+        self.buildings = {}
+        self.major_ids = {}
+        self.tags = {}
+        self.professor_grams = {}
+        self.name_grams = {}
+        self.positions = {}
+        self.course_rows = {}
+        self.facet_values = {facet: [] for facet in SEARCH_FACETS}
+        for i, row in enumerate(rows):
+            self.facet_values['level'].append([str(row['courseLevel']).strip()] if row['courseLevel'] is not None else [])
+            self.facet_values['format'].append([row['format']] if row['format'] else [])
+            self.facet_values['term'].append([row['term']] if row['term'] else [])
+            self.facet_values['building'].append([building_of(row['Location'])] if building_of(row['Location']) else [])
+            self.facet_values['tag'].append([tag for tag in (row['frequentTags'] or '').split(', ') if tag])
+            self.levels.setdefault(str(row['courseLevel']).strip(), set()).add(i)
+            self.formats.setdefault((row['format'] or '').lower(), set()).add(i)
+            self.terms.setdefault((row['term'] or '').lower(), set()).add(i)
+            self.buildings.setdefault(building_of(row['Location']).lower(), set()).add(i)
+            self.major_ids.setdefault(row['majorID'], set()).add(i)
+            for tag in (row['frequentTags'] or '').split(', '):
+                if tag:
+                    self.tags.setdefault(tag.lower(), set()).add(i)
+            for gram in ngrams(row['professors'] or ''):
+                self.professor_grams.setdefault(gram, set()).add(i)
+            for gram in ngrams(row['courseName'] or ''):
+                self.name_grams.setdefault(gram, set()).add(i)
+            self.positions.setdefault(row['scheduleID'], []).append(i)
+            self.course_rows.setdefault(row['courseID'], []).append(i)
+
+    def prefix(self, keys, entries, value):
+        start = bisect.bisect_left(keys, value)
+        end = bisect.bisect_left(keys, value + '\uffff')
+        return {i for key, i in entries[start:end]}
+
+    def substring(self, grams, field, value):
+        value = value.lower()
+        candidates = None
+        for gram in ngrams(value):
+            candidates = grams.get(gram, set()) if candidates is None else candidates & grams.get(gram, set())
+            if not candidates:
+                return set()
+        if candidates is None:
+            candidates = self.all_rows
+        return {i for i in candidates if value in (self.rows[i][field] or '').lower()}
+
+    # Row sets matching each filter, filters holds the parsed search parameters and unknown keys are ignored.
+    # q is the text search scores by courseID rather than the query text.
+    def filter_sets(self, filters):
+        matches = {}
+        if 'q' in filters:
+            matches['q'] = {i for courseID in filters['q'] for i in self.course_rows.get(courseID, [])}
+        if 'query' in filters:
+            matches['query'] = self.prefix(self.major_keys, self.majors, filters['query'].lower())
+        if 'level' in filters:
+            matches['level'] = self.levels.get(str(filters['level']), set())
+        if 'format' in filters:
+            matches['format'] = self.formats.get(filters['format'].lower(), set())
+        if 'location' in filters:
+            matches['location'] = self.buildings.get(filters['location'].lower(), set())
+        if 'term' in filters:
+            matches['term'] = self.terms.get(filters['term'].lower(), set())
+        if 'rating' in filters:
+            start = bisect.bisect_left(self.rating_keys, filters['rating'])
+            matches['rating'] = {i for rating, i in self.ratings[start:]}
+        if 'keywords' in filters:
+            tagged = set()
+            for keyword in filters['keywords']:
+                tagged |= self.tags.get(keyword.strip().lower(), set())
+            matches['keywords'] = tagged
+        if 'majorID' in filters:
+            matches['majorID'] = self.major_ids.get(filters['majorID'], set())
+        if 'startTime' in filters:
+            lower, upper = filters['startTime']
+            start = bisect.bisect_left(self.start_time_keys, lower)
+            end = bisect.bisect_right(self.start_time_keys, upper)
+            matches['startTime'] = {i for minute, i in self.start_times[start:end]}
+        if 'freeBlocks' in filters:
+            matches['freeBlocks'] = self.fits(filters['freeBlocks'])
+        if 'professor' in filters:
+            matches['professor'] = self.substring(self.professor_grams, 'professors', filters['professor'])
+        if 'courseName' in filters:
+            matches['courseName'] = self.substring(self.name_grams, 'courseName', filters['courseName'])
+        return matches
+
+    def intersect(self, matches):
+        if not matches:
+            return self.all_rows
+        matches = sorted(matches, key=len)
+        result = set(matches[0])
+        for match in matches[1:]:
+            result &= match
+            if not result:
+                break
+        return result
+
+    def match(self, filters):
+        return sorted(self.intersect(list(self.filter_sets(filters).values())), key=self.order_key(filters))
+
+    # Text searches are ordered by relevance first, sections of equally relevant courses keep catalog order
+    def order_key(self, filters):
+        if 'q' not in filters:
+            return None
+        scores = filters['q']
+        return lambda i: (-scores[self.rows[i]['courseID']], i)
+
+    def page_key(self, filters, i):
+        if 'q' not in filters:
+            return self.sort_keys[i]
+        return (filters['q'][self.rows[i]['courseID']],) + self.sort_keys[i]
+
+    # Counts per facet value for the current filters, each facet ignores its own filter
+    # so the other values of a selected facet still show how many results they would give
+    def facets(self, filters):
+        matches = self.filter_sets(filters)
+        facets = {}
+        for facet, filter_name in SEARCH_FACETS.items():
+            rows = self.intersect([match for name, match in matches.items() if name != filter_name])
+            counts = {}
+            values = self.facet_values[facet]
+            for i in rows:
+                for value in values[i]:
+                    counts[value] = counts.get(value, 0) + 1
+            facets[facet] = counts
+        return facets
+
+    # Sections whose meetings all lie inside one of the free blocks, sections without
+    # meeting times never conflict so they always fit
+    def fits(self, blocks):
+        contained = {}
+        for block_start, block_end in blocks:
+            start = bisect.bisect_left(self.meeting_keys, block_start)
+            end = bisect.bisect_right(self.meeting_keys, block_end)
+            for meeting_start, meeting_end, i in self.meetings[start:end]:
+                if meeting_end <= block_end:
+                    contained[i] = contained.get(i, 0) + 1
+        return {i for i, count in contained.items() if count == self.meeting_counts[i]} | self.unscheduled
+
+    def search(self, filters):
+        return [self.results[i] for i in self.match(filters)]
+
+    # One page of results after the cursor key, with the cursor for the next page and the match count
+    def search_page(self, filters, after, limit):
+        matched = self.match(filters)
+        start = 0
+        if after and 'q' in filters:
+            score, key = after[0], tuple(after[1:])
+            #bisect has no key argument before Python 3.10
+            keys = [(-filters['q'][self.rows[i]['courseID']], self.sort_keys[i]) for i in matched]
+            start = bisect.bisect_right(keys, (-score, key))
+        elif after:
+            start = bisect.bisect_left(matched, bisect.bisect_right(self.sort_keys, tuple(after)))
+        page = matched[start:start + limit]
+        next_cursor = self.page_key(filters, page[-1]) if page and start + limit < len(matched) else None
+        return [self.results[i] for i in page], next_cursor, len(matched)
+
+    def update_seats(self, seats):
+        for scheduleID, classCapacity, enrollmentTotal, availableSeats in seats:
+            for i in self.positions.get(scheduleID, []):
+                for target in (self.rows[i], self.results[i]):
+                    target['classCapacity'] = classCapacity
+                    target['enrollmentTotal'] = enrollmentTotal
+                    target['availableSeats'] = availableSeats
+
+    # Rating fields of the given courses, the rating and tag indexes are replaced rather than changed
+    # so searches running meanwhile never see a set or list change under them
+    def update_ratings(self, ratings):
+        tags = dict(self.tags)
+        for courseID, averageRating, frequentTags in ratings:
+            for i in self.course_rows.get(courseID, []):
+                row = self.rows[i]
+                for tag in self.facet_values['tag'][i]:
+                    tags[tag.lower()] = tags.get(tag.lower(), set()) - {i}
+                row['averageRating'] = averageRating
+                row['frequentTags'] = frequentTags
+                self.results[i]['averageRating'] = averageRating
+                self.results[i]['frequentTags'] = frequentTags.split(', ')[:4] if frequentTags else []
+                self.facet_values['tag'][i] = [tag for tag in (frequentTags or '').split(', ') if tag]
+                for tag in self.facet_values['tag'][i]:
+                    tags[tag.lower()] = tags.get(tag.lower(), set()) | {i}
+        ratings = sorted((float(row['averageRating'] or 0), i) for i, row in enumerate(self.rows))
+        self.ratings, self.rating_keys = ratings, [rating for rating, i in ratings]
+        self.tags = tags
+
+
+class CatalogCache:
+    def __init__(self):
+        self.catalog = None
+        self.checked_at = 0
+        self.seats_loaded_at = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        catalog = self.catalog
+        if catalog and now - self.checked_at < app.config['CATALOG_VERSION_CHECK'] and now - self.seats_loaded_at < app.config['CATALOG_SEATS_TTL']:
+            return catalog
+        with self.lock:
+            now = time.monotonic()
+            if self.catalog is None or now - self.checked_at >= app.config['CATALOG_VERSION_CHECK']:
+                self.refresh()
+            if now - self.seats_loaded_at >= app.config['CATALOG_SEATS_TTL']:
+                self.reload_seats()
+            return self.catalog
+
+    def refresh(self, force=False):
+        connection = connectToDB()
+        if not connection:
+            return
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT catalogVersion, ratingVersion FROM tblCatalogVersion WHERE id = 1")
+            row = cursor.fetchone()
+            version = row['catalogVersion'] if row else 0
+            rating_version = row['ratingVersion'] if row else 0
+            self.checked_at = time.monotonic()
+            if not force and self.catalog is not None and self.catalog.version == version:
+                if self.catalog.rating_version != rating_version:
+                    #summaries are stamped with the ratingVersion of their last change
+                    cursor.execute("""
+                        SELECT courseID, averageRating, frequentTags FROM tblCourseRatingSummary WHERE ratingVersion > %s
+                    """, (self.catalog.rating_version,))
+                    self.catalog.update_ratings([(row['courseID'], row['averageRating'], row['frequentTags']) for row in cursor.fetchall()])
+                    self.catalog.rating_version = rating_version
+                return
+            cursor.execute("""
+                SELECT scheduleID, courseID, Section, courseName, courseCode, courseMajor, majorID, department, professors,
+                    term, format, units, meetingTime, startMinute, endMinute, Location, days, classCapacity,
+                    enrollmentTotal, availableSeats, averageRating, courseLevel, frequentTags
+                FROM tblCourseDetails
+                ORDER BY courseLevel, courseCode, scheduleID, majorID
+            """)
+            self.catalog = CourseCatalog(cursor.fetchall(), version, rating_version)
+            self.seats_loaded_at = time.monotonic()
+            print(f"COURSE CATALOG LOADED, VERSION {version}, {len(self.catalog.rows)} ROWS")
+        except Error as err:
+            print("Error loading course catalog:", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+    def reload_seats(self):
+        if self.catalog is None:
+            return
+        connection = connectToDB()
+        if not connection:
+            return
+        cursor = connection.cursor()
+        try:
+            #sharded sections only keep their open seats in the shard rows
+            cursor.execute("""
+                SELECT cs.scheduleID, cs.classCapacity,
+                    IF(cs.seatShards > 0, cs.classCapacity - COALESCE(sh.availableSeats, 0), cs.enrollmentTotal),
+                    IF(cs.seatShards > 0, COALESCE(sh.availableSeats, 0), cs.availableSeats)
+                FROM tblcourseSchedule cs
+                LEFT JOIN (
+                    SELECT scheduleID, SUM(availableSeats) AS availableSeats FROM tblSeatCounterShards GROUP BY scheduleID
+                ) sh ON sh.scheduleID = cs.scheduleID
+            """)
+            self.catalog.update_seats(cursor.fetchall())
+            self.seats_loaded_at = time.monotonic()
+        except Error as err:
+            print("Error reloading catalog seats:", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+    def invalidate(self):
+        self.checked_at = 0
+
+
+catalog_cache = CatalogCache()
+
+
+# Typeahead settings
+app.config['SUGGEST_LIMIT'] = 8
+app.config['SUGGEST_MAX_LIMIT'] = 25
+
+SUGGEST_TYPE_RANK = {'course': 0, 'instructor': 1}
+
+
+# Sorted prefix index over course codes, course name words and instructor names.
+# Every entry is stored under several keys so 'cs1', 'struct' and 'keith' all find it.
+class SuggestIndex:
+    def __init__(self, courses, instructors, version):
+        self.version = version
+        self.entries = []
+        keys = []
+        for course in courses:
+            code = course['courseCode'] or ''
+            name = course['courseName'] or ''
+            label = f"{code} - {name}" if code else name
+            entry = len(self.entries)
+            self.entries.append({'type': 'course', 'value': code, 'label': label, 'courseCode': code, 'courseName': name})
+            for key in {code.lower(), code.replace(' ', '').lower(), name.lower()} | set(re.findall(r'\w+', label.lower())):
+                if key:
+                    keys.append((key, entry))
+        for instructor in instructors:
+            name = f"{instructor['FirstName'] or ''} {instructor['LastName'] or ''}".strip()
+            if not name:
+                continue
+            entry = len(self.entries)
+            self.entries.append({'type': 'instructor', 'value': name, 'label': name, 'instructorID': instructor['instructorID']})
+            for key in {name.lower()} | set(name.lower().split()):
+                keys.append((key, entry))
+        keys.sort()
+        self.keys = [key for key, entry in keys]
+        self.key_entries = [entry for key, entry in keys]
+        self.labels = [entry['label'].lower() for entry in self.entries]
+        self.values = [entry['value'].lower() for entry in self.entries]
+        #courses before instructors, then alphabetical
+        order = sorted(range(len(self.entries)), key=lambda entry: (SUGGEST_TYPE_RANK[self.entries[entry]['type']], self.labels[entry]))
+        self.order = [0] * len(self.entries)
+        for position, entry in enumerate(order):
+            self.order[entry] = position
+
+    def candidates(self, prefix):
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\uffff')
+        return set(self.key_entries[start:end])
+
+    def suggest(self, text, limit):
+        text = ' '.join(text.lower().split())
+        if not text:
+            return []
+        #whole input as a prefix ('cs 13', 'data struct') or every word as a word prefix ('struct data')
+        found = self.candidates(text)
+        tokens = re.findall(r'\w+', text)
+        if len(tokens) > 1:
+            found |= set.intersection(*sorted((self.candidates(token) for token in tokens), key=len))
+
+        #entries whose label or value starts with the input come first
+        labels, values, order = self.labels, self.values, self.order
+        def rank(entry):
+            if labels[entry].startswith(text) or values[entry].startswith(text):
+                return order[entry]
+            return order[entry] + len(order)
+
+        return [self.entries[entry] for entry in heapq.nsmallest(limit, found, key=rank)]
+
+
+class SuggestCache:
+    def __init__(self):
+        self.index = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    # Rebuilt when the catalog version or the approved instructors change, checked every
+    # CATALOG_VERSION_CHECK seconds without touching the catalog snapshot or its seat counts.
+    # Only one request checks, the others keep suggesting from the previous index.
+    def get(self):
+        if self.index is None or time.monotonic() - self.checked_at >= app.config['CATALOG_VERSION_CHECK']:
+            if self.lock.acquire(blocking=self.index is None):
+                try:
+                    if self.index is None or time.monotonic() - self.checked_at >= app.config['CATALOG_VERSION_CHECK']:
+                        self.refresh()
+                finally:
+                    self.lock.release()
+        return self.index
+
+    def refresh(self):
+        connection = connectToDB()
+        if not connection:
+            return
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT v.catalogVersion, COUNT(i.instructorID) AS instructors, COALESCE(SUM(i.instructorID), 0) AS instructorSum
+                FROM tblCatalogVersion v
+                LEFT JOIN tblInstructor i ON i.approval_status = 'approved'
+                WHERE v.id = 1
+                GROUP BY v.catalogVersion
+            """)
+            row = cursor.fetchone()
+            version = (row['catalogVersion'], row['instructors'], int(row['instructorSum'])) if row else None
+            self.checked_at = time.monotonic()
+            if self.index is not None and self.index.version == version:
+                return
+            cursor.execute("SELECT courseID, courseCode, courseName FROM tblCourses")
+            courses = cursor.fetchall()
+            cursor.execute("SELECT instructorID, FirstName, LastName FROM tblInstructor WHERE approval_status = 'approved'")
+            instructors = cursor.fetchall()
+            self.index = SuggestIndex(courses, instructors, version)
+        except Error as err:
+            print("Error building suggest index:", err)
+        finally:
+            cursor.close()
+            connection.close()
+
+
+suggest_cache = SuggestCache()
+
+
+# LV / JU
+# Retrieve courses related to user input at department search
+@app.route('/search-departments', methods=['GET'])
+@jwt_required()
+def search_departments():
+    query_param = request.args.get('query', '')
+    level_param = request.args.get('level', None)
+    format_param = request.args.get('format', None)
+    location_param = request.args.get('location', None)
+    term_param = request.args.get('term', None)
+    rating_param = request.args.get('rating', None)
+    keywords_param = request.args.get('keywords', '')
+    professor_param = request.args.get('professor', '')
+    course_name_param = request.args.get('courseName', '')
+
+    try:
+        filters = search_filters()
+        page = search_page_options()
+    except ValueError as err:
+        print(err)
+        return jsonify({"message": "Invalid search filters"}), 400
+    if page['cursor'] and len(page['cursor']) != (5 if 'q' in filters else 4):
+        return jsonify({"message": "Invalid search filters"}), 400
+
+    #answer from the in-memory catalog when it is available
+    if app.config['CATALOG_INDEX_ENABLED']:
+        catalog = catalog_cache.get()
+        catalog_filters = filters
+        if catalog is not None and 'q' in filters:
+            scores = text_search_cache.scores(filters['q'])
+            catalog_filters = dict(filters, q=scores) if scores is not None else None
+        if catalog is not None and catalog_filters is not None:
+            facets = catalog.facets(catalog_filters) if page['facets'] else None
+            if not page['paginate']:
+                if page['facets']:
+                    courses = catalog.search(catalog_filters)
+                    return search_page_response(courses, None, len(courses), page, facets)
+                return jsonify(project_fields(catalog.search(catalog_filters), page['fields'])), 200
+            courses, next_cursor, total = catalog.search_page(catalog_filters, page['cursor'], page['limit'])
+            return search_page_response(courses, next_cursor, total, page, facets)
+    
+    connection = connectToDB()
+    if connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            params = []
+            filters_applied = False
+
+            text_column = ""
+            text_join = ""
+            if 'q' in filters:
+                #relevance from the FULLTEXT index on tblCourses, only matching courses are joined. It is
+                #kept as an integer in millionths so the page cursor compares equal to the stored value
+                text_column = ",\n                relevance"
+                text_join = """
+                JOIN (
+                    SELECT courseID AS textCourseID,
+                        CAST(ROUND(MATCH(courseName, description, Requirements) AGAINST (%s IN NATURAL LANGUAGE MODE) * 1000000) AS SIGNED) AS relevance
+                    FROM tblCourses
+                    WHERE MATCH(courseName, description, Requirements) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                ) AS text_matches ON text_matches.textCourseID = tblCourseDetails.courseID"""
+                params.extend([filters['q'], filters['q']])
+                filters_applied = True
+
+            query = f"""
+            SELECT
                 scheduleID,
                 Section,
                 courseName,
@@ -1432,16 +3247,14 @@ def search_departments():
                 availableSeats,
                 averageRating,
                 courseLevel,
-                frequentTags
+                frequentTags,
+                majorID{text_column}
             FROM 
-                vwCourseDetails
+                tblCourseDetails{text_join}
             WHERE 
                 1=1
             """
             
-            params = []
-            filters_applied = False
-            
             if 'query' in request.args and query_param:
                 query += " AND courseMajor LIKE %s"
                 params.append(f"{query_param}%")
@@ -1454,15 +3267,18 @@ def search_departments():
                 params.append(numeric_level)
                 filters_applied = True
             
-            if 'startTime' in request.args and start_time_param:
-                start_time_param = unquote(request.args.get('startTime', ''))
-                start_time_range = start_time_param.split('-')
-                start_time_lower = datetime.strptime(start_time_range[0].strip() + start_time_range[1][-2:].strip(), '%I%p').time()
-                end_time_value = start_time_range[1].strip().split(' ')[0]  # Extract the end time value
-                end_time_period = start_time_range[1][-2:].strip()  # Extract AM or PM
-                start_time_upper = datetime.strptime(end_time_value + end_time_period, '%I%p').time()
-                query += " AND (TIME_FORMAT(LEFT(meetingTime, LOCATE('-', meetingTime) - 1), '%h:%i %p') BETWEEN %s AND %s OR TIME_FORMAT(LEFT(meetingTime, LOCATE('-', meetingTime) - 1), '%H:%i') BETWEEN TIME_FORMAT(%s, '%H:%i') AND TIME_FORMAT(%s, '%H:%i'))"
-                params.extend([start_time_lower.strftime('%I:%M %p'), start_time_upper.strftime('%I:%M %p'), start_time_lower, start_time_upper])
+            if 'startTime' in filters:
+                query += " AND startMinute BETWEEN %s AND %s"
+                params.extend(filters['startTime'])
+                filters_applied = True
+
+            if 'freeBlocks' in filters:
+                #no meeting of the section may fall outside every free block
+                block_conditions = []
+                for block_start, block_end in filters['freeBlocks']:
+                    block_conditions.append("(sm.weekStart >= %s AND sm.weekEnd <= %s)")
+                    params.extend([block_start, block_end])
+                query += f" AND NOT EXISTS (SELECT 1 FROM tblSectionMeetings sm WHERE sm.scheduleID = tblCourseDetails.scheduleID AND NOT ({' OR '.join(block_conditions)}))"
                 filters_applied = True
             
             if 'format' in request.args and format_param:
@@ -1505,157 +3321,823 @@ def search_departments():
                 filters_applied = True
 
             if 'showCoursesFromMajor' in request.args and request.args.get('showCoursesFromMajor') == 'true':
-                user_email = get_jwt_identity()['email']
-                user = User.get_user_by_email(user_email)
+                user = get_current_user()
                 if user and user.majorID:
                     query += " AND majorID = %s"
                     params.append(user.majorID)
                     filters_applied = True
 
-            query += " ORDER BY courseLevel, courseCode;"
+            total = None
+            if page['paginate'] and page['include_total']:
+                cursor.execute(f"SELECT COUNT(*) AS total FROM ({query}) AS matches", tuple(params))
+                total = cursor.fetchone()['total']
+
+            if page['paginate'] and page['cursor'] and 'q' in filters:
+                query += " AND (relevance < %s OR (relevance = %s AND (courseLevel, courseCode, scheduleID, majorID) > (%s, %s, %s, %s)))"
+                params.extend([page['cursor'][0], page['cursor'][0]] + list(page['cursor'][1:]))
+            elif page['paginate'] and page['cursor']:
+                query += " AND (courseLevel, courseCode, scheduleID, majorID) > (%s, %s, %s, %s)"
+                params.extend(page['cursor'])
+
+            if 'q' in filters:
+                query += " ORDER BY relevance DESC, courseLevel, courseCode, scheduleID, majorID"
+            else:
+                query += " ORDER BY courseLevel, courseCode, scheduleID, majorID"
+            if page['paginate']:
+                query += " LIMIT %s"
+                params.append(page['limit'] + 1)
             
             print("Query Parameters:", params)
 
             cursor.execute(query, tuple(params))
             result = cursor.fetchall()       
-            departments = [{
-                'scheduleID': dept['scheduleID'],
-                'section': dept['Section'],
-                'professors': dept['professors'].split(',') if dept['professors'] else [],
-                'courseName': dept['courseName'],
-                'courseCode': dept['courseCode'],
-                'courseMajor': dept['courseMajor'],
-                'department': dept['department'],
-                'term': dept['term'],
-                'format': dept['format'],
-                'units': dept['units'],
-                'meetingTime': dept['meetingTime'],
-                'Location': dept['Location'],
-                'days': dept['days'],
-                'classCapacity': dept['classCapacity'],
-                'enrollmentTotal': dept['enrollmentTotal'],
-                'availableSeats': dept['availableSeats'],
-                'averageRating': dept['averageRating'],
-                'frequentTags': dept['frequentTags'].split(', ')[:4] if dept['frequentTags'] else [],
-            } for dept in result]
         finally:
             cursor.close()
             connection.close()
-        return jsonify(departments), 200
+        if page['paginate']:
+            next_cursor = None
+            if len(result) > page['limit']:
+                result = result[:page['limit']]
+                next_cursor = course_sort_key(result[-1])
+                if 'q' in filters:
+                    next_cursor = (int(result[-1]['relevance']),) + next_cursor
+            return search_page_response([format_course_row(dept) for dept in result], next_cursor, total, page)
+        if page['facets']:
+            #facet counts come from the catalog, without it only the results are returned
+            return search_page_response([format_course_row(dept) for dept in result], None, len(result), page)
+        return jsonify(project_fields([format_course_row(dept) for dept in result], page['fields'])), 200
     else:
         return jsonify({"message": "Failed to connect to database"}), 500
     
+# Typeahead suggestions for course codes, course names and instructors
+@app.route('/search-suggest', methods=['GET'])
+@jwt_required()
+def search_suggest():
+    text = request.args.get('q', '')
+    try:
+        limit = min(int(request.args.get('limit', app.config['SUGGEST_LIMIT'])), app.config['SUGGEST_MAX_LIMIT'])
+    except ValueError:
+        return jsonify({"message": "Invalid limit"}), 400
+    index = suggest_cache.get()
+    if index is None:
+        return jsonify({"message": "Suggestions are unavailable"}), 500
+    return jsonify({"suggestions": index.suggest(text, limit)}), 200
+
+
+# Schedule generator settings
+app.config['SCHEDULE_MAX_COURSES'] = 8
+app.config['SCHEDULE_RESULTS'] = 10
+app.config['SCHEDULE_MAX_RESULTS'] = 50
+app.config['SCHEDULE_NODE_LIMIT'] = 50000
+
+#score lost for every hour spent between classes
+SCHEDULE_GAP_WEIGHT = 0.25
+
+
+# Backtracking search for the best conflict free combinations of one section per course.
+# Every section scores up to 1 for its rating and 1 each for the preferred format and building,
+# a schedule scores the sum of its sections less SCHEDULE_GAP_WEIGHT per hour of gaps.
+# Sections are numbered and compatible[i] has bit j set when sections i and j do not conflict,
+# so the sections still possible after a choice are one AND away.
+class ScheduleGenerator:
+    def __init__(self, courses, blocked=0, preferred_format=None, preferred_building=None, max_gap=None,
+                 limit=10, node_limit=50000):
+        self.preferred_format = (preferred_format or '').lower()
+        self.preferred_building = (preferred_building or '').lower()
+        self.max_gap = max_gap
+        self.limit = limit
+        self.node_limit = node_limit
+        self.unavailable = []
+        options = []
+        for courseCode, sections in courses.items():
+            usable = [section for section in sections if not section['mask'] & blocked]
+            if not usable:
+                self.unavailable.append(courseCode)
+            for section in usable:
+                section['score'] = self.section_score(section)
+            usable.sort(key=lambda section: -section['score'])
+            options.append(usable)
+        #courses with the fewest sections first so conflicts prune early
+        options.sort(key=len)
+        self.sections = [section for sections in options for section in sections]
+        self.options = []
+        self.course_bits = []
+        index = 0
+        for sections in options:
+            self.options.append(list(range(index, index + len(sections))))
+            self.course_bits.append(((1 << len(sections)) - 1) << index)
+            index += len(sections)
+        dilated = [dilate_mask(section['mask']) for section in self.sections]
+        self.compatible = []
+        for i, section in enumerate(self.sections):
+            bits = 0
+            for j, other in enumerate(self.sections):
+                if not dilated[i] & other['mask']:
+                    bits |= 1 << j
+            self.compatible.append(bits)
+        #best score the remaining courses could still add, used as the bound
+        self.best_remaining = [0.0] * (len(options) + 1)
+        for depth in range(len(options) - 1, -1, -1):
+            self.best_remaining[depth] = self.best_remaining[depth + 1] + max((section['score'] for section in options[depth]), default=0)
+        self.results = []
+        self.nodes = 0
+        self.counter = 0
+
+    def section_score(self, section):
+        score = float(section['averageRating'] or 0) / 5
+        if self.preferred_format and (section['format'] or '').lower() == self.preferred_format:
+            score += 1
+        if self.preferred_building and building_of(section['Location']).lower() == self.preferred_building:
+            score += 1
+        return score
+
+    def generate(self):
+        if self.unavailable or not self.options:
+            return []
+        self.search(0, (1 << len(self.sections)) - 1, 0.0, [])
+        return [(score, gaps, sections) for score, counter, gaps, sections in sorted(self.results, reverse=True)]
+
+    def search(self, depth, allowed, score, chosen):
+        if depth == len(self.options):
+            self.add_result(score, chosen)
+            return
+        sections, compatible, course_bits = self.sections, self.compatible, self.course_bits
+        later = range(depth + 1, len(self.options))
+        for i in self.options[depth]:
+            #sections are sorted by score, so once one cannot beat the worst kept schedule none after it can
+            if len(self.results) == self.limit and score + sections[i]['score'] + self.best_remaining[depth + 1] <= self.results[0][0]:
+                return
+            if self.nodes >= self.node_limit:
+                return
+            if not allowed >> i & 1:
+                continue
+            self.nodes += 1
+            next_allowed = allowed & compatible[i]
+            #every later course must still have a section that fits
+            if not all(course_bits[course] & next_allowed for course in later):
+                continue
+            chosen.append(i)
+            self.search(depth + 1, next_allowed, score + sections[i]['score'], chosen)
+            chosen.pop()
+
+    def add_result(self, score, chosen):
+        mask = 0
+        for i in chosen:
+            mask |= self.sections[i]['mask']
+        idle = gap_mask(mask)
+        if self.max_gap is not None and has_run(idle, self.max_gap // SLOT_MINUTES + 1):
+            return
+        gaps = bin(idle).count('1') * SLOT_MINUTES
+        result = (score - SCHEDULE_GAP_WEIGHT * gaps / 60, self.counter, gaps, [self.sections[i] for i in chosen])
+        self.counter -= 1
+        if len(self.results) < self.limit:
+            heapq.heappush(self.results, result)
+        elif result > self.results[0]:
+            heapq.heapreplace(self.results, result)
+
+
+# Times blocked by the constraints, whole days off and slots before the earliest start or after the latest end
+def blocked_mask(days_off, earliest_start, latest_end):
+    blocked = 0
+    for day in days_off:
+        blocked |= DAY_MASK << day * SLOTS_PER_DAY
+    every_day = ', '.join(DAY_NAMES)
+    if earliest_start:
+        blocked |= week_mask(every_day, 0, earliest_start)
+    if latest_end is not None:
+        blocked |= week_mask(every_day, latest_end, MINUTES_PER_DAY)
+    return blocked
+
+
+# Builds conflict free schedules for a list of course codes, the ranked schedules are streamed as
+# one JSON object per line
+@app.route('/generate-schedules', methods=['POST'])
+@jwt_required()
+def generate_schedules():
+    user = get_current_user()
+    if not user:
+        return jsonify({"message": "User not found"}), 400
+
+    data = request.get_json() or {}
+    course_codes = list(dict.fromkeys(code.strip().upper() for code in data.get('courseCodes', []) if code and code.strip()))
+    term = data.get('term')
+    if not course_codes or not term:
+        return jsonify({"message": "courseCodes and term are required"}), 400
+    if len(course_codes) > app.config['SCHEDULE_MAX_COURSES']:
+        return jsonify({"message": f"At most {app.config['SCHEDULE_MAX_COURSES']} courses can be scheduled"}), 400
+    try:
+        days_off = meeting_day_numbers(','.join(data.get('daysOff', [])))
+        earliest_start = parse_clock(data['earliestStart']) if data.get('earliestStart') else None
+        latest_end = parse_clock(data['latestEnd']) if data.get('latestEnd') else None
+        max_gap = int(data['maxGap']) if data.get('maxGap') is not None else None
+        min_rating = float(data['minRating']) if data.get('minRating') is not None else None
+        limit = min(int(data.get('limit', app.config['SCHEDULE_RESULTS'])), app.config['SCHEDULE_MAX_RESULTS'])
+        if limit < 1:
+            raise ValueError(f"Invalid limit: {limit}")
+    except (ValueError, TypeError) as err:
+        print(err)
+        return jsonify({"message": "Invalid schedule constraints"}), 400
+
+    connection = connectToDB()
+    if not connection:
+        return jsonify({"message": "Failed to connect to database"}), 500
+    cursor = connection.cursor(dictionary=True)
+    try:
+        blocked = blocked_mask(days_off, earliest_start, latest_end)
+        #events on one of the student's custom schedules count as busy time
+        if data.get('customScheduleID'):
+            cursor.execute("""
+                SELECT ce.startTime, ce.endTime, ce.daysOfWeek, ce.weekMask
+                FROM tblCustomEvents ce
+                JOIN tblCustomSchedules cs ON cs.scheduleID = ce.scheduleID
+                WHERE ce.scheduleID = %s AND cs.userID = %s
+            """, (data['customScheduleID'], user.userID))
+            for event in cursor.fetchall():
+                blocked |= mask_from_bytes(event['weekMask']) or custom_event_mask(event['daysOfWeek'], event['startTime'], event['endTime'])
+
+        cursor.execute(f"""
+            SELECT cs.scheduleID, cs.courseCode, cs.Section, cs.meetingDays, cs.startMinute, cs.endMinute, cs.meetingTimes,
+                cs.Location, cs.meetingFormat AS format, cs.Instructor, cs.availableSeats, rs.averageRating
+            FROM tblcourseSchedule cs
+            LEFT JOIN tblCourseRatingSummary rs ON rs.courseID = cs.courseID
+            WHERE cs.Term = %s AND cs.availableSeats > 0 AND cs.courseCode IN ({', '.join(['%s'] * len(course_codes))})
+        """, (term, *course_codes))
+        courses = {code: [] for code in course_codes}
+        for section in cursor.fetchall():
+            if min_rating is not None and float(section['averageRating'] or 0) < min_rating:
+                continue
+            #the collation also matches codes that differ by case or trailing spaces
+            code = (section['courseCode'] or '').strip().upper()
+            if code not in courses:
+                continue
+            section['mask'] = week_mask(section['meetingDays'], section['startMinute'], section['endMinute'])
+            courses[code].append(section)
+    except Error as err:
+        print("Error loading sections for schedule generator:", err)
+        return jsonify({"message": "Error generating schedules"}), 500
+    except ValueError as err:
+        print(err)
+        return jsonify({"message": "Invalid custom event times"}), 400
+    finally:
+        cursor.close()
+        connection.close()
+
+    generator = ScheduleGenerator(courses, blocked, data.get('preferredFormat'), data.get('preferredBuilding'), max_gap,
+                                  limit, app.config['SCHEDULE_NODE_LIMIT'])
+    schedules = generator.generate()
+    if generator.unavailable:
+        return jsonify({"message": f"No open sections fit the constraints for: {', '.join(generator.unavailable)}"}), 404
+    if not schedules:
+        return jsonify({"message": "No conflict free schedules fit the constraints"}), 404
+
+    def stream():
+        for rank, (score, gaps, sections) in enumerate(schedules, 1):
+            yield json.dumps({
+                "rank": rank,
+                "score": round(score, 3),
+                "gapMinutes": gaps,
+                "sections": [{
+                    "scheduleID": section['scheduleID'],
+                    "courseCode": section['courseCode'],
+                    "section": section['Section'],
+                    "days": section['meetingDays'],
+                    "meetingTime": section['meetingTimes'],
+                    "Location": section['Location'],
+                    "format": section['format'],
+                    "instructor": section['Instructor'],
+                    "availableSeats": section['availableSeats'],
+                    "averageRating": float(section['averageRating']) if section['averageRating'] is not None else None
+                } for section in sorted(sections, key=lambda section: section['courseCode'])]
+            }) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+
+# Enrollment admission settings
+# Enrollment transactions run on ENROLL_WORKERS threads in arrival order, so a registration rush
+# waits in this queue instead of piling up row locks on popular tblcourseSchedule rows.
+# A request waits up to ENROLL_WAIT seconds for its result and otherwise gets a ticket to poll.
+# Tickets live in the memory of the process that queued the cart, so with several backend processes
+# /enrollment-status needs sticky routing, a poll answered by another process gets a 404 and
+# Courses.vue then checks the student's schedule instead of reporting a failure.
+app.config['ENROLL_QUEUE_ENABLED'] = True
+app.config['ENROLL_WORKERS'] = 4
+app.config['ENROLL_QUEUE_SIZE'] = 500
+app.config['ENROLL_WAIT'] = 2
+app.config['ENROLL_RESULT_TTL'] = 300
+
+
+# Seat counter settings
+# Sections with a capacity over SEAT_SHARD_MIN_CAPACITY get SEAT_SHARDS seat counter rows when
+# reconcile-seats runs, 0 keeps every counter on tblcourseSchedule
+app.config['SEAT_SHARD_MIN_CAPACITY'] = 200
+app.config['SEAT_SHARDS'] = 0
+
+
+class SeatsTakenError(Exception):
+    def __init__(self, schedule_ids):
+        super().__init__(f"Sections filled up while enrolling: {schedule_ids}")
+        self.schedule_ids = schedule_ids
+
+
+# Sharded sections take seats from tblSeatCounterShards only, their availableSeats and enrollmentTotal
+# are copied back after the transaction commits so the section row is not held while enrolling
+def sync_seat_counters(connection, cursor, schedule_ids):
+    try:
+        for schedule_id in schedule_ids:
+            cursor.callproc('SyncSeatCounters', [schedule_id])
+        connection.commit()
+    except Error as err:
+        #the next sync or reconcile-seats corrects the copy
+        connection.rollback()
+        print("Error syncing seat counters:", err)
+
+
+# Recomputes enrollmentTotal and availableSeats of every section from tblUserSchedule
+@app.cli.command('reconcile-seats')
+def reconcile_seats():
+    connection = connectToDB()
+    if not connection:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.callproc('ReconcileSeatCounters', [app.config['SEAT_SHARD_MIN_CAPACITY'], app.config['SEAT_SHARDS']])
+        connection.commit()
+        print("SEAT COUNTERS RECONCILED")
+    except Error as err:
+        print("Error reconciling seat counters:", err)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+# Enrolls a student in a cart of sections, returns the response body and status code
+def enroll_student(studentID, schedule_ids):
+    connection = connectToDB()
+    if not connection:
+        return {"message": "Failed to connect to database"}, 500
+    cursor = connection.cursor()
+
+    print(schedule_ids)
+
+    added_schedule_ids = []
+
+    try:
+        cursor.execute("START TRANSACTION")
+
+        #carts of the same student are admitted one at a time so two of them cannot both pass the
+        #enrolled and time conflict checks, only the student's own row is locked
+        cursor.execute("SELECT studentID FROM tblStudents WHERE studentID = %s FOR UPDATE", (studentID,))
+        cursor.fetchall()
+
+        #sections are read without locking, seats are only taken by the guarded update below
+        requested = list(dict.fromkeys(schedule_ids))
+        placeholders = ', '.join(['%s'] * len(requested))
+        cursor.execute(f"""
+            SELECT cs.scheduleID, cs.availableSeats, cs.courseCode, cs.startMinute, cs.endMinute, cs.meetingDays, cs.semesterID, cs.seatShards
+            FROM tblcourseSchedule cs
+            WHERE cs.scheduleID IN ({placeholders})
+        """, tuple(requested))
+        sections = {row[0]: enrollment_section(row) for row in cursor.fetchall()}
+        for schedule_id in requested:
+            if schedule_id not in sections:
+                print(f"Course with scheduleID {schedule_id} not found in tblcourseSchedule")
+        sections = [sections[schedule_id] for schedule_id in requested if schedule_id in sections]
+        if not sections:
+            cursor.execute("COMMIT")
+            return {"message": "Courses enrollment processed", "added_schedule_ids": []}, 200
+
+        first_semester_id = sections[0]['semesterID']
+        if any(section['semesterID'] != first_semester_id for section in sections):
+            raise Exception("All courses must be from the same semester")
+
+        #the student's current sections in the same semester
+        cursor.execute("""
+            SELECT cs.scheduleID, cs.availableSeats, cs.courseCode, cs.startMinute, cs.endMinute, cs.meetingDays, cs.semesterID
+            FROM tblUserSchedule us
+            JOIN tblcourseSchedule cs ON cs.scheduleID = us.scheduleID
+            WHERE us.studentID = %s AND cs.semesterID = %s
+        """, (studentID, first_semester_id))
+        enrolled = [enrollment_section(row) for row in cursor.fetchall()]
+        enrolled_ids = {section['scheduleID'] for section in enrolled}
+        enrolled_mask = 0
+        for section in enrolled:
+            enrolled_mask |= section['mask']
+
+        for section in sections:
+            #sharded sections keep their open seats in tblSeatCounterShards, ClaimSeat checks them
+            if not section['seatShards'] and section['availableSeats'] <= 0:
+                raise Exception(f"Course {section['courseCode']} has no available seats, you can join its waitlist")
+            if section['scheduleID'] in enrolled_ids:
+                raise Exception(f"You are already enrolled in course {section['courseCode']}")
+            #check for time conflicts with enrolled courses and earlier courses in the cart,
+            #the conflicting courses are only looked up when the whole week overlaps
+            if dilate_mask(section['mask']) & enrolled_mask:
+                conflicting_course_codes = [other['courseCode'] for other in enrolled if sections_conflict(section, other)]
+                raise Exception(f"There is a time conflict with course(s): {', '.join(conflicting_course_codes)}")
+            enrolled.append(section)
+            enrolled_mask |= section['mask']
+            added_schedule_ids.append(section['scheduleID'])
+
+        #take a seat in every section with one statement, a section that filled up since it was read
+        #does not match availableSeats > 0 and the whole cart is rolled back
+        unsharded = [section['scheduleID'] for section in sections if not section['seatShards']]
+        if unsharded:
+            cursor.execute(f"""
+                UPDATE tblcourseSchedule
+                SET enrollmentTotal = enrollmentTotal + 1,
+                    availableSeats = availableSeats - 1
+                WHERE scheduleID IN ({', '.join(['%s'] * len(unsharded))}) AND availableSeats > 0
+            """, tuple(unsharded))
+            if cursor.rowcount != len(unsharded):
+                raise SeatsTakenError(unsharded)
+        for section in sections:
+            if section['seatShards'] and not cursor.callproc('ClaimSeat', [section['scheduleID'], 0])[1]:
+                raise SeatsTakenError([section['scheduleID']])
+
+        cursor.execute(f"""
+            INSERT INTO tblUserSchedule (studentID, scheduleID)
+            VALUES {', '.join(['(%s, %s)'] * len(added_schedule_ids))}
+        """, tuple(value for schedule_id in added_schedule_ids for value in (studentID, schedule_id)))
+
+        print(f"Courses with scheduleIDs {added_schedule_ids} added to user schedule")
+
+        cursor.execute("COMMIT")
+        sync_seat_counters(connection, cursor, [section['scheduleID'] for section in sections if section['seatShards']])
+        return {
+            "message": "Courses enrollment processed",
+            "added_schedule_ids": added_schedule_ids
+        }, 200
+    except SeatsTakenError as e:
+        cursor.execute("ROLLBACK")
+        #with the cart rolled back the sections without seats are the ones that filled up
+        cursor.execute(f"""
+            SELECT cs.courseCode
+            FROM tblcourseSchedule cs
+            LEFT JOIN tblSeatCounterShards sh ON sh.scheduleID = cs.scheduleID
+            WHERE cs.scheduleID IN ({', '.join(['%s'] * len(e.schedule_ids))})
+            GROUP BY cs.scheduleID, cs.courseCode, cs.seatShards, cs.availableSeats
+            HAVING IF(cs.seatShards > 0, SUM(sh.availableSeats), cs.availableSeats) <= 0
+        """, tuple(e.schedule_ids))
+        course_codes = [row[0] for row in cursor.fetchall()]
+        print(e)
+        return {"message": f"Course {', '.join(course_codes) or 'selection'} has no available seats, you can join its waitlist"}, 400
+    except Error as e:
+        cursor.execute("ROLLBACK")
+        print(e)
+        #duplicate key on tblUserSchedule (studentID, scheduleID)
+        if e.errno == 1062:
+            return {"message": "You are already enrolled in one of these courses"}, 400
+        return {"message": "Error adding courses"}, 500
+    except Exception as e:
+        cursor.execute("ROLLBACK")
+        print(e)
+        return {"message": str(e)}, 400
+    finally:
+        cursor.close()
+        connection.close()
+
+
+class EnrollmentQueue:
+    def __init__(self):
+        self.jobs = None
+        self.tickets = None
+        self.lock = threading.Lock()
+        self.workers = []
+        self.submitted = 0
+        self.started = 0
+
+    def start(self):
+        with self.lock:
+            if self.jobs is not None:
+                return
+            self.jobs = queue.Queue(app.config['ENROLL_QUEUE_SIZE'])
+            self.tickets = TTLCache(app.config['ENROLL_QUEUE_SIZE'] * 4, app.config['ENROLL_RESULT_TTL'])
+            for number in range(app.config['ENROLL_WORKERS']):
+                worker = threading.Thread(target=self.work, name=f"enrollment-{number}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    # Queues a cart, None when the queue is full
+    def submit(self, studentID, schedule_ids):
+        self.start()
+        with self.lock:
+            job = {'ticket': uuid.uuid4().hex, 'studentID': studentID, 'scheduleIDs': schedule_ids,
+                   'sequence': self.submitted + 1, 'done': threading.Event(), 'result': None}
+            try:
+                self.jobs.put_nowait(job)
+            except queue.Full:
+                return None
+            self.submitted += 1
+        self.tickets.set(job['ticket'], job)
+        return job
+
+    # Polling a pending ticket restarts its TTL so a long queue does not expire it before its result
+    def get(self, ticket):
+        if not self.tickets:
+            return None
+        job = self.tickets.get(ticket)
+        if job and not job['done'].is_set():
+            self.tickets.set(ticket, job)
+        return job
+
+    # Carts ahead of this one that no worker has picked up yet
+    def position(self, job):
+        return max(job['sequence'] - self.started, 0)
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            with self.lock:
+                self.started = max(self.started, job['sequence'])
+            try:
+                job['result'] = enroll_student(job['studentID'], job['scheduleIDs'])
+            except Exception as e:
+                print("Error processing enrollment:", e)
+                job['result'] = ({"message": "Error adding courses"}, 500)
+            finally:
+                #the ticket stays pollable for ENROLL_RESULT_TTL after the result is stored
+                self.tickets.set(job['ticket'], job)
+                job['done'].set()
+                self.jobs.task_done()
+
+
+enrollment_queue = EnrollmentQueue()
+
+
+def enrollment_queued_response(job):
+    return jsonify({
+        "message": "Enrollment queued",
+        "ticket": job['ticket'],
+        "position": enrollment_queue.position(job),
+        "statusUrl": f"/enrollment-status/{job['ticket']}"
+    }), 202
+
+
 # LV/JU
 # Add courses to user schedule
 @app.route('/enrollCourses', methods=['POST'])
 @jwt_required()
+@idempotent
 def enroll_courses():
+    user = get_current_user()
+
+    if not user or not user.studentID:
+        return jsonify({"message": "User not found or not a student"}), 400
+
+    schedule_ids = request.json.get('scheduleIDs', [])
+    if not schedule_ids:
+        return jsonify({"message": "No scheduleIDs provided"}), 400
+
+    if not app.config['ENROLL_QUEUE_ENABLED']:
+        body, status = enroll_student(user.studentID, schedule_ids)
+        return jsonify(body), status
+
+    job = enrollment_queue.submit(user.studentID, schedule_ids)
+    if job is None:
+        return jsonify({"message": "Enrollment is busy, please try again shortly"}), 503, {'Retry-After': '5'}
+    if job['done'].wait(app.config['ENROLL_WAIT']):
+        body, status = job['result']
+        return jsonify(body), status
+    return enrollment_queued_response(job)
+
+
+# Result of a queued enrollment, 202 while it is still waiting
+@app.route('/enrollment-status/<ticket>', methods=['GET'])
+@jwt_required()
+def enrollment_status(ticket):
+    user = get_current_user()
+    job = enrollment_queue.get(ticket)
+    if not job or not user or job['studentID'] != user.studentID:
+        return jsonify({"message": "Enrollment ticket not found"}), 404
+    if not job['done'].is_set():
+        return enrollment_queued_response(job)
+    body, status = job['result']
+    return jsonify(body), status
+
+
+# Waitlist settings
+# Promotions happen in the PromoteWaitlist procedure, in the same transaction that freed the seat.
+# Promoted students are emailed in batches at most every WAITLIST_NOTIFY_INTERVAL seconds.
+app.config['WAITLIST_NOTIFY_INTERVAL'] = 30
+
+
+# Queues one email per promoted student not yet notified, listing all their new sections
+def notify_waitlist_promotions():
+    connection = connectToDB()
+    if not connection:
+        return 0
+    cursor = connection.cursor(dictionary=True)
+    batch = uuid.uuid4().hex
     try:
-        current_user_email = get_jwt_identity()['email']
-        user = User.get_user_by_email(current_user_email)
+        #claim the rows first so two processes never email the same promotion
+        cursor.execute("""
+            UPDATE tblWaitlist SET notifyBatch = %s
+            WHERE status = 'promoted' AND notifiedAt IS NULL AND notifyBatch IS NULL
+        """, (batch,))
+        connection.commit()
+        cursor.execute("""
+            SELECT s.Email, cs.courseCode, cs.Section, cs.Term
+            FROM tblWaitlist w
+            JOIN tblStudents s ON s.studentID = w.studentID
+            JOIN tblcourseSchedule cs ON cs.scheduleID = w.scheduleID
+            WHERE w.notifyBatch = %s
+            ORDER BY s.Email, cs.courseCode
+        """, (batch,))
+        promotions = {}
+        for row in cursor.fetchall():
+            promotions.setdefault(row['Email'], []).append(f"{row['courseCode']} section {row['Section']} ({row['Term']})")
+        #the emails are queued in the transaction that marks the promotions notified
+        for email, courses in promotions.items():
+            queue_email(cursor, [email], "Course Compass - Waitlist Update",
+                        "A seat opened up and you have been enrolled from the waitlist in:\n\n" + "\n".join(courses))
+        cursor.execute("UPDATE tblWaitlist SET notifiedAt = NOW() WHERE notifyBatch = %s", (batch,))
+        connection.commit()
+        if promotions:
+            mail_outbox.wake()
+        return len(promotions)
+    except Exception as e:
+        print("Error queueing waitlist notifications:", e)
+        connection.rollback()
+        #release the claim so the next run retries
+        cursor.execute("UPDATE tblWaitlist SET notifyBatch = NULL WHERE notifyBatch = %s AND notifiedAt IS NULL", (batch,))
+        connection.commit()
+        return 0
+    finally:
+        cursor.close()
+        connection.close()
 
-        if not user or not user.studentID:
-            return jsonify({"message": "User not found or not a student"}), 400
 
-        schedule_ids = request.json.get('scheduleIDs', [])
-        if not schedule_ids:
-            return jsonify({"message": "No scheduleIDs provided"}), 400
+class WaitlistNotifier:
+    def __init__(self):
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
 
-        connection = connectToDB()
-        cursor = connection.cursor()
+    # Called after seats are released, promotions from a burst of drops go out together
+    def wake(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="waitlist-notifier", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
 
-        print(schedule_ids)
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            notify_waitlist_promotions()
+            time.sleep(app.config['WAITLIST_NOTIFY_INTERVAL'])
 
-        added_schedule_ids = []
 
-        try:
-            cursor.execute("START TRANSACTION")
+waitlist_notifier = WaitlistNotifier()
 
-            #get the semesterID of the first course
-            cursor.execute("""
-                SELECT semesterID
-                FROM tblcourseSchedule
-                WHERE scheduleID = %s
-            """, (schedule_ids[0],))
-            first_semester_id = cursor.fetchone()[0]
 
-            for schedule_id in schedule_ids:
-                cursor.execute("""
-                    SELECT cs.availableSeats, cs.courseCode, cs.startTime, cs.endTime, cs.meetingDays,cs.semesterID
-                    FROM tblcourseSchedule cs
-                    WHERE cs.scheduleID = %s
-                    FOR UPDATE
-                """, (schedule_id,))
+@app.cli.command('notify-waitlist')
+def notify_waitlist():
+    print(f"WAITLIST NOTIFICATIONS QUEUED FOR {notify_waitlist_promotions()} STUDENTS")
 
-                result = cursor.fetchone()
 
-                if result:
-                    availableSeats, course_code, startTime, endTime, meetingDays, semesterID = result
+# Join the waitlist of a full section
+@app.route('/waitlist', methods=['POST'])
+@jwt_required()
+def join_waitlist():
+    user = get_current_user()
+    if not user or not user.studentID:
+        return jsonify({"message": "User not found or not a student"}), 400
 
-                    if semesterID != first_semester_id:
-                        raise Exception("All courses must be from the same semester")
+    schedule_id = (request.get_json() or {}).get('scheduleID')
+    if not schedule_id:
+        return jsonify({"message": "Schedule ID is required"}), 400
 
-                    if availableSeats <= 0:
-                        raise Exception(f"Course {course_code} has no available seats")
+    connection = connectToDB()
+    if not connection:
+        return jsonify({"message": "Failed to connect to database"}), 500
+    cursor = connection.cursor()
+    try:
+        cursor.execute("START TRANSACTION")
+        cursor.execute("""
+            SELECT cs.scheduleID,
+                IF(cs.seatShards > 0, (SELECT COALESCE(SUM(sh.availableSeats), 0) FROM tblSeatCounterShards sh WHERE sh.scheduleID = cs.scheduleID), cs.availableSeats),
+                cs.courseCode, cs.startMinute, cs.endMinute, cs.meetingDays, cs.semesterID
+            FROM tblcourseSchedule cs
+            WHERE cs.scheduleID = %s
+            FOR UPDATE
+        """, (schedule_id,))
+        row = cursor.fetchone()
+        if not row:
+            cursor.execute("ROLLBACK")
+            return jsonify({"message": "Course not found"}), 404
+        section = enrollment_section(row)
+        if section['availableSeats'] > 0:
+            cursor.execute("ROLLBACK")
+            return jsonify({"message": f"Course {section['courseCode']} has open seats, enroll instead"}), 409
 
-                    #check if the student is already enrolled in the course
-                    cursor.execute("""
-                        SELECT COUNT(*)
-                        FROM tblUserSchedule
-                        WHERE studentID = %s AND scheduleID = %s
-                    """, (user.studentID, schedule_id))
-                    already_enrolled = cursor.fetchone()[0]
-                    if already_enrolled:
-                        raise Exception(f"You are already enrolled in course {course_code}")
-                    
-                    #check for time conflicts within the same semester
-                    cursor.execute("""
-                        SELECT cs.courseCode
-                        FROM tblcourseSchedule cs
-                        JOIN tblUserSchedule us ON cs.scheduleID = us.scheduleID
-                        WHERE us.studentID = %s
-                        AND cs.semesterID = %s
-                        AND cs.meetingDays LIKE CONCAT('%%', %s, '%%')
-                        AND (
-                            (ADDTIME(cs.endTime, '00:15:00') > %s AND cs.endTime <= %s)
-                            OR (cs.startTime >= %s AND SUBTIME(cs.startTime, '00:15:00') < %s)      /*15 minute buffer between courses*/
-                            OR (cs.startTime <= %s AND cs.endTime >= %s)
-                        )
-                    """, (user.studentID, semesterID, meetingDays, startTime, startTime, endTime, endTime, startTime, endTime))
-                    conflicting_courses = cursor.fetchall()
-                    if conflicting_courses:
-                        conflicting_course_codes = [course[0] for course in conflicting_courses]
-                        raise Exception(f"There is a time conflict with course(s): {', '.join(conflicting_course_codes)}")
+        cursor.execute("""
+            SELECT cs.scheduleID, cs.availableSeats, cs.courseCode, cs.startMinute, cs.endMinute, cs.meetingDays, cs.semesterID
+            FROM tblUserSchedule us
+            JOIN tblcourseSchedule cs ON cs.scheduleID = us.scheduleID
+            WHERE us.studentID = %s AND cs.semesterID = %s
+        """, (user.studentID, section['semesterID']))
+        enrolled = [enrollment_section(row) for row in cursor.fetchall()]
+        if any(other['scheduleID'] == section['scheduleID'] for other in enrolled):
+            cursor.execute("ROLLBACK")
+            return jsonify({"message": f"You are already enrolled in course {section['courseCode']}"}), 400
+        conflicting_course_codes = [other['courseCode'] for other in enrolled if sections_conflict(section, other)]
+        if conflicting_course_codes:
+            cursor.execute("ROLLBACK")
+            return jsonify({"message": f"There is a time conflict with course(s): {', '.join(conflicting_course_codes)}"}), 400
 
-                    cursor.execute("""
-                        INSERT INTO tblUserSchedule (studentID, scheduleID)
-                        VALUES (%s, %s)
-                    """, (user.studentID, schedule_id))
+        #an old promoted or cancelled entry is replaced, rejoining goes to the back of the line
+        cursor.execute("DELETE FROM tblWaitlist WHERE scheduleID = %s AND studentID = %s AND status <> 'waiting'", (schedule_id, user.studentID))
+        cursor.execute("""
+            INSERT IGNORE INTO tblWaitlist (scheduleID, studentID)
+            VALUES (%s, %s)
+        """, (schedule_id, user.studentID))
+        if cursor.rowcount == 0:
+            cursor.execute("ROLLBACK")
+            return jsonify({"message": f"You are already on the waitlist for course {section['courseCode']}"}), 400
+        cursor.execute("UPDATE tblcourseSchedule SET waitList = COALESCE(waitList, 0) + 1 WHERE scheduleID = %s", (schedule_id,))
+        cursor.execute("""
+            SELECT COUNT(*) FROM tblWaitlist
+            WHERE scheduleID = %s AND status = 'waiting' AND waitlistID <= LAST_INSERT_ID()
+        """, (schedule_id,))
+        position = cursor.fetchone()[0]
+        cursor.execute("COMMIT")
+        return jsonify({"message": "Added to waitlist", "scheduleID": schedule_id, "position": position}), 200
+    except Error as e:
+        cursor.execute("ROLLBACK")
+        print(e)
+        return jsonify({"message": "Error joining waitlist"}), 500
+    finally:
+        cursor.close()
+        connection.close()
 
-                    cursor.execute("""
-                        UPDATE tblcourseSchedule
-                        SET enrollmentTotal = enrollmentTotal + 1,
-                            availableSeats = availableSeats - 1
-                        WHERE scheduleID = %s
-                    """, (schedule_id,))
-
-                    print(f"Course with scheduleID {schedule_id} added to user schedule")
-                    added_schedule_ids.append(schedule_id)
-                else:
-                    print(f"Course with scheduleID {schedule_id} not found in tblcourseSchedule")
 
-            cursor.execute("COMMIT")
-            return jsonify({
-                "message": "Courses enrollment processed",
-                "added_schedule_ids": added_schedule_ids
-            }), 200
-        except Exception as e:
+# Sections the student is waiting for with their place in line
+@app.route('/waitlist', methods=['GET'])
+@jwt_required()
+def get_waitlist():
+    user = get_current_user()
+    if not user or not user.studentID:
+        return jsonify({"message": "User not found or not a student"}), 400
+
+    connection = connectToDB()
+    if not connection:
+        return jsonify({"message": "Failed to connect to database"}), 500
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT w.scheduleID, cs.courseCode, cs.Section, cs.Term, w.createdAt,
+                (SELECT COUNT(*) FROM tblWaitlist ahead
+                 WHERE ahead.scheduleID = w.scheduleID AND ahead.status = 'waiting' AND ahead.waitlistID <= w.waitlistID) AS position
+            FROM tblWaitlist w
+            JOIN tblcourseSchedule cs ON cs.scheduleID = w.scheduleID
+            WHERE w.studentID = %s AND w.status = 'waiting'
+            ORDER BY w.createdAt
+        """, (user.studentID,))
+        waitlist = [{
+            "scheduleID": row['scheduleID'],
+            "courseCode": row['courseCode'],
+            "section": row['Section'],
+            "term": row['Term'],
+            "joined": row['createdAt'].strftime('%Y-%m-%d %H:%M:%S') if row['createdAt'] else None,
+            "position": row['position']
+        } for row in cursor.fetchall()]
+        return jsonify({"waitlist": waitlist}), 200
+    except Error as e:
+        print(e)
+        return jsonify({"message": "Error retrieving waitlist"}), 500
+    finally:
+        cursor.close()
+        connection.close()
+
+
+# Leave a section's waitlist
+@app.route('/waitlist/<int:schedule_id>', methods=['DELETE'])
+@jwt_required()
+def leave_waitlist(schedule_id):
+    user = get_current_user()
+    if not user or not user.studentID:
+        return jsonify({"message": "User not found or not a student"}), 400
+
+    connection = connectToDB()
+    if not connection:
+        return jsonify({"message": "Failed to connect to database"}), 500
+    cursor = connection.cursor()
+    try:
+        cursor.execute("START TRANSACTION")
+        cursor.execute("DELETE FROM tblWaitlist WHERE scheduleID = %s AND studentID = %s AND status = 'waiting'", (schedule_id, user.studentID))
+        if cursor.rowcount == 0:
             cursor.execute("ROLLBACK")
-            print(e)
-            return jsonify({"message": str(e)}), 400
+            return jsonify({"message": "You are not on the waitlist for this course"}), 404
+        cursor.execute("UPDATE tblcourseSchedule SET waitList = GREATEST(COALESCE(waitList, 0) - 1, 0) WHERE scheduleID = %s", (schedule_id,))
+        cursor.execute("COMMIT")
+        return jsonify({"message": "Removed from waitlist"}), 200
     except Error as e:
+        cursor.execute("ROLLBACK")
         print(e)
-        return jsonify({"message": "Error adding courses"}), 500
+        return jsonify({"message": "Error leaving waitlist"}), 500
     finally:
         cursor.close()
         connection.close()
@@ -1747,6 +4229,7 @@ def delete_account():
         cursor.execute("DELETE FROM tblInstructor WHERE userID = %s", (user_id,))
         cursor.execute("DELETE FROM tblUser WHERE userID = %s", (user_id,))
         connection.commit()
+        User.invalidate(user_email)
         print("ACCOUNT DELETED")
         return jsonify({"message:": "Account deleted"}), 200
     except Error as err:
@@ -1889,6 +4372,7 @@ def approve_instructor():
         query = "UPDATE tblInstructor SET approval_status = %s WHERE Email = %s"
         cursor.execute(query, ('approved', instructor_email))
         connection.commit()
+        User.invalidate(instructor_email)
         return jsonify({"message": "Instructor approved."}), 200
     except Error as err:
         connection.rollback()
@@ -1909,6 +4393,7 @@ def reject_instructor():
         query = "UPDATE tblInstructor SET approval_status = %s WHERE Email = %s"
         cursor.execute(query, ('rejected', instructor_email))
         connection.commit()
+        User.invalidate(instructor_email)
         return jsonify({"message": "Instructor rejected."}), 200
     except Error as err:
         connection.rollback()
@@ -1929,6 +4414,7 @@ def archive_instructor():
         query = "UPDATE tblInstructor SET approval_status = %s WHERE Email = %s"
         cursor.execute(query, ('archived', instructor_email))
         connection.commit()
+        User.invalidate(instructor_email)
         return jsonify({"message": "Instructor archived."}), 200
     except Error as err:
         connection.rollback()
@@ -1949,6 +4435,7 @@ def unarchive_instructor():
         query = "UPDATE tblInstructor SET approval_status = %s WHERE Email = %s"
         cursor.execute(query, ('approved', instructor_email))
         connection.commit()
+        User.invalidate(instructor_email)
         return jsonify({"message": "Instructor unarchived."}), 200
     except Error as err:
         connection.rollback()
@@ -1972,6 +4459,7 @@ def remove_instructor():
         cursor.execute("DELETE FROM tblInstructor WHERE userID = %s", (user_id,))
         cursor.execute("DELETE FROM tblUser WHERE userID = %s", (user_id,))
         connection.commit()
+        User.invalidate(instructor_email)
         return jsonify({"message": "Instructor removed."}), 200
     except Error as err:
         connection.rollback()
@@ -2126,8 +4614,7 @@ def unassign_instructor():
 @role_required(['Instructor'])
 def update_office_hours():
     try:
-        current_user_email = get_jwt_identity()['email']
-        user = User.get_user_by_email(current_user_email)
+        user = get_current_user()
         if not user or not user.instructorID:
             return jsonify({"message": "User not found or not an instructor"}), 400
         data = request.get_json()
@@ -2202,10 +4689,10 @@ def get_enrolled_students(scheduleID):
 @app.route('/saveStudentGrade', methods=['POST'])
 @jwt_required()
 @role_required(['Instructor'])
+@idempotent
 def save_student_grade():
     try:
-        current_user_email = get_jwt_identity()['email']
-        user = User.get_user_by_email(current_user_email)
+        user = get_current_user()
         if not user or not user.instructorID:
             return jsonify({"message": "User not found or not an instructor"}), 400
 
@@ -2266,8 +4753,7 @@ def save_student_grade():
 @role_required(['Instructor'])
 def remove_student():
     try:
-        current_user_email = get_jwt_identity()['email']
-        user = User.get_user_by_email(current_user_email)
+        user = get_current_user()
         if not user or not user.instructorID:
             return jsonify({"message": "User not found or not an instructor"}), 400
 
@@ -2302,6 +4788,8 @@ def remove_student():
         """, (student_id, schedule_id))
 
         connection.commit()
+        sync_seat_counters(connection, cursor, [schedule_id])
+        waitlist_notifier.wake()
 
         return jsonify({"message": "Student removed successfully"}), 200
 
@@ -2330,7 +4818,7 @@ def get_instructor_courses(email):
         
         cursor.execute("""
             SELECT MAX(courseCode) AS courseCode, courseName, MAX(days) AS days, MAX(department) AS department, Section
-            FROM vwCourseDetails
+            FROM tblCourseDetails
             WHERE professors = %s
             GROUP BY courseName, Section
             """, (instructor_name,))
@@ -2357,32 +4845,24 @@ def send_email():
         connection = connectToDB()
         cursor = connection.cursor(dictionary=True)
         
-        cursor.execute("INSERT INTO tblOutboundEmails (subject, recipient_group, content) VALUES (%s, %s, %s)", (subject, recipient_group, content))
-        connection.commit()
+        cursor.execute("INSERT INTO tblOutboundEmails (subject, recipient_group, content, status) VALUES (%s, %s, %s, 'queued')", (subject, recipient_group, content))
+        outbound_email_id = cursor.lastrowid
         
-        if recipient_group == 'All Users':
-            cursor.execute("SELECT Email FROM tblUser")
-        elif recipient_group == 'Instructors':
-            cursor.execute("SELECT Email FROM tblInstructor")
-        elif recipient_group == 'Students':
-            cursor.execute("SELECT Email FROM tblStudents")
-        elif recipient_group == 'Admins':
-            recipients = ["coursecompassunr@gmail.com"]
+        if recipient_group in MAIL_RECIPIENT_GROUPS:
+            recipient_count = queue_bulk_email(cursor, recipient_group, subject, content, outbound_email_id)
         else:
-            recipients = [recipient_group]
-            print("Email sent to ", recipient_group)
-
-        if recipient_group == 'All Users' or recipient_group == 'Instructors' or recipient_group == 'Students':
-            result = cursor.fetchall()
-            recipients = [user['Email'] for user in result]
-        
-        msg = Message(subject, sender='coursecompassunr@gmail.com', recipients=recipients)
-        msg.body = content
-        mail.send(msg)
+            recipients = ["coursecompassunr@gmail.com"] if recipient_group == 'Admins' else [recipient_group]
+            queue_email(cursor, recipients, subject, content, outbound_email_id=outbound_email_id)
+            cursor.execute("UPDATE tblOutboundEmails SET recipientCount = %s WHERE emailID = %s", (len(recipients), outbound_email_id))
+            recipient_count = len(recipients)
+        connection.commit()
+        mail_outbox.wake()
+        print("Email queued for", recipient_count, "recipients in", recipient_group)
         
-        return jsonify({"message": "Emails sent."}), 200
+        return jsonify({"message": "Emails queued.", "emailID": outbound_email_id, "recipientCount": recipient_count}), 200
     except Exception as exc:
         print(exc)
+        connection.rollback()
         return jsonify({"message": "Failed to send emails."}), 500
     finally:
         cursor.close()
@@ -2395,7 +4875,10 @@ def get_outbound_emails():
     try:
         connection = connectToDB()
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT emailID, subject, recipient_group, content, sent_date FROM tblOutboundEmails ORDER BY sent_date DESC")
+        cursor.execute("""
+            SELECT emailID, subject, recipient_group, content, sent_date, status, recipientCount, sentCount, failedCount, completedAt
+            FROM tblOutboundEmails ORDER BY sent_date DESC
+        """)
         emails = cursor.fetchall()
         return jsonify(emails), 200
     except Exception as exc:
@@ -2543,22 +5026,306 @@ def delete_announcement():
         connection.close()
         
 
+# Connection pool settings
+# DB_POOL_SIZE connections are kept open, DB_POOL_MAX_OVERFLOW extra ones may be opened under load
+# and are closed again when returned. Connections older than DB_POOL_RECYCLE seconds are reopened,
+# and DB_POOL_PRE_PING checks that an idle connection is still alive before handing it out.
+app.config['DB_POOL_SIZE'] = 10
+app.config['DB_POOL_MAX_OVERFLOW'] = 10
+app.config['DB_POOL_RECYCLE'] = 3600
+app.config['DB_POOL_PRE_PING'] = True
+app.config['DB_POOL_TIMEOUT'] = 30
+
+# Database server, the environment variables point the backend at another server such as
+# the local database seeded by testing/load_test/seed_campus.py
+app.config['DB_HOST'] = os.environ.get('COURSECOMPASS_DB_HOST', "coursecompass-db-instance.c74q40ekci79.us-east-2.rds.amazonaws.com")
+app.config['DB_USER'] = os.environ.get('COURSECOMPASS_DB_USER', "admin")
+app.config['DB_PASSWORD'] = os.environ.get('COURSECOMPASS_DB_PASSWORD', "CourseCompT38!")
+app.config['DB_NAME'] = os.environ.get('COURSECOMPASS_DB_NAME', "cs425")
+
+
+class ConnectionPool:
+    def __init__(self, size, max_overflow, recycle, pre_ping, timeout, **connect_args):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self.connect_args = connect_args
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+
+    def _create(self):
+        with self._lock:
+            if self._open >= self.size + self.max_overflow:
+                return None
+            self._open += 1
+        try:
+            return connect(**self.connect_args), time.monotonic()
+        except Error:
+            with self._lock:
+                self._open -= 1
+            raise
+
+    def _discard(self, connection):
+        with self._lock:
+            self._open -= 1
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def checkout(self):
+        try:
+            connection, created_at = self._idle.get_nowait()
+        except queue.Empty:
+            created = self._create()
+            if created:
+                return created
+            try:
+                connection, created_at = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise Error(msg="Connection pool exhausted")
+
+        stale = self.recycle and time.monotonic() - created_at > self.recycle
+        if stale or (self.pre_ping and not connection.is_connected()):
+            self._discard(connection)
+            return self._create() or self.checkout()
+        return connection, created_at
+
+    def checkin(self, connection, created_at):
+        try:
+            connection.rollback() #never hand out a connection with an open transaction
+        except Error:
+            self._discard(connection)
+            return
+        if self._idle.qsize() >= self.size:
+            self._discard(connection) #overflow connections are not kept
+        else:
+            self._idle.put((connection, created_at))
+
+    def connect(self, request_scoped=False):
+        connection, created_at = self.checkout()
+        return PooledConnection(self, connection, created_at, request_scoped)
+
+    def status(self):
+        return {"size": self.size, "open": self._open, "idle": self._idle.qsize()}
+
+
+# Wraps a pooled connection so existing close() calls return it to the pool.
+# Request scoped connections are shared by everything that runs during a request,
+# so close() does nothing and the connection is released at teardown instead.
+class PooledConnection:
+    def __init__(self, pool, connection, created_at, request_scoped):
+        self._pool = pool
+        self._connection = connection
+        self._created_at = created_at
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        if self._connection is not None:
+            self._pool.checkin(self._connection, self._created_at)
+            self._connection = None
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._connection.cursor(*args, **kwargs)
+        if app.config['SQL_INSTRUMENTATION'] and has_request_context():
+            return InstrumentedCursor(cursor, request_query_stats())
+        return cursor
+
+
+# SQL instrumentation settings
+# Statements of every request are counted and timed and reported in the Server-Timing header.
+# A request running more than SQL_STATEMENT_BUDGET statements, or the same statement with different
+# values SQL_REPEAT_THRESHOLD times or more (usually a query in a loop), is logged as a warning.
+# The last SQL_DEBUG_HISTORY requests are listed by /debug/sql.
+app.config['SQL_INSTRUMENTATION'] = True
+app.config['SQL_STATEMENT_BUDGET'] = 20
+app.config['SQL_REPEAT_THRESHOLD'] = 3
+app.config['SQL_DEBUG_HISTORY'] = 100
+
+
+# Statement with its values replaced, so a query run in a loop has one pattern
+def sql_pattern(statement):
+    pattern = re.sub(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b|%s", '?', statement)
+    pattern = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', pattern)
+    pattern = re.sub(r'\(\?\)(?:\s*,\s*\(\?\))+', '(?)', pattern) #multi-row VALUES
+    return re.sub(r'\s+', ' ', pattern).strip()
+
+
+class QueryStats:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = None
+        self.slowest_seconds = 0.0
+        self.patterns = {}
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest = statement
+            self.slowest_seconds = seconds
+        pattern = sql_pattern(statement)
+        self.patterns[pattern] = self.patterns.get(pattern, 0) + 1
+
+    def repeated(self):
+        threshold = app.config['SQL_REPEAT_THRESHOLD']
+        return {pattern: count for pattern, count in self.patterns.items() if count >= threshold}
+
+    def server_timing(self):
+        timing = f'db;dur={self.seconds * 1000:.1f};desc="{self.count} statements"'
+        if self.slowest is not None:
+            timing += f', db-slowest;dur={self.slowest_seconds * 1000:.1f}'
+        return timing
+
+    def conv_to_json(self):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "statements": self.count,
+            "dbMilliseconds": round(self.seconds * 1000, 2),
+            "slowest": {"statement": sql_pattern(self.slowest), "milliseconds": round(self.slowest_seconds * 1000, 2)} if self.slowest else None,
+            "repeated": self.repeated()
+        }
+
+
+def request_query_stats():
+    if 'sql_stats' not in g:
+        g.sql_stats = QueryStats(request.method, request.path)
+    return g.sql_stats
+
+
+# Cursor that records every statement it runs in the request's QueryStats
+class InstrumentedCursor:
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    def _timed(self, statement, run, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return run(*args, **kwargs)
+        finally:
+            self._stats.record(statement, time.perf_counter() - started)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(operation, self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(operation, self._cursor.executemany, operation, *args, **kwargs)
+
+    def callproc(self, procname, *args, **kwargs):
+        return self._timed(f"CALL {procname}", self._cursor.callproc, procname, *args, **kwargs)
+
+
+sql_history = deque(maxlen=app.config['SQL_DEBUG_HISTORY'])
+sql_history_lock = threading.Lock()
+
+
+@app.after_request
+def report_query_stats(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    response.headers.add('Server-Timing', stats.server_timing())
+    repeated = stats.repeated()
+    if stats.count > app.config['SQL_STATEMENT_BUDGET'] or repeated:
+        app.logger.warning(f"{stats.method} {stats.path} ran {stats.count} statements in {stats.seconds * 1000:.1f} ms, repeated: {repeated}")
+    with sql_history_lock:
+        sql_history.append(stats.conv_to_json())
+    return response
+
+
+# Statement counts of recent requests, most recent first
+@app.route('/debug/sql', methods=['GET'])
+@jwt_required()
+@role_required(['Admin'])
+def debug_sql():
+    with sql_history_lock:
+        requests = list(sql_history)
+    return jsonify({"requests": requests[::-1], "budget": app.config['SQL_STATEMENT_BUDGET']}), 200
+
+
+db_pool = None
+db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        with db_pool_lock:
+            if db_pool is None:
+                db_pool = ConnectionPool(
+                    size=app.config['DB_POOL_SIZE'],
+                    max_overflow=app.config['DB_POOL_MAX_OVERFLOW'],
+                    recycle=app.config['DB_POOL_RECYCLE'],
+                    pre_ping=app.config['DB_POOL_PRE_PING'],
+                    timeout=app.config['DB_POOL_TIMEOUT'],
+                    host = app.config['DB_HOST'],
+                    user = app.config['DB_USER'],
+                    passwd = app.config['DB_PASSWORD'],
+                    database = app.config['DB_NAME'],
+                    buffered = True #cursors share one connection per request
+                )
+    return db_pool
+
+
 # LV
 # Connect to database
+# Inside a request every call gets the same pooled connection, outside a request
+# each call checks out its own connection and close() returns it to the pool
 def connectToDB():
     try:
-        connection = connect(
-            host= "coursecompass-db-instance.c74q40ekci79.us-east-2.rds.amazonaws.com",
-            user = "admin",
-            passwd = "CourseCompT38!",
-            database = "cs425"
-        )
-        return connection
+        if has_request_context():
+            if 'db_connection' not in g:
+                g.db_connection = get_db_pool().connect(request_scoped=True)
+            return g.db_connection
+        return get_db_pool().connect()
     except Error as err:
         print("Error while connecting to database", err)
         return None
 
 
+@app.teardown_request
+def release_db_connection(exc):
+    connection = g.pop('db_connection', None)
+    if connection is not None:
+        connection.release()
+
+
+if app.config['REFERENCE_WARM_ON_STARTUP']:
+    reference_data.warm()
+
+
 # Launch backend development server
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,345 @@
+# Course Compass
+# Unit tests for the in-memory course catalog used by /search-departments
+
+import pytest
+from datetime import datetime
+from src.backend import CatalogCache, CourseCatalog, SuggestCache, SuggestIndex, TextIndex, TextSearchCache, parse_start_time_range, parse_free_blocks
+
+
+def course_row(scheduleID, courseCode, courseName, courseMajor, majorID, professors, term, format, location, rating, level, tags, days='Monday, Wednesday', start=540, end=615):
+    return {
+        'scheduleID': scheduleID, 'courseID': scheduleID, 'Section': 1000 + scheduleID, 'courseName': courseName, 'courseCode': courseCode,
+        'courseMajor': courseMajor, 'majorID': majorID, 'department': 'Engineering', 'professors': professors,
+        'term': term, 'format': format, 'units': 3, 'meetingTime': '9:00 AM - 10:15 AM', 'startMinute': start, 'endMinute': end,
+        'Location': location, 'days': days, 'classCapacity': 30, 'enrollmentTotal': 10, 'availableSeats': 20,
+        'averageRating': rating, 'courseLevel': level, 'frequentTags': tags
+    }
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    rows = [
+        course_row(1, 'CS 135', 'Computer Science I', 'Computer Science', 100, 'Erin Keith', 'Fall 2024', 'In-person', 'SEM 101', 4.2, '100', 'Caring, Lots of homework'),
+        course_row(2, 'CPE 201', 'Digital Design', 'Computer Engineering', 110, 'Sara Davis,Bob Jones', 'Fall 2024', 'Online', 'ONLINE', 3.1, '200', 'Tough grader', None, None, None),
+        course_row(3, 'CS 302', 'Data Structures', 'Computer Science', 100, 'Erin Keith', 'Spring 2024', 'In-person', 'WPEB 100', 4.8, '300', 'Caring', 'Tuesday, Thursday', 780, 855),
+        course_row(4, 'PHYS 180', 'Physics for Scientists', 'Physics', 300, 'Bob Jones', 'Fall 2024', 'In-person', 'SEM 220', 2.5, '100', None, 'Friday', 690, 740),
+    ]
+    return CourseCatalog(rows, 1)
+
+
+def codes(catalog, filters):
+    return [course['courseCode'] for course in catalog.search(filters)]
+
+
+# test that no filters returns every section ordered by level and course code
+def test_no_filters(catalog):
+    assert codes(catalog, {}) == ['CS 135', 'PHYS 180', 'CPE 201', 'CS 302']
+
+
+# test major prefix matching is case insensitive
+def test_major_prefix(catalog):
+    assert codes(catalog, {'query': 'computer e'}) == ['CPE 201']
+    assert codes(catalog, {'query': 'COMP'}) == ['CS 135', 'CPE 201', 'CS 302']
+
+
+# test combined hash index filters
+def test_level_term_building(catalog):
+    assert codes(catalog, {'level': 100, 'term': 'fall 2024', 'location': 'SEM'}) == ['CS 135', 'PHYS 180']
+
+
+# test minimum rating and tag keyword filters
+def test_rating_and_tags(catalog):
+    assert codes(catalog, {'rating': 4.0}) == ['CS 135', 'CS 302']
+    assert codes(catalog, {'keywords': ['tough grader', 'Lots of homework']}) == ['CS 135', 'CPE 201']
+
+
+# test professor and course name substrings, including ones shorter than an n-gram
+def test_substrings(catalog):
+    assert codes(catalog, {'professor': 'jones'}) == ['PHYS 180', 'CPE 201']
+    assert codes(catalog, {'courseName': 'st'}) == ['PHYS 180', 'CS 302']
+    assert codes(catalog, {'courseName': 'quantum'}) == []
+
+
+# test start time labels, including ranges that cross noon
+def test_parse_start_time_range():
+    assert parse_start_time_range('8-9 AM') == (480, 540)
+    assert parse_start_time_range('12-1 PM') == (720, 780)
+    assert parse_start_time_range('11-12 PM') == (660, 720)
+    with pytest.raises(ValueError):
+        parse_start_time_range('morning')
+
+
+# test start time range filter
+def test_start_time(catalog):
+    assert codes(catalog, {'startTime': parse_start_time_range('8-9 AM')}) == ['CS 135']
+    assert codes(catalog, {'startTime': parse_start_time_range('11-12 PM')}) == ['PHYS 180']
+    assert codes(catalog, {'startTime': parse_start_time_range('1-2 PM')}) == ['CS 302']
+
+
+# test sections that fit inside free blocks, online sections always fit
+def test_free_blocks(catalog):
+    blocks = parse_free_blocks('Monday 8:00-12:00,Wednesday 9:00-10:15,Friday 11:00-13:00')
+    assert codes(catalog, {'freeBlocks': blocks}) == ['CS 135', 'PHYS 180', 'CPE 201']
+    blocks = parse_free_blocks('Monday 8:00-12:00,Friday 11:00-12:00')
+    assert codes(catalog, {'freeBlocks': blocks}) == ['CPE 201']
+
+
+# test keyset pages cover every match exactly once
+def test_search_page(catalog):
+    page, next_cursor, total = catalog.search_page({}, None, 3)
+    assert [course['courseCode'] for course in page] == ['CS 135', 'PHYS 180', 'CPE 201']
+    assert total == 4
+    page, next_cursor, total = catalog.search_page({}, next_cursor, 3)
+    assert [course['courseCode'] for course in page] == ['CS 302']
+    assert next_cursor is None
+
+
+# test facet counts, a facet's own filter does not narrow its counts
+def test_facets(catalog):
+    facets = catalog.facets({'term': 'Fall 2024', 'level': 100})
+    assert facets['level'] == {'100': 2, '200': 1}
+    assert facets['term'] == {'Fall 2024': 2}
+    assert facets['building'] == {'SEM': 2}
+    assert facets['tag'] == {'Caring': 1, 'Lots of homework': 1}
+
+
+# test seat counts can be refreshed without rebuilding the catalog
+def test_update_seats(catalog):
+    catalog.update_seats([(3, 30, 29, 1)])
+    course = catalog.search({'courseName': 'data structures'})[0]
+    assert course['availableSeats'] == 1
+    assert course['enrollmentTotal'] == 29
+
+
+class FakeCatalogCursor:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self, operation, params=None):
+        self.data['statements'].append(operation)
+        if 'tblCatalogVersion' in operation:
+            self.rows = [{'catalogVersion': 1, 'ratingVersion': self.data['ratingVersion']}]
+        elif 'tblCourseRatingSummary' in operation:
+            self.rows = [row for row in self.data['summaries'] if row['ratingVersion'] > params[0]]
+        else:
+            self.rows = self.data['details']
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+# test a new rating patches the rating and tag indexes of its course instead of rebuilding the catalog
+def test_update_ratings(monkeypatch):
+    data = {'ratingVersion': 4, 'summaries': [], 'statements': [], 'details': [
+        course_row(1, 'CS 135', 'Computer Science I', 'Computer Science', 100, 'Erin Keith', 'Fall 2024', 'In-person', 'SEM 101', 4.2, '100', 'Caring'),
+        course_row(3, 'CS 302', 'Data Structures', 'Computer Science', 100, 'Erin Keith', 'Spring 2024', 'In-person', 'WPEB 100', 2.0, '300', None),
+    ]}
+    connection = FakeCourseConnection(None)
+    connection.cursor = lambda *args, **kwargs: FakeCatalogCursor(data)
+    monkeypatch.setattr('src.backend.connectToDB', lambda: connection)
+    cache = CatalogCache()
+    cache.refresh()
+    catalog = cache.catalog
+    assert codes(catalog, {'rating': 4.0}) == ['CS 135']
+
+    data['ratingVersion'] = 6
+    data['summaries'] = [{'courseID': 1, 'averageRating': 4.2, 'frequentTags': 'Caring', 'ratingVersion': 4},
+                         {'courseID': 3, 'averageRating': 4.6, 'frequentTags': 'Tough grader, Caring', 'ratingVersion': 6}]
+    data['statements'] = []
+    cache.refresh()
+    assert cache.catalog is catalog
+    assert not any('tblCourseDetails' in statement for statement in data['statements'])
+    assert codes(catalog, {'rating': 4.0}) == ['CS 135', 'CS 302']
+    assert codes(catalog, {'keywords': ['tough grader']}) == ['CS 302']
+    assert catalog.search({'courseName': 'data structures'})[0]['frequentTags'] == ['Tough grader', 'Caring']
+    assert catalog.facets({})['tag'] == {'Caring': 2, 'Tough grader': 1}
+
+
+@pytest.fixture(scope="module")
+def suggestions():
+    courses = [
+        {'courseID': 1, 'courseCode': 'CS 135', 'courseName': 'Computer Science I'},
+        {'courseID': 2, 'courseCode': 'CS 302', 'courseName': 'Data Structures'},
+        {'courseID': 3, 'courseCode': 'CPE 301', 'courseName': 'Embedded Systems Design'},
+    ]
+    instructors = [{'instructorID': 7, 'FirstName': 'Erin', 'LastName': 'Keith'}]
+    return SuggestIndex(courses, instructors, 1)
+
+
+def labels(suggestions, text, limit=5):
+    return [item['label'] for item in suggestions.suggest(text, limit)]
+
+
+# test course code prefixes with and without the space
+def test_suggest_course_codes(suggestions):
+    assert labels(suggestions, 'cs 3') == ['CS 302 - Data Structures']
+    assert labels(suggestions, 'CS1') == ['CS 135 - Computer Science I']
+    assert labels(suggestions, 'c', 2) == ['CPE 301 - Embedded Systems Design', 'CS 135 - Computer Science I']
+
+
+# test course name words in any order and instructor names
+def test_suggest_names(suggestions):
+    assert labels(suggestions, 'struct') == ['CS 302 - Data Structures']
+    assert labels(suggestions, 'design embed') == ['CPE 301 - Embedded Systems Design']
+    assert labels(suggestions, 'kei') == ['Erin Keith']
+    assert labels(suggestions, '') == []
+
+
+@pytest.fixture(scope="module")
+def text_index():
+    index = TextIndex()
+    index.add({'courseID': 1, 'courseName': 'Computer Science I', 'description': 'Introduction to programming in C++.', 'Requirements': None})
+    index.add({'courseID': 2, 'courseName': 'Digital Design', 'description': 'Logic gates and circuits.', 'Requirements': 'CS 135'})
+    index.add({'courseID': 3, 'courseName': 'Data Structures', 'description': 'Lists, trees and graphs in programming.', 'Requirements': 'CS 135'})
+    index.add({'courseID': 4, 'courseName': 'Physics for Scientists', 'description': 'Mechanics.', 'Requirements': None})
+    return index
+
+
+# test course name matches outrank description matches and plurals match singulars
+def test_text_scores(text_index):
+    scores = text_index.scores('programming')
+    assert set(scores) == {1, 3}
+    scores = text_index.scores('structure of trees')
+    assert max(scores, key=scores.get) == 3
+    assert text_index.scores('quantum') == {}
+
+
+# test a course can be re-indexed after its text changes
+def test_text_update(text_index):
+    text_index.add({'courseID': 4, 'courseName': 'Quantum Physics', 'description': None, 'Requirements': None})
+    assert set(text_index.scores('quantum')) == {4}
+    assert set(text_index.scores('mechanics')) == set()
+
+
+class FakeCourseCursor:
+    def __init__(self, courses):
+        self.courses = courses
+
+    def execute(self, operation, params=None):
+        self.courses.statements.append(operation)
+        if 'COUNT(*)' in operation:
+            self.rows = [{'courses': len(self.courses)}]
+        elif 'updatedAt' not in operation:
+            self.rows = [{'courseID': course['courseID']} for course in self.courses]
+        else:
+            self.rows = [course for course in self.courses if params is None or course['updatedAt'] >= params[0]]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeCourseConnection:
+    def __init__(self, courses):
+        self.courses = courses
+
+    def cursor(self, *args, **kwargs):
+        return FakeCourseCursor(self.courses)
+
+    def close(self):
+        pass
+
+
+# tblCourses rows that also record the statements run against them
+class FakeCourses(list):
+    def __init__(self, courses):
+        super().__init__(courses)
+        self.statements = []
+
+
+# test refreshes swap in a new index and drop deleted courses, checks without changes keep the index
+def test_text_search_cache(monkeypatch):
+    courses = FakeCourses([
+        {'courseID': 1, 'courseName': 'Operating Systems', 'description': None, 'Requirements': None, 'updatedAt': datetime(2026, 1, 1)},
+        {'courseID': 2, 'courseName': 'Systems Programming', 'description': None, 'Requirements': None, 'updatedAt': datetime(2026, 1, 1)},
+    ])
+    monkeypatch.setattr('src.backend.connectToDB', lambda: FakeCourseConnection(courses))
+    cache = TextSearchCache()
+    assert set(cache.scores('systems')) == {1, 2}
+    first = cache.index
+
+    #nothing changed, the courses at the last updatedAt are not indexed again and no ID scan runs
+    courses.statements = []
+    cache.checked_at = 0
+    assert set(cache.scores('systems')) == {1, 2}
+    assert cache.index is first
+    assert 'SELECT courseID FROM tblCourses' not in courses.statements
+
+    #a course added in the same second is still found
+    courses.append({'courseID': 3, 'courseName': 'Distributed Systems', 'description': None, 'Requirements': None, 'updatedAt': datetime(2026, 1, 1)})
+    cache.checked_at = 0
+    assert set(cache.scores('systems')) == {1, 2, 3}
+    second = cache.index
+
+    del courses[1]
+    cache.checked_at = 0
+    assert set(cache.scores('systems')) == {1, 3}
+    assert cache.index is not second
+    assert set(second.scores('systems')) == {1, 2, 3}
+
+
+class FakeSuggestCursor:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self, operation, params=None):
+        approved = [row for row in self.data['instructors'] if row['approval_status'] == 'approved']
+        if 'catalogVersion' in operation:
+            self.rows = [{'catalogVersion': self.data['version'], 'instructors': len(approved),
+                          'instructorSum': sum(row['instructorID'] for row in approved)}]
+        elif 'tblInstructor' in operation:
+            self.rows = approved if "approval_status = 'approved'" in operation else self.data['instructors']
+        else:
+            self.rows = self.data['courses']
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+# test suggestions only list approved instructors and rebuild when one is approved, without the catalog
+def test_suggest_cache(monkeypatch):
+    data = {'version': 1, 'courses': [{'courseID': 1, 'courseCode': 'CS 135', 'courseName': 'Computer Science I'}],
+            'instructors': [{'instructorID': 7, 'FirstName': 'Erin', 'LastName': 'Keith', 'approval_status': 'approved'},
+                            {'instructorID': 8, 'FirstName': 'Eric', 'LastName': 'Pending', 'approval_status': 'pending'}]}
+    connection = FakeCourseConnection(None)
+    connection.cursor = lambda *args, **kwargs: FakeSuggestCursor(data)
+    monkeypatch.setattr('src.backend.connectToDB', lambda: connection)
+    monkeypatch.setattr('src.backend.catalog_cache.get', lambda: pytest.fail("suggestions refreshed the catalog"))
+    cache = SuggestCache()
+    assert labels(cache.get(), 'eri') == ['Erin Keith']
+    first = cache.get()
+
+    data['instructors'][1]['approval_status'] = 'approved'
+    cache.checked_at = 0
+    assert labels(cache.get(), 'eri') == ['Eric Pending', 'Erin Keith']
+    assert cache.get() is not first
+
+
+# test text search combined with filters is ordered by relevance and pages with the score in the cursor
+def test_text_search(catalog):
+    scores = {3: 2.5, 1: 1.0, 2: 1.0}
+    assert codes(catalog, {'q': scores}) == ['CS 302', 'CS 135', 'CPE 201']
+    assert codes(catalog, {'q': scores, 'query': 'computer s'}) == ['CS 302', 'CS 135']
+    page, next_cursor, total = catalog.search_page({'q': scores}, None, 2)
+    assert [course['courseCode'] for course in page] == ['CS 302', 'CS 135']
+    assert next_cursor[0] == 1.0
+    page, next_cursor, total = catalog.search_page({'q': scores}, list(next_cursor), 2)
+    assert [course['courseCode'] for course in page] == ['CPE 201']
+    assert next_cursor is None
@@ -0,0 +1,46 @@
+# Course Compass
+# Unit tests for the degree progress lookup
+
+from src.backend import User, fetch_degree_progress
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = results
+        self.statements = []
+
+    def execute(self, operation, params=None):
+        self.statements.append(operation)
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+
+# test the summary row is read with one lookup
+def test_progress_row():
+    cursor = FakeCursor([(120, 45, 15, 5, 6, 3, 1, 0, 37.5)])
+    progress = fetch_degree_progress(cursor, User(studentID=7, majorID=100))
+    assert progress['completedCredits'] == 45
+    assert progress['courses200'] == 6
+    assert progress['percentComplete'] == 37.5
+    assert len(cursor.statements) == 1
+
+
+# test a student without a row yet is summed from their completed courses
+def test_progress_without_row():
+    cursor = FakeCursor([None, (120, 9, 3, 2, 1, 0, 0, 0)])
+    progress = fetch_degree_progress(cursor, User(studentID=8, majorID=100))
+    assert progress['creditsReq'] == 120
+    assert progress['completedCredits'] == 9
+    assert progress['courses100'] == 2
+    assert progress['percentComplete'] == 7.5
+    assert 'tblUserCompletedCourses' in cursor.statements[1]
+
+
+# test a user without a student row starts at zero
+def test_progress_without_student():
+    cursor = FakeCursor([None, None])
+    progress = fetch_degree_progress(cursor, User(studentID=9, majorID=100))
+    assert progress['creditsReq'] == 0
+    assert progress['completedCourses'] == 0
+    assert progress['percentComplete'] == 0.0
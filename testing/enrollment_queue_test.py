@@ -0,0 +1,27 @@
+# Course Compass
+# Unit tests for the enrollment admission queue
+
+import time
+import threading
+from src.backend import app, EnrollmentQueue
+
+
+# test a ticket stays pollable for the full TTL after a slow enrollment finishes
+def test_result_ttl_restarts(monkeypatch):
+    release = threading.Event()
+    def enroll(studentID, schedule_ids):
+        release.wait(5)
+        return ({"message": "Courses added"}, 200)
+    monkeypatch.setattr('src.backend.enroll_student', enroll)
+    monkeypatch.setitem(app.config, 'ENROLL_WORKERS', 1)
+    monkeypatch.setitem(app.config, 'ENROLL_RESULT_TTL', 0.2)
+
+    enrollment = EnrollmentQueue()
+    job = enrollment.submit(7, [1, 2])
+    time.sleep(0.3)
+    release.set()
+    assert job['done'].wait(5)
+    assert enrollment.get(job['ticket'])['result'] == ({"message": "Courses added"}, 200)
+
+    time.sleep(0.3)
+    assert enrollment.get(job['ticket']) is None
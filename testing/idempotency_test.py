@@ -0,0 +1,85 @@
+# Course Compass
+# Unit tests for the Idempotency-Key handling of write endpoints
+
+import threading
+import pytest
+from flask import jsonify
+from src.backend import app, idempotent, IdempotencyStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    #no database, responses and claims stay in the process
+    store = IdempotencyStore()
+    monkeypatch.setattr(store, 'connect', lambda: None)
+    monkeypatch.setattr('src.backend.idempotency_store', store)
+    monkeypatch.setattr('src.backend.get_jwt_identity', lambda: {'email': 'student@unr.edu', 'userID': 7, 'role': 'Student'})
+    monkeypatch.setattr('src.backend.time.sleep', lambda seconds: None)
+    return store
+
+
+def post(handler, body, key='key-1'):
+    with app.test_request_context('/enrollCourses', method='POST', json=body, headers={'Idempotency-Key': key}):
+        response = app.make_response(handler())
+        return response.status_code, response.get_json(), response.headers
+
+
+# test a retry with the same key and body gets the first response without running the handler again
+def test_replay(store):
+    calls = []
+    @idempotent
+    def handler():
+        calls.append(1)
+        return jsonify({"message": "Courses added", "call": len(calls)}), 200
+
+    assert post(handler, {'scheduleIDs': [1, 2]})[:2] == (200, {"message": "Courses added", "call": 1})
+    status, body, headers = post(handler, {'scheduleIDs': [1, 2]})
+    assert (status, body) == (200, {"message": "Courses added", "call": 1})
+    assert headers['Idempotent-Replayed'] == 'true'
+    assert len(calls) == 1
+
+    #a new key runs the handler again
+    assert post(handler, {'scheduleIDs': [1, 2]}, 'key-2')[1]['call'] == 2
+
+
+# test reusing a key for a different body is rejected
+def test_reused_key_different_body(store):
+    @idempotent
+    def handler():
+        return jsonify({"message": "Courses added"}), 200
+
+    assert post(handler, {'scheduleIDs': [1, 2]})[0] == 200
+    assert post(handler, {'scheduleIDs': [3]})[0] == 422
+
+
+# test a retry while the first request is still running gets a 409, and the result once it is done
+def test_in_progress(store):
+    started = threading.Event()
+    release = threading.Event()
+    @idempotent
+    def handler():
+        started.set()
+        release.wait(5)
+        return jsonify({"message": "Courses added"}), 200
+
+    first = []
+    thread = threading.Thread(target=lambda: first.append(post(handler, {'scheduleIDs': [1]})))
+    thread.start()
+    assert started.wait(5)
+    assert post(handler, {'scheduleIDs': [1]})[0] == 409
+
+    release.set()
+    thread.join(5)
+    assert first[0][0] == 200
+    assert post(handler, {'scheduleIDs': [1]})[2]['Idempotent-Replayed'] == 'true'
+
+
+# test server errors are not stored so the client can retry with the same key
+def test_server_error_not_stored(store):
+    statuses = [500, 200]
+    @idempotent
+    def handler():
+        return jsonify({"message": "done"}), statuses.pop(0)
+
+    assert post(handler, {'scheduleIDs': [1]})[0] == 500
+    assert post(handler, {'scheduleIDs': [1]})[0] == 200
@@ -0,0 +1,200 @@
+# Course Compass
+# Replays a registration rush against a running backend: every virtual student logs in,
+# searches the catalog and submits a cart of sections at the moment registration opens.
+# Reports throughput and latency per endpoint plus the lock waits and deadlocks of the run.
+#
+#   python testing/load_test/registration_rush.py --students 1000 --concurrency 100
+
+import argparse, json, os, random, sys, threading, time, uuid
+from collections import Counter, defaultdict
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from mysql.connector import connect, Error
+from seed_campus import LOAD_TEST_PASSWORD, MAJORS
+
+
+SEARCH_TERMS = [majorName for majorID, majorName, prefix, dept in MAJORS]
+STATUS_POLL_INTERVAL = 0.2
+
+
+def call(url, method='GET', body=None, headers=None, timeout=60):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    headers = dict(headers or {})
+    if data is not None:
+        headers['Content-Type'] = 'application/json'
+    started = time.perf_counter()
+    try:
+        with urlopen(Request(url, data=data, headers=headers, method=method), timeout=timeout) as response:
+            payload = response.read()
+            status = response.status
+    except HTTPError as err:
+        payload = err.read()
+        status = err.code
+    except (URLError, OSError) as err:
+        print(f"{method} {url}: {err}")
+        payload = b''
+        status = 0
+    return status, payload, time.perf_counter() - started
+
+
+class Results:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, status, elapsed):
+        with self.lock:
+            self.samples[endpoint].append(elapsed)
+            self.statuses[endpoint][status] += 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+# One virtual student, waits at the barrier so every student starts registering at once
+def student_session(args, email, cart, results, barrier, rng):
+    barrier.wait()
+    status, payload, elapsed = call(f"{args.url}/login", 'POST', {'email': email, 'password': args.password})
+    results.add('/login', status, elapsed)
+    if status != 200:
+        return
+    token = json.loads(payload)['access_token']
+    auth = {'Authorization': f"Bearer {token}"}
+
+    for _ in range(args.searches):
+        params = {'query': rng.choice(SEARCH_TERMS), 'term': args.term}
+        status, payload, elapsed = call(f"{args.url}/search-departments?{urlencode(params)}", headers=auth)
+        results.add('/search-departments', status, elapsed)
+
+    #a queued enrollment counts until its ticket has a result
+    headers = dict(auth, **{'Idempotency-Key': str(uuid.uuid4())})
+    status, payload, elapsed = call(f"{args.url}/enrollCourses", 'POST', {'scheduleIDs': cart}, headers)
+    while status == 202:
+        ticket = json.loads(payload)['ticket']
+        time.sleep(STATUS_POLL_INTERVAL)
+        status, payload, waited = call(f"{args.url}/enrollment-status/{ticket}", headers=auth)
+        elapsed += STATUS_POLL_INTERVAL + waited
+    results.add('/enrollCourses', status, elapsed)
+
+
+def lock_counters(cursor):
+    counters = {}
+    cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+    for name, value in cursor.fetchall():
+        counters[name] = int(value)
+    try:
+        cursor.execute("SELECT name, count FROM information_schema.INNODB_METRICS WHERE name IN ('lock_deadlocks', 'lock_timeouts')")
+        for name, value in cursor.fetchall():
+            counters[name] = int(value)
+    except Error as err:
+        print(err)
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registration rush against a backend seeded by seed_campus.py")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--host', default=os.environ.get('COURSECOMPASS_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default=os.environ.get('COURSECOMPASS_DB_USER', 'root'))
+    parser.add_argument('--db-password', default=os.environ.get('COURSECOMPASS_DB_PASSWORD', ''))
+    parser.add_argument('--database', default=os.environ.get('COURSECOMPASS_DB_NAME', 'cs425'))
+    parser.add_argument('--password', default=LOAD_TEST_PASSWORD, help="password of the seeded accounts")
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50, help="students registering at the same moment")
+    parser.add_argument('--searches', type=int, default=2, help="catalog searches per student before enrolling")
+    parser.add_argument('--cart', type=int, default=3, help="sections per enrollment request")
+    parser.add_argument('--hot-sections', type=int, default=30, help="carts are drawn from this many popular sections")
+    parser.add_argument('--term', default='Fall 2026')
+    parser.add_argument('--seed', type=int, default=38)
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    rng = random.Random(args.seed)
+    connection = connect(host=args.host, port=args.port, user=args.user, passwd=args.db_password, database=args.database)
+    cursor = connection.cursor()
+    cursor.execute("SELECT Email FROM tblStudents ORDER BY studentID LIMIT %s", (args.students,))
+    emails = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT scheduleID, courseCode FROM tblcourseSchedule WHERE availableSeats > 0 ORDER BY scheduleID")
+    sections = cursor.fetchall()
+    if not emails or len(sections) < args.cart:
+        print("Seed the database with seed_campus.py first")
+        sys.exit(1)
+
+    #popular sections take most of the carts so enrollments compete for the same rows
+    hot = rng.sample(sections, min(args.hot_sections, len(sections)))
+    carts = []
+    for _ in emails:
+        pool = hot if rng.random() < 0.8 else sections
+        cart = {}
+        for scheduleID, courseCode in rng.sample(pool, min(len(pool), args.cart * 2)):
+            cart.setdefault(courseCode, scheduleID)
+        carts.append(list(cart.values())[:args.cart])
+
+    before = lock_counters(cursor)
+    results = Results()
+    started = time.perf_counter()
+    for start in range(0, len(emails), args.concurrency):
+        wave = list(zip(emails, carts))[start:start + args.concurrency]
+        barrier = threading.Barrier(len(wave))
+        threads = [
+            threading.Thread(target=student_session, args=(args, email, cart, results, barrier, random.Random(rng.random())))
+            for email, cart in wave
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    duration = time.perf_counter() - started
+    after = lock_counters(cursor)
+
+    #every taken seat should belong to an enrollment row, sharded sections keep their seats in tblSeatCounterShards
+    connection.commit()
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM tblcourseSchedule cs
+        LEFT JOIN (SELECT scheduleID, COUNT(*) AS enrolled FROM tblUserSchedule GROUP BY scheduleID) us ON us.scheduleID = cs.scheduleID
+        WHERE cs.seatShards = 0 AND (cs.availableSeats < 0 OR cs.enrollmentTotal <> COALESCE(us.enrolled, 0))
+    """)
+    mismatched = cursor.fetchone()[0]
+    cursor.close()
+    connection.close()
+
+    report = {'students': len(emails), 'concurrency': args.concurrency, 'seconds': round(duration, 3), 'endpoints': {}}
+    total = 0
+    print(f"{len(emails)} students, {args.concurrency} at a time, {duration:.1f}s")
+    print(f"{'endpoint':<22}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses")
+    for endpoint, samples in results.samples.items():
+        total += len(samples)
+        row = {
+            'requests': len(samples),
+            'throughput': round(len(samples) / duration, 2),
+            'p50': round(percentile(samples, 0.50) * 1000, 1),
+            'p95': round(percentile(samples, 0.95) * 1000, 1),
+            'p99': round(percentile(samples, 0.99) * 1000, 1),
+            'max': round(max(samples) * 1000, 1),
+            'statuses': {str(status): count for status, count in sorted(results.statuses[endpoint].items())},
+        }
+        report['endpoints'][endpoint] = row
+        statuses = ', '.join(f"{status}: {count}" for status, count in row['statuses'].items())
+        print(f"{endpoint:<22}{row['requests']:>9}{row['throughput']:>9}{row['p50']:>9}{row['p95']:>9}{row['p99']:>9}{row['max']:>9}  {statuses}")
+    report['throughput'] = round(total / duration, 2)
+    report['locks'] = {name: after[name] - before.get(name, 0) for name in after}
+    report['mismatchedSections'] = mismatched
+    print(f"total {total} requests, {report['throughput']} req/s")
+    print(f"row lock waits {report['locks'].get('Innodb_row_lock_waits', 0)}, lock wait time {report['locks'].get('Innodb_row_lock_time', 0)} ms, "
+          f"deadlocks {report['locks'].get('lock_deadlocks', 'n/a')}, lock wait timeouts {report['locks'].get('lock_timeouts', 'n/a')}")
+    print(f"sections whose seat counts do not match their enrollments: {mismatched}")
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+# Course Compass
+# Benchmarks every route in backend.py through app.test_client() against a local database
+# seeded by seed_campus.py, one scale per run:
+#
+#   COURSECOMPASS_BENCH_SCALE=medium COURSECOMPASS_DB_HOST=127.0.0.1 COURSECOMPASS_DB_USER=root pytest testing/load_test
+#
+# Each route is called once to warm the caches, then BENCH_ROUNDS times. Statements per request,
+# median wall time and response bytes are compared with baselines/<scale>.json: a route fails when it
+# issues more statements, answers with another status, or its time or size grows by more than
+# COURSECOMPASS_BENCH_THRESHOLD (0.25 = 25%). COURSECOMPASS_BENCH_SAVE=1 writes a new baseline.
+# Without COURSECOMPASS_BENCH_SCALE only the route coverage check runs.
+
+import itertools, json, os, statistics, time, uuid
+from datetime import date
+import pytest
+from mysql.connector import connect
+from src.backend import app
+from seed_campus import seed_parser, seed_database, LOAD_TEST_PASSWORD, ADMIN_EMAIL
+
+
+SCALES = {
+    'small': ['--students', '200', '--instructors', '20', '--courses', '50', '--ratings', '500'],
+    'medium': ['--students', '2000', '--instructors', '120', '--courses', '300', '--ratings', '6000'],
+    'large': ['--students', '20000', '--instructors', '600', '--courses', '1500', '--ratings', '60000'],
+}
+BENCH_SCALE = os.environ.get('COURSECOMPASS_BENCH_SCALE')
+BENCH_THRESHOLD = float(os.environ.get('COURSECOMPASS_BENCH_THRESHOLD', '0.25'))
+BENCH_SAVE = os.environ.get('COURSECOMPASS_BENCH_SAVE') == '1'
+BENCH_ROUNDS = int(os.environ.get('COURSECOMPASS_BENCH_ROUNDS', '5'))
+BENCH_TIME_SLACK = 0.002 # seconds, keeps sub-millisecond routes from failing on noise
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Routes that delete the seeded accounts
+SKIPPED_ROUTES = {
+    ('/delete-account', 'DELETE'): "deletes the benchmark student",
+    ('/remove-instructor', 'POST'): "deletes an instructor account",
+}
+
+
+class RouteCase:
+    # path, json and query may be callables of the ids fixture, before runs ahead of every
+    # call and is neither timed nor counted
+    def __init__(self, rule, method='GET', role=None, path=None, json=None, query=None, before=None):
+        self.rule = rule
+        self.method = method
+        self.role = role
+        self.path = path or rule
+        self.json = json
+        self.query = query
+        self.before = before
+
+    def resolve(self, value, ids):
+        return value(ids) if callable(value) else value
+
+
+def enroll(client, ids, role, scheduleID):
+    client.post('/enrollCourses', json={'scheduleIDs': [scheduleID]}, headers=ids['auth'][role])
+
+
+def unenroll(client, ids, role, scheduleID):
+    client.post('/unenrollCourse', json={'scheduleID': scheduleID}, headers=ids['auth'][role])
+
+
+def create_custom_schedule(client, ids):
+    response = client.post('/createCustomSchedule', json={'title': f"Bench {uuid.uuid4().hex[:8]}", 'option': 'Custom'}, headers=ids['auth']['student'])
+    ids['deleteScheduleID'] = response.get_json()['schedule']['scheduleID']
+
+
+def insert_row(ids, query, params, key):
+    cursor = ids['db'].cursor()
+    cursor.execute(query, params)
+    ids[key] = cursor.lastrowid
+    cursor.close()
+
+
+ROUTE_CASES = [
+    RouteCase('/login', 'POST', json=lambda ids: {'email': ids['studentEmail'], 'password': LOAD_TEST_PASSWORD}),
+    RouteCase('/signup', 'POST', json=lambda ids: {
+        'firstname': 'Bench', 'lastname': 'Signup', 'dateOfBirth': '2004-01-01', 'email': f"signup-{uuid.uuid4().hex[:12]}@loadtest.edu",
+        'password': LOAD_TEST_PASSWORD, 'userType': 'Student', 'majorID': ids['majorName']}),
+    RouteCase('/resend_confirmation_email', 'POST', json=lambda ids: {'email': ids['studentEmail']}),
+    RouteCase('/login-verify', 'POST', json=lambda ids: {'email': ids['studentEmail'], 'password': LOAD_TEST_PASSWORD}),
+    RouteCase('/verify-email', query=lambda ids: {'email': ids['studentEmail'], 'token': 'benchmark'}),
+    RouteCase('/getUserInfo'),
+    RouteCase('/getUserSchedule', role='student'),
+    RouteCase('/createCustomSchedule', 'POST', 'student', json=lambda ids: {'title': f"Bench {uuid.uuid4().hex[:8]}", 'option': 'Custom'}),
+    RouteCase('/createCustomEvent', 'POST', 'student', json=lambda ids: {
+        'description': 'Work', 'color': 'blue', 'start': '6:00 PM', 'end': '8:00 PM', 'daysOfWeek': ['Monday'], 'scheduleID': ids['customScheduleID']}),
+    RouteCase('/getCustomSchedules', role='student'),
+    RouteCase('/deleteCustomSchedule/<int:schedule_id>', 'DELETE', 'student', path=lambda ids: f"/deleteCustomSchedule/{ids['deleteScheduleID']}",
+              before=lambda client, ids: create_custom_schedule(client, ids)),
+    RouteCase('/deleteCustomEvent/<int:event_id>', 'DELETE', 'student', path=lambda ids: f"/deleteCustomEvent/{ids['deleteEventID']}",
+              before=lambda client, ids: insert_row(ids, "INSERT INTO tblCustomEvents (scheduleID, description, color, startTime, endTime, daysOfWeek) VALUES (%s, 'Gym', 'red', '7:00 AM', '8:00 AM', 'Friday')",
+                                                   (ids['customScheduleID'],), 'deleteEventID')),
+    RouteCase('/enrollCourses', 'POST', 'student', json=lambda ids: {'scheduleIDs': [ids['scheduleID']]},
+              before=lambda client, ids: unenroll(client, ids, 'student', ids['scheduleID'])),
+    RouteCase('/getEnrolledCourses', role='student'),
+    RouteCase('/unenrollCourse', 'POST', 'student', json=lambda ids: {'scheduleID': ids['scheduleID']},
+              before=lambda client, ids: enroll(client, ids, 'student', ids['scheduleID'])),
+    RouteCase('/enrollment-status/<ticket>', role='student', path='/enrollment-status/benchmark'),
+    RouteCase('/getTags'),
+    RouteCase('/markCourseCompleted', 'POST', 'student', json=lambda ids: {
+        'courseCode': next(ids['completedCodes']), 'completed': True, 'review': 'Benchmark review', 'studentRating': 4, 'tags': ['Caring'], 'letterGrade': 'A'}),
+    RouteCase('/getUserCourseTags', role='student'),
+    RouteCase('/majors'),
+    RouteCase('/logout', 'POST'),
+    RouteCase('/check_login'),
+    RouteCase('/dashboard', role='student'),
+    RouteCase('/courses', role='student'),
+    RouteCase('/myaccount', role='student'),
+    RouteCase('/editprofile', 'POST', 'student', json={'firstname': 'Bench', 'lastname': 'Student'}),
+    RouteCase('/changepassword', 'POST', 'student', json={'newPassword': LOAD_TEST_PASSWORD}),
+    RouteCase('/getCourseProgress', role='student'),
+    RouteCase('/getCareerProgress', role='student'),
+    RouteCase('/search-departments', role='student', query=lambda ids: {'query': ids['majorName'], 'term': ids['term']}),
+    RouteCase('/search-suggest', role='student', query={'q': 'intro'}),
+    RouteCase('/generate-schedules', 'POST', 'student', json=lambda ids: {'courseCodes': ids['scheduleCodes'], 'term': ids['term']}),
+    RouteCase('/waitlist', 'POST', 'student', json=lambda ids: {'scheduleID': ids['fullScheduleID']},
+              before=lambda client, ids: client.delete(f"/waitlist/{ids['fullScheduleID']}", headers=ids['auth']['student'])),
+    RouteCase('/waitlist', 'GET', 'student'),
+    RouteCase('/waitlist/<int:schedule_id>', 'DELETE', 'student', path=lambda ids: f"/waitlist/{ids['fullScheduleID']}",
+              before=lambda client, ids: client.post('/waitlist', json={'scheduleID': ids['fullScheduleID']}, headers=ids['auth']['student'])),
+    RouteCase('/notifications'),
+    RouteCase('/notifications/create', 'POST', json=lambda ids: {
+        'announceDate': str(date.today()), 'createDate': str(date.today()), 'message': 'Benchmark notice', 'source': 'Admin'}),
+    RouteCase('/analytics/counts'),
+    RouteCase('/analytics/stored-data-counts'),
+    RouteCase('/pending-instructors'),
+    RouteCase('/approved-instructors'),
+    RouteCase('/archived-instructors'),
+    RouteCase('/archive-instructor', 'POST', json=lambda ids: {'email': ids['otherInstructorEmail']}),
+    RouteCase('/unarchive-instructor', 'POST', json=lambda ids: {'email': ids['otherInstructorEmail']}),
+    RouteCase('/reject-instructor', 'POST', json=lambda ids: {'email': ids['otherInstructorEmail']}),
+    RouteCase('/approve-instructor', 'POST', json=lambda ids: {'email': ids['otherInstructorEmail']}),
+    RouteCase('/getInstructors', role='admin'),
+    RouteCase('/assignInstructors', 'POST', 'admin', json=lambda ids: {'courseId': ids['otherScheduleID'], 'instructorIds': [ids['otherInstructorID']]},
+              before=lambda client, ids: client.post('/unassignInstructor', json={'courseId': ids['otherScheduleID'], 'instructorId': ids['otherInstructorID']}, headers=ids['auth']['admin'])),
+    RouteCase('/unassignInstructor', 'POST', 'admin', json=lambda ids: {'courseId': ids['otherScheduleID'], 'instructorId': ids['otherInstructorID']},
+              before=lambda client, ids: client.post('/assignInstructors', json={'courseId': ids['otherScheduleID'], 'instructorIds': [ids['otherInstructorID']]}, headers=ids['auth']['admin'])),
+    RouteCase('/updateOfficeHours', 'POST', 'instructor', json={'officeHours': 'TR 2:00 PM - 3:00 PM', 'officeLocation': 'SEM 201'}),
+    RouteCase('/getEnrolledStudents/<int:scheduleID>', role='instructor', path=lambda ids: f"/getEnrolledStudents/{ids['scheduleID']}"),
+    RouteCase('/saveStudentGrade', 'POST', 'instructor', json=lambda ids: {'studentID': ids['classmateID'], 'scheduleID': ids['scheduleID'], 'grade': next(ids['grades'])}),
+    RouteCase('/removeStudent', 'POST', 'instructor', json=lambda ids: {'studentID': ids['classmateID'], 'scheduleID': ids['scheduleID']},
+              before=lambda client, ids: enroll(client, ids, 'classmate', ids['scheduleID'])),
+    RouteCase('/instructor-courses/<email>', path=lambda ids: f"/instructor-courses/{ids['instructorEmail']}"),
+    RouteCase('/send-email', 'POST', json={'subject': 'Benchmark', 'to': 'Students', 'content': 'Benchmark email'}),
+    RouteCase('/outbound-emails'),
+    RouteCase('/active-notifs'),
+    RouteCase('/remove-active-notif', 'POST', json=lambda ids: {'notificationID': ids['notificationID']},
+              before=lambda client, ids: insert_row(ids, "INSERT INTO tblNotifications (announceDate, createDate, message, source, active) VALUES (CURDATE(), CURDATE(), 'Benchmark', 'Admin', TRUE)",
+                                                   (), 'notificationID')),
+    RouteCase('/active-notifications'),
+    RouteCase('/save-announcement', 'POST', 'instructor', json=lambda ids: {'date': str(date.today()), 'content': 'Benchmark announcement', 'courses': 'All'}),
+    RouteCase('/get-announcements', role='instructor'),
+    RouteCase('/delete-announcement', 'POST', 'instructor', json=lambda ids: {'date': str(date.today()), 'content': 'Benchmark delete'},
+              before=lambda client, ids: client.post('/save-announcement', json={'date': str(date.today()), 'content': 'Benchmark delete', 'courses': 'All'}, headers=ids['auth']['instructor'])),
+    RouteCase('/debug/sql', role='admin'),
+    RouteCase('/mail-outbox/status', role='admin'),
+    RouteCase('/semesters'),
+    RouteCase('/degree-progress', role='student'),
+    RouteCase('/reference-data/invalidate', 'POST', 'admin', json={'name': 'tags'}),
+]
+
+
+def case_id(case):
+    return f"{case.method} {case.rule}"
+
+
+# test every route has a benchmark or a reason it is skipped
+def test_every_route_is_benchmarked():
+    routes = {(rule.rule, method) for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    covered = {(case.rule, case.method) for case in ROUTE_CASES} | set(SKIPPED_ROUTES)
+    assert routes - covered == set()
+    assert covered - routes == set()
+
+
+@pytest.fixture(scope="module")
+def db():
+    if BENCH_SCALE not in SCALES:
+        pytest.skip("set COURSECOMPASS_BENCH_SCALE to small, medium or large to run the route benchmarks")
+    args = seed_parser().parse_args(SCALES[BENCH_SCALE] + [
+        '--host', app.config['DB_HOST'], '--user', app.config['DB_USER'],
+        '--password', app.config['DB_PASSWORD'], '--database', app.config['DB_NAME']
+    ])
+    seed_database(args)
+    connection = connect(host=args.host, port=args.port, user=args.user, passwd=args.password, database=args.database, autocommit=True)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(scope="module")
+def client(db):
+    app.config['TESTING'] = True
+    app.config['MAIL_OUTBOX_ENABLED'] = False #queued emails are never sent
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def ids(db, client):
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT cs.scheduleID, cs.courseCode, cs.Term, ci.instructorID, i.Email
+        FROM tblcourseSchedule cs
+        JOIN tblCourseInstructors ci ON ci.scheduleID = cs.scheduleID
+        JOIN tblInstructor i ON i.instructorID = ci.instructorID
+        WHERE cs.meetingFormat = 'In-person'
+        ORDER BY cs.scheduleID LIMIT 1
+    """)
+    section = cursor.fetchone()
+    cursor.execute("""
+        SELECT scheduleID FROM tblcourseSchedule
+        WHERE courseCode <> %s
+        ORDER BY meetingFormat = 'Online' DESC, scheduleID LIMIT 1
+    """, (section['courseCode'],))
+    full_section = cursor.fetchone()
+    cursor.execute("UPDATE tblcourseSchedule SET availableSeats = 0, enrollmentTotal = classCapacity WHERE scheduleID = %s", (full_section['scheduleID'],))
+    cursor.execute("SELECT instructorID, Email FROM tblInstructor WHERE instructorID <> %s ORDER BY instructorID LIMIT 1", (section['instructorID'],))
+    other_instructor = cursor.fetchone()
+    cursor.execute("SELECT MAX(scheduleID) AS scheduleID FROM tblcourseSchedule")
+    other_section = cursor.fetchone()
+    cursor.execute("SELECT DISTINCT courseCode FROM tblcourseSchedule ORDER BY courseCode")
+    course_codes = [row['courseCode'] for row in cursor.fetchall()]
+    cursor.execute("SELECT m.majorName FROM tblStudents s JOIN tblMajor m ON m.majorID = s.majorID WHERE s.studentID = 1")
+    major = cursor.fetchone()
+    cursor.close()
+
+    ids = {
+        'db': db,
+        'term': section['Term'],
+        'scheduleID': section['scheduleID'],
+        'fullScheduleID': full_section['scheduleID'],
+        'otherScheduleID': other_section['scheduleID'],
+        'instructorEmail': section['Email'],
+        'otherInstructorID': other_instructor['instructorID'],
+        'otherInstructorEmail': other_instructor['Email'],
+        'studentEmail': 'student1@loadtest.edu',
+        'classmateID': 2,
+        'majorName': major['majorName'],
+        'scheduleCodes': course_codes[:4],
+        'completedCodes': itertools.cycle(course_codes),
+        'grades': itertools.cycle(['A', 'B', 'C']),
+        'auth': {},
+    }
+    for role, email in [('student', ids['studentEmail']), ('classmate', 'student2@loadtest.edu'),
+                        ('instructor', ids['instructorEmail']), ('admin', ADMIN_EMAIL)]:
+        response = client.post('/login', json={'email': email, 'password': LOAD_TEST_PASSWORD})
+        ids['auth'][role] = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    enroll(client, ids, 'classmate', ids['scheduleID'])
+    response = client.post('/createCustomSchedule', json={'title': 'Benchmark events', 'option': 'Custom'}, headers=ids['auth']['student'])
+    ids['customScheduleID'] = response.get_json()['schedule']['scheduleID']
+    return ids
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    path = os.path.join(BASELINE_DIR, f"{BENCH_SCALE}.json")
+    measurements = {}
+    saved = {}
+    if os.path.exists(path):
+        with open(path) as baseline_file:
+            saved = json.load(baseline_file)
+    yield saved, measurements
+    if BENCH_SAVE and measurements:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, 'w') as baseline_file:
+            json.dump(dict(saved, **measurements), baseline_file, indent=2, sort_keys=True)
+
+
+# Statements the server has executed for clients, the SHOW itself counts as one
+def questions(db):
+    cursor = db.cursor()
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    count = int(cursor.fetchone()[1])
+    cursor.close()
+    return count
+
+
+def call(client, case, ids):
+    kwargs = {'headers': ids['auth'][case.role] if case.role else {}}
+    if case.json is not None:
+        kwargs['json'] = case.resolve(case.json, ids)
+    if case.query is not None:
+        kwargs['query_string'] = case.resolve(case.query, ids)
+    response = client.open(case.resolve(case.path, ids), method=case.method, **kwargs)
+    return response.status_code, len(response.get_data())
+
+
+# test each route against the baseline of the scale
+@pytest.mark.parametrize('case', ROUTE_CASES, ids=case_id)
+def test_route_benchmark(case, db, client, ids, baseline):
+    saved, measurements = baseline
+    times, statements = [], []
+    for attempt in range(BENCH_ROUNDS + 1):
+        if case.before:
+            case.before(client, ids)
+        before = questions(db)
+        started = time.perf_counter()
+        status, size = call(client, case, ids)
+        elapsed = time.perf_counter() - started
+        #the first call fills the caches
+        if attempt:
+            times.append(elapsed)
+            statements.append(questions(db) - before - 1)
+    result = {'status': status, 'statements': max(statements), 'seconds': round(statistics.median(times), 5), 'bytes': size}
+    measurements[case_id(case)] = result
+    print(f"{case_id(case)}: {result}")
+
+    expected = saved.get(case_id(case))
+    if BENCH_SAVE or not expected:
+        return
+    assert result['status'] == expected['status']
+    assert result['statements'] <= expected['statements'], f"{result['statements']} statements per request, baseline {expected['statements']}"
+    assert result['seconds'] <= expected['seconds'] * (1 + BENCH_THRESHOLD) + BENCH_TIME_SLACK, f"{result['seconds']}s, baseline {expected['seconds']}s"
+    assert result['bytes'] <= expected['bytes'] * (1 + BENCH_THRESHOLD), f"{result['bytes']} bytes, baseline {expected['bytes']}"
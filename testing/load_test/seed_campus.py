@@ -0,0 +1,298 @@
+# Course Compass
+# Builds a local copy of the cs425 database from the files in "db tables" and fills it
+# with a synthetic campus for load testing. The database is dropped and recreated on every run.
+#
+#   python testing/load_test/seed_campus.py --students 5000 --courses 400
+
+import argparse, os, random, re, sys, time
+from datetime import date, timedelta
+from mysql.connector import connect, Error
+from flask_bcrypt import generate_password_hash
+
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'db tables')
+LOAD_TEST_PASSWORD = 'LoadTest38!'
+ADMIN_EMAIL = 'admin@loadtest.edu'
+BATCH_SIZE = 1000
+
+# majorIDs match the set_majorName trigger
+MAJORS = [
+    (100, 'Computer Science', 'CS', 'Computer Science and Engineering'),
+    (200, 'Civil Engineering', 'CEE', 'Civil and Environmental Engineering'),
+    (300, 'Physics', 'PHYS', 'Physics'),
+    (400, 'Accounting', 'ACC', 'Accounting'),
+    (500, 'Chemistry', 'CHEM', 'Chemistry'),
+    (600, 'Finance', 'FIN', 'Finance'),
+    (700, 'Biology', 'BIOL', 'Biology'),
+    (800, 'Psychology', 'PSY', 'Psychology'),
+    (900, 'Business', 'BADM', 'Business Administration'),
+]
+
+TAGS = ['Caring', 'Tough grader', 'Lots of homework', 'Clear grading criteria', 'Inspirational',
+        'Group projects', 'Lecture heavy', 'Test heavy', 'Amazing lectures', 'Participation matters']
+
+TOPICS = ['Algorithms', 'Systems', 'Design', 'Analysis', 'Methods', 'Theory', 'Structures', 'Networks',
+          'Statistics', 'Modeling', 'Ethics', 'Mechanics', 'Accounting', 'Markets', 'Chemistry', 'Cognition']
+QUALIFIERS = ['Introduction to', 'Principles of', 'Applied', 'Advanced', 'Topics in', 'Foundations of', 'Computational']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn', 'Rowan', 'Parker']
+LAST_NAMES = ['Keith', 'Davis', 'Jones', 'Nguyen', 'Garcia', 'Smith', 'Patel', 'Kim', 'Lopez', 'Brown', 'Chen', 'Wilson']
+BUILDINGS = ['SEM', 'WPEB', 'AB', 'DMSC', 'PSAC', 'LME', 'MIKC']
+
+# meeting patterns and start minutes of a section
+MEETING_PATTERNS = [('Monday, Wednesday', 75), ('Tuesday, Thursday', 75), ('Monday, Wednesday, Friday', 50), ('Friday', 165)]
+START_MINUTES = [480, 570, 660, 750, 840, 930, 1020]
+
+# Columns the backend uses that sqlTables.sql does not create
+SCHEMA_DRIFT = [
+    """alter table tblUser
+        add role varchar(20),
+        add verified boolean default false,
+        add created_at timestamp default current_timestamp""",
+    """alter table tblInstructor
+        add FirstName varchar(75),
+        add LastName varchar(75),
+        add approval_status varchar(20)""",
+    """create table tblRoles(
+        roleID int primary key auto_increment,
+        userID int,
+        roleCode varchar(10),
+        title varchar(50)
+    )""",
+    "alter table tblCustomSchedules add userID int",
+    "alter table tblNotifications add active boolean default true",
+    """create table tblAnnouncements(
+        announcementID int primary key auto_increment,
+        Email varchar(150),
+        Date date,
+        Content text,
+        Courses text
+    )""",
+]
+
+
+# Split a file of "db tables" into statements, following delimiter blocks and skipping
+# comments and the "use case" calls between them
+def sql_statements(path, database):
+    with open(path) as sql_file:
+        text = re.sub(r'/\*.*?\*/', '', sql_file.read(), flags=re.S)
+    statements = []
+    delimiter = ';'
+    buffer = []
+    for line in text.split('\n'):
+        line = re.sub(r'--.*$', '', line)
+        stripped = line.strip()
+        if stripped.lower().startswith('delimiter '):
+            delimiter = stripped.split()[1]
+            continue
+        if not buffer and (not stripped or stripped.lower().startswith('call ')):
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buffer).strip()[:-len(delimiter)]
+            statements.append(statement.replace('cs425.', f'{database}.'))
+            buffer = []
+    if buffer:
+        statements.append('\n'.join(buffer).strip().replace('cs425.', f'{database}.'))
+    return statements
+
+
+def run_sql_file(cursor, name, database):
+    failed = 0
+    for statement in sql_statements(os.path.join(SQL_DIR, name), database):
+        try:
+            cursor.execute(statement)
+        except Error as err:
+            failed += 1
+            print(f"{name}: {err}")
+    return failed
+
+
+def insert_rows(connection, cursor, table, columns, rows):
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(query, rows[start:start + BATCH_SIZE])
+    connection.commit()
+    print(f"{table}: {len(rows)} rows")
+
+
+def clock(minute):
+    hour, minute = divmod(minute, 60)
+    return f"{(hour - 1) % 12 + 1}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+# Generate every table as lists of rows with explicit ids so rows can reference each other
+def generate_campus(args):
+    rng = random.Random(args.seed)
+    today = date.today()
+    campus = {}
+
+    campus['tblDepartment'] = (
+        ['deptID', 'deptName', 'deptDesc', 'officeLocation', 'officePhone', 'deptChair'],
+        [(n, dept, f"Department of {dept}", f"{rng.choice(BUILDINGS)} {rng.randint(100, 399)}", '775-555-0100', 'Chair')
+         for n, (majorID, majorName, prefix, dept) in enumerate(MAJORS, 1)]
+    )
+    campus['tblMajor'] = (
+        ['majorID', 'deptID', 'deptName', 'program', 'majorName', 'majorDesc', 'creditsReq'],
+        [(majorID, n, dept, 'B.S.', majorName, f"Bachelor of Science in {majorName}", 120)
+         for n, (majorID, majorName, prefix, dept) in enumerate(MAJORS, 1)]
+    )
+    campus['tblSemesters'] = (
+        ['semesterID', 'semesterName', 'startDate', 'endDate', 'regStartDate', 'regEndDate'],
+        [(1, args.term, today + timedelta(days=30), today + timedelta(days=140), today - timedelta(days=1), today + timedelta(days=29))]
+    )
+    campus['tblTags'] = (['tagID', 'tagName'], [(n, tag) for n, tag in enumerate(TAGS, 1)])
+
+    major_names = {majorID: majorName for majorID, majorName, prefix, dept in MAJORS}
+    password = generate_password_hash(LOAD_TEST_PASSWORD).decode('utf-8')
+    users, students, instructors = [], [], []
+    for n in range(1, args.instructors + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f"instructor{n}@loadtest.edu"
+        users.append((n, first, last, date(1970, 1, 1), email, password, 'Instructor', True))
+        deptID = rng.randint(1, len(MAJORS))
+        instructors.append((n, email, deptID, f"{rng.choice(BUILDINGS)} {rng.randint(100, 399)}", '775-555-0101', 'MW 1:00 PM - 2:00 PM', n, first, last, 'approved'))
+    for n in range(1, args.students + 1):
+        userID = args.instructors + n
+        email = f"student{n}@loadtest.edu"
+        users.append((userID, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), date(2004, 1, 1), email, password, 'Student', True))
+        majorID = rng.choice(MAJORS)[0]
+        students.append((n, userID, email, majorID, major_names[majorID], 0, rng.randint(0, 100), 'Full-time'))
+    adminID = args.instructors + args.students + 1
+    users.append((adminID, 'Campus', 'Admin', date(1980, 1, 1), ADMIN_EMAIL, password, 'Admin', True))
+    campus['tblAdmin'] = (['adminID', 'Fname', 'Lname', 'Email', 'deptID'], [(1, 'Campus', 'Admin', ADMIN_EMAIL, 1)])
+    campus['tblUser'] = (['userID', 'Fname', 'Lname', 'DOB', 'Email', 'Passwd', 'role', 'verified'], users)
+    campus['tblInstructor'] = (
+        ['instructorID', 'Email', 'deptID', 'officeLocation', 'phoneNum', 'officeHours', 'userID', 'FirstName', 'LastName', 'approval_status'],
+        instructors
+    )
+    campus['tblStudents'] = (['studentID', 'userID', 'Email', 'majorID', 'majorName', 'currentCredits', 'creditsEarned', 'enrollmentStatus'], students)
+
+    courses, course_majors, sections, course_instructors = [], [], [], []
+    codes = set()
+    scheduleID = 0
+    for courseID in range(1, args.courses + 1):
+        majorID, majorName, prefix, dept = rng.choice(MAJORS)
+        level = rng.choice([100, 200, 300, 400])
+        code = f"{prefix} {level + rng.randint(0, 99)}"
+        while code in codes:
+            code = f"{prefix} {level + rng.randint(0, 99)}"
+        codes.add(code)
+        topic = rng.choice(TOPICS)
+        name = f"{rng.choice(QUALIFIERS)} {topic}"
+        description = f"{name} for {majorName} students, covering {rng.choice(TOPICS).lower()} and {rng.choice(TOPICS).lower()}."
+        courses.append((courseID, code, name, description, 3, str(level), None))
+        course_majors.append((courseID, majorID))
+        for section in range(1, rng.randint(1, args.max_sections) + 1):
+            scheduleID += 1
+            days, length = rng.choice(MEETING_PATTERNS)
+            start = rng.choice(START_MINUTES)
+            online = rng.random() < args.online
+            capacity = rng.randint(args.min_capacity, args.max_capacity)
+            instructorID = rng.randint(1, args.instructors)
+            sections.append((
+                scheduleID, code, courseID, 1000 + section, today + timedelta(days=30), today + timedelta(days=140), args.term,
+                None if online else days, None if online else f"{start // 60:02d}:{start % 60:02d}:00",
+                None if online else f"{(start + length) // 60:02d}:{(start + length) % 60:02d}:00",
+                'TBA' if online else f"{clock(start)} - {clock(start + length)}",
+                'ONLINE' if online else f"{rng.choice(BUILDINGS)} {rng.randint(100, 399)}",
+                'Online' if online else 'In-person', 'Open', capacity, 0, capacity, 0, instructorID, 1
+            ))
+            course_instructors.append((scheduleID, instructorID))
+    campus['tblCourses'] = (['courseID', 'courseCode', 'courseName', 'description', 'Credits', 'Level', 'Requirements'], courses)
+    campus['tblCourseMajor'] = (['courseID', 'majorID'], course_majors)
+    campus['tblcourseSchedule'] = (
+        ['scheduleID', 'courseCode', 'courseID', 'Section', 'startDate', 'endDate', 'Term', 'meetingDays', 'startTime', 'endTime',
+         'meetingTimes', 'Location', 'meetingFormat', 'status', 'classCapacity', 'enrollmentTotal', 'availableSeats', 'waitList',
+         'instructorID', 'semesterID'],
+        sections
+    )
+    campus['tblCourseInstructors'] = (['scheduleID', 'instructorID'], course_instructors)
+
+    ratings, rating_tags = [], []
+    for ratingID in range(1, args.ratings + 1):
+        ratings.append((ratingID, rng.randint(1, args.courses), rng.randint(1, args.students), rng.randint(1, 5),
+                        'Synthetic rating', today - timedelta(days=rng.randint(0, 700))))
+        for tagID in rng.sample(range(1, len(TAGS) + 1), rng.randint(0, 3)):
+            rating_tags.append((ratingID, tagID))
+    campus['tblRatings'] = (['ratingID', 'courseID', 'studentID', 'rating', 'ratingText', 'ratingDate'], ratings)
+    campus['tblRatingTags'] = (['ratingID', 'tagID'], rating_tags)
+    return campus
+
+
+# Insert order, parents before the rows that reference them
+TABLE_ORDER = ['tblDepartment', 'tblMajor', 'tblSemesters', 'tblTags', 'tblUser', 'tblAdmin', 'tblInstructor', 'tblStudents', 'tblCourses',
+               'tblCourseMajor', 'tblcourseSchedule', 'tblCourseInstructors', 'tblRatings', 'tblRatingTags']
+
+
+def seed_parser():
+    parser = argparse.ArgumentParser(description="Seed a local database with a synthetic campus")
+    parser.add_argument('--host', default=os.environ.get('COURSECOMPASS_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default=os.environ.get('COURSECOMPASS_DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('COURSECOMPASS_DB_PASSWORD', ''))
+    parser.add_argument('--database', default=os.environ.get('COURSECOMPASS_DB_NAME', 'cs425'))
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--instructors', type=int, default=120)
+    parser.add_argument('--courses', type=int, default=300)
+    parser.add_argument('--max-sections', type=int, default=4, help="sections per course are between 1 and this")
+    parser.add_argument('--min-capacity', type=int, default=20)
+    parser.add_argument('--max-capacity', type=int, default=120)
+    parser.add_argument('--online', type=float, default=0.1, help="share of online sections")
+    parser.add_argument('--ratings', type=int, default=6000)
+    parser.add_argument('--term', default='Fall 2026')
+    parser.add_argument('--seed', type=int, default=38)
+    return parser
+
+
+# Drop and rebuild the database, raises mysql.connector.Error when a statement of the seed fails
+def seed_database(args):
+    if args.courses > len(MAJORS) * 400:
+        raise ValueError(f"at most {len(MAJORS) * 400} courses have distinct course codes")
+    if 'rds.amazonaws.com' in args.host:
+        raise ValueError("Refusing to drop a database on the production host")
+
+    started = time.time()
+    campus = generate_campus(args)
+    connection = connect(host=args.host, port=args.port, user=args.user, passwd=args.password)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS {args.database}")
+        cursor.execute(f"CREATE DATABASE {args.database}")
+        cursor.execute(f"USE {args.database}")
+        #tables in sqlTables.sql reference tables created further down
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        run_sql_file(cursor, 'sqlTables.sql', args.database)
+        for statement in SCHEMA_DRIFT:
+            cursor.execute(statement)
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        #triggers are created after the bulk insert so they do not refresh the catalog once per row
+        for table in TABLE_ORDER:
+            columns, rows = campus[table]
+            insert_rows(connection, cursor, table, columns, rows)
+
+        for name in ['views.sql', 'storedProcedures.sql', 'triggers.sql']:
+            run_sql_file(cursor, name, args.database)
+        cursor.execute("CALL RebuildCourseDetails()")
+        cursor.execute("CALL RebuildDegreeProgress()")
+        connection.commit()
+        print(f"Seeded {args.database} on {args.host} in {time.time() - started:.1f}s, every account uses the password {LOAD_TEST_PASSWORD}")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    parser = seed_parser()
+    args = parser.parse_args()
+    try:
+        seed_database(args)
+    except ValueError as err:
+        parser.error(str(err))
+    except Error as err:
+        print(err)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
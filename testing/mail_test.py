@@ -0,0 +1,204 @@
+# Course Compass
+# Unit tests for bulk email chunks and the outbox rate limit
+
+import json, smtplib, threading, time
+import pytest
+from src.backend import app, mail, outbox_message, mail_retry_delay, MailOutbox, MailRateLimiter
+
+
+# test a bulk chunk is addressed to the site and sent to the recipients as Bcc
+def test_bulk_message_uses_bcc():
+    row = {'recipients': json.dumps(['a@unr.edu', 'b@unr.edu']), 'subject': 'Finals', 'body': 'Good luck', 'html': None, 'bcc': 1}
+    msg = outbox_message(row)
+    assert msg.recipients == ["coursecompassunr@gmail.com"]
+    assert msg.bcc == ['a@unr.edu', 'b@unr.edu']
+    row['bcc'] = 0
+    assert outbox_message(row).recipients == ['a@unr.edu', 'b@unr.edu']
+
+
+# test the limiter lets a minute's worth of recipients through and then holds the next chunk back
+def test_rate_limiter(monkeypatch):
+    clock = [0.0]
+    waits = []
+    monkeypatch.setattr('src.backend.time.monotonic', lambda: clock[0])
+    def sleep(seconds):
+        waits.append(seconds)
+        clock[0] += seconds
+    monkeypatch.setattr('src.backend.time.sleep', sleep)
+    monkeypatch.setitem(app.config, 'MAIL_RATE_LIMIT', 60)
+    limiter = MailRateLimiter()
+    limiter.acquire(50)
+    limiter.acquire(10)
+    assert waits == []
+    limiter.acquire(30)
+    assert sum(waits) == 30
+
+
+class FakeOutbox:
+    """tblMailOutbox rows and the statements MailOutbox runs against them"""
+    def __init__(self, rows):
+        self.rows = rows
+        self.now = 1000
+        self.progress = []
+
+    def execute(self, cursor, operation, params):
+        if "SET status = 'sending'" in operation:
+            token, timeout, batch = params
+            due = [row for row in self.rows if row['status'] == 'queued' and row['nextAttemptAt'] <= self.now][:batch]
+            for row in due:
+                row.update(status='sending', claimToken=token, attempts=row['attempts'] + 1)
+            cursor.rowcount = len(due)
+        elif operation.strip().startswith('SELECT outboxID'):
+            cursor.rows = [dict(row) for row in self.rows if row['claimToken'] == params[0]]
+        elif "SET status = 'sent'" in operation:
+            self.row(params[-1]).update(status='sent', claimToken=None)
+        elif "SET status = 'failed'" in operation:
+            self.row(params[-1]).update(status='failed', claimToken=None, lastError=params[0])
+        elif "SET status = 'queued'" in operation:
+            self.row(params[-1]).update(status='queued', claimToken=None, lastError=params[0], nextAttemptAt=self.now + params[1])
+        elif 'tblOutboundEmails' in operation:
+            self.progress.append(params)
+
+    def row(self, outboxID):
+        return next(row for row in self.rows if row['outboxID'] == outboxID)
+
+
+class FakeOutboxCursor:
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, operation, params=()):
+        self.outbox.execute(self, operation, params)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeOutboxConnection:
+    def __init__(self, outbox):
+        self.outbox = outbox
+
+    def cursor(self, *args, **kwargs):
+        return FakeOutboxCursor(self.outbox)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSMTP:
+    """mail.connect() stand-in, failures maps a recipient to the exception sending to it raises"""
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send(self, message):
+        for recipient in message.send_to:
+            if recipient in self.failures:
+                raise self.failures[recipient]
+        self.sent.append(sorted(message.send_to))
+
+
+def outbox_row(outboxID, recipient, attempts=0, outboundEmailID=None):
+    return {'outboxID': outboxID, 'recipients': json.dumps([recipient]), 'subject': 'Finals', 'body': 'Good luck', 'html': None,
+            'bcc': 0, 'outboundEmailID': outboundEmailID, 'attempts': attempts, 'status': 'queued', 'nextAttemptAt': 0,
+            'claimToken': None, 'lastError': None}
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_RATE_LIMIT', 0)
+    monkeypatch.setitem(app.config, 'MAIL_OUTBOX_BATCH', 2)
+    fake = FakeOutbox([])
+    monkeypatch.setattr('src.backend.connectToDB', lambda: FakeOutboxConnection(fake))
+    return fake
+
+
+def connect_smtp(monkeypatch, smtp):
+    monkeypatch.setattr(mail, 'connect', lambda: smtp)
+
+
+# test refused recipients are retried with backoff, the rest of the batch and the next batch still go out
+def test_drain_retries_refused_recipient(monkeypatch, outbox):
+    outbox.rows += [outbox_row(1, 'a@unr.edu', outboundEmailID=9), outbox_row(2, 'b@unr.edu'), outbox_row(3, 'c@unr.edu')]
+    smtp = FakeSMTP({'b@unr.edu': smtplib.SMTPRecipientsRefused({'b@unr.edu': (550, b'No such user')})})
+    connect_smtp(monkeypatch, smtp)
+    assert MailOutbox().drain() == 2
+    assert smtp.sent == [['a@unr.edu'], ['c@unr.edu']]
+    assert [row['status'] for row in outbox.rows] == ['sent', 'queued', 'sent']
+    assert outbox.rows[1]['nextAttemptAt'] == outbox.now + mail_retry_delay(1)
+    assert outbox.progress == [(1, 0, 9)]
+
+
+# test an email that keeps failing is given up after MAIL_OUTBOX_MAX_ATTEMPTS and counted as failed
+def test_drain_gives_up(monkeypatch, outbox):
+    outbox.rows.append(outbox_row(1, 'b@unr.edu', attempts=app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] - 1, outboundEmailID=9))
+    connect_smtp(monkeypatch, FakeSMTP({'b@unr.edu': smtplib.SMTPRecipientsRefused({})}))
+    assert MailOutbox().drain() == 0
+    assert outbox.rows[0]['status'] == 'failed'
+    assert outbox.progress == [(0, 1, 9)]
+
+
+# test a dropped connection puts every claimed email back in the queue
+def test_drain_disconnected(monkeypatch, outbox):
+    outbox.rows += [outbox_row(1, 'a@unr.edu'), outbox_row(2, 'b@unr.edu')]
+    connect_smtp(monkeypatch, FakeSMTP({'a@unr.edu': smtplib.SMTPServerDisconnected('Connection unexpectedly closed')}))
+    assert MailOutbox().drain() == 0
+    assert [row['status'] for row in outbox.rows] == ['queued', 'queued']
+    assert [row['attempts'] for row in outbox.rows] == [1, 1]
+
+
+# test a database error while rescheduling leaves the batch claimed instead of escaping drain
+def test_drain_reschedule_fails(monkeypatch, outbox):
+    outbox.rows += [outbox_row(1, 'a@unr.edu'), outbox_row(2, 'b@unr.edu')]
+    connect_smtp(monkeypatch, FakeSMTP({'a@unr.edu': smtplib.SMTPServerDisconnected('Connection unexpectedly closed')}))
+    sender = MailOutbox()
+    def reschedule(connection, cursor, rows, error):
+        raise OSError('Lost connection to MySQL server during query')
+    monkeypatch.setattr(sender, 'reschedule', reschedule)
+    assert sender.drain() == 0
+    assert [row['status'] for row in outbox.rows] == ['sending', 'sending']
+
+
+# test a worker keeps running after a drain fails and dead workers are replaced
+def test_worker_survives_errors(monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_OUTBOX_ENABLED', True)
+    monkeypatch.setitem(app.config, 'MAIL_OUTBOX_WORKERS', 1)
+    sender = MailOutbox()
+    drains = []
+    drained = threading.Event()
+    def drain():
+        drains.append(1)
+        if len(drains) == 1:
+            raise OSError('Lost connection to MySQL server during query')
+        drained.set()
+        return 0
+    monkeypatch.setattr(sender, 'drain', drain)
+    sender.wake()
+    time.sleep(0.1)
+    sender.wake()
+    assert drained.wait(5)
+    assert sender.workers[0].is_alive()
+
+    dead = threading.Thread(target=lambda: None, name='mail-outbox-0')
+    dead.start()
+    dead.join()
+    sender.workers = [dead]
+    sender.start()
+    assert len(sender.workers) == 1 and sender.workers[0].is_alive()
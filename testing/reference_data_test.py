@@ -0,0 +1,51 @@
+# Course Compass
+# Unit tests for the cached reference data responses
+
+from src.backend import app, ReferenceData
+
+
+# test a client holding the current ETag gets a 304 until the data is invalidated
+def test_conditional_get(monkeypatch):
+    majors = ["Computer Science", "Biology"]
+    loads = []
+    #tblReferenceVersions shared by every process
+    versions = {'majors': 0}
+    def bump(names):
+        for name in names:
+            versions[name] += 1
+    monkeypatch.setattr('src.backend.bump_reference_versions', bump)
+    monkeypatch.setattr('src.backend.fetch_reference_rows', lambda query: [{'name': name, 'version': version} for name, version in versions.items()])
+    reference = ReferenceData()
+    other_process = ReferenceData()
+
+    @reference.loader('majors')
+    @other_process.loader('majors')
+    def load_majors():
+        loads.append(1)
+        return {"majors": sorted(majors)}
+
+    with app.test_request_context('/majors'):
+        response = reference.response('majors')
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert response.get_json() == {"majors": ["Biology", "Computer Science"]}
+        assert response.cache_control.max_age == app.config['REFERENCE_MAX_AGE']
+
+    with app.test_request_context('/majors', headers={'If-None-Match': etag}):
+        assert reference.response('majors').status_code == 304
+        assert other_process.response('majors').status_code == 304
+    assert len(loads) == 2
+
+    majors.append("Nursing")
+    reference.invalidate('majors')
+    with app.test_request_context('/majors', headers={'If-None-Match': etag}):
+        response = reference.response('majors')
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    assert len(loads) == 3
+
+    #another process sees the new version once REFERENCE_VERSION_CHECK passes
+    other_process.checked_at = 0
+    with app.test_request_context('/majors', headers={'If-None-Match': etag}):
+        assert other_process.response('majors').status_code == 200
+    assert len(loads) == 4
@@ -0,0 +1,72 @@
+# Course Compass
+# Unit tests for week masks and the schedule generator
+
+from src.backend import week_mask, dilate_mask, mask_to_bytes, mask_from_bytes, custom_event_mask, gap_mask, has_run, \
+    blocked_mask, ScheduleGenerator, SLOTS_PER_DAY
+
+
+# test a section sets one run of slots on each meeting day
+def test_week_mask():
+    mask = week_mask('Monday, Wednesday', 540, 615)
+    assert bin(mask).count('1') == 2 * 15
+    assert mask & week_mask('Wednesday', 600, 660)
+    assert not mask & week_mask('Tuesday, Thursday', 540, 615)
+    assert week_mask('Monday', None, None) == 0
+
+
+# test the 15 minute buffer, a gap of exactly 15 minutes is allowed
+def test_dilated_conflicts():
+    first = week_mask('Monday', 540, 615)
+    assert not dilate_mask(first) & week_mask('Monday', 630, 700)
+    assert dilate_mask(first) & week_mask('Monday', 625, 700)
+    assert dilate_mask(first) & week_mask('Monday', 480, 530)
+
+
+# test custom event times and stored masks round trip
+def test_custom_event_mask():
+    mask = custom_event_mask('Friday', '3:00 PM', '4:00 PM')
+    assert mask == week_mask('Friday', 900, 960)
+    assert mask >> 4 * SLOTS_PER_DAY == week_mask('Monday', 900, 960)
+    assert mask_from_bytes(mask_to_bytes(mask)) == mask
+
+
+def section(scheduleID, courseCode, days, start, end, rating=None, format='In-person', location='SEM 101'):
+    return {'scheduleID': scheduleID, 'courseCode': courseCode, 'mask': week_mask(days, start, end),
+            'averageRating': rating, 'format': format, 'Location': location}
+
+
+def schedule_ids(schedules):
+    return [sorted(section['scheduleID'] for section in sections) for score, gaps, sections in schedules]
+
+
+# test idle time is only counted between classes on the same day
+def test_gap_mask():
+    mask = week_mask('Monday', 540, 600) | week_mask('Monday', 660, 720) | week_mask('Tuesday', 540, 600)
+    assert bin(gap_mask(mask)).count('1') * 5 == 60
+    assert has_run(gap_mask(mask), 12)
+    assert not has_run(gap_mask(mask), 13)
+
+
+# test conflicting sections are never combined and higher rated sections rank first
+def test_generate_schedules():
+    courses = {
+        'CS 135': [section(1, 'CS 135', 'Monday, Wednesday', 540, 615, 4.0)],
+        'CS 202': [section(2, 'CS 202', 'Monday, Wednesday', 600, 675, 5.0),
+                   section(3, 'CS 202', 'Tuesday, Thursday', 540, 615, 3.0),
+                   section(4, 'CS 202', 'Monday, Wednesday', 630, 705, 2.0)],
+    }
+    assert schedule_ids(ScheduleGenerator(courses).generate()) == [[1, 3], [1, 4]]
+    assert schedule_ids(ScheduleGenerator(courses, limit=1).generate()) == [[1, 3]]
+
+
+# test days off, earliest start, preferences and the maximum gap
+def test_schedule_constraints():
+    courses = {
+        'CS 135': [section(1, 'CS 135', 'Monday', 540, 600), section(2, 'CS 135', 'Friday', 780, 840)],
+        'CS 202': [section(3, 'CS 202', 'Monday', 780, 840, format='Online'), section(4, 'CS 202', 'Friday', 540, 600)],
+    }
+    assert schedule_ids(ScheduleGenerator(courses, blocked_mask([4], None, None)).generate()) == [[1, 3]]
+    assert schedule_ids(ScheduleGenerator(courses, blocked_mask([], 600, None)).generate()) == [[2, 3]]
+    assert schedule_ids(ScheduleGenerator(courses, preferred_format='online', limit=1).generate()) == [[2, 3]]
+    assert schedule_ids(ScheduleGenerator(courses, max_gap=60).generate()) == [[1, 4], [2, 3]]
+    assert ScheduleGenerator(courses, blocked_mask([0, 4], None, None)).unavailable == ['CS 135', 'CS 202']
@@ -0,0 +1,35 @@
+# Course Compass
+# Unit tests for the semester calendar
+
+from datetime import date
+from src.backend import SemesterCalendar
+
+SEMESTERS = [
+    {'semesterID': 1, 'semesterName': 'Fall 2025', 'startDate': date(2025, 8, 25), 'regStartDate': date(2025, 4, 1), 'regEndDate': date(2025, 8, 29)},
+    {'semesterID': 2, 'semesterName': 'Spring 2026', 'startDate': date(2026, 1, 20), 'regStartDate': date(2025, 11, 3), 'regEndDate': date(2026, 1, 23)},
+    {'semesterID': 3, 'semesterName': 'Fall 2026', 'startDate': date(2026, 8, 24), 'regStartDate': date(2026, 4, 6), 'regEndDate': date(2026, 8, 28)},
+]
+
+
+# test the current semester is the last one started and the table is only read once
+def test_resolve(monkeypatch):
+    reads = []
+    def fetch(query):
+        if 'tblReferenceVersions' in query:
+            return [{'name': 'semesters', 'version': 0}]
+        reads.append(query)
+        return SEMESTERS
+    monkeypatch.setattr('src.backend.fetch_reference_rows', fetch)
+    calendar = SemesterCalendar()
+
+    resolved = calendar.resolve(date(2026, 3, 1))
+    assert (resolved['current'], resolved['next'], resolved['registrationOpen']) == (2, 3, [])
+    assert resolved['until'] == date(2026, 4, 6)
+
+    resolved = calendar.resolve(date(2026, 8, 24))
+    assert (resolved['current'], resolved['next'], resolved['registrationOpen']) == (2, 3, [3])
+    assert resolved['until'] == date(2026, 8, 25)
+
+    assert calendar.resolve(date(2026, 8, 25))['current'] == 3
+    assert calendar.resolve(date(2024, 1, 1))['current'] is None
+    assert len(reads) == 1
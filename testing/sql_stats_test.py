@@ -0,0 +1,42 @@
+# Course Compass
+# Unit tests for the per-request SQL statement counts
+
+from flask import g
+from src.backend import app, sql_pattern, PooledConnection, InstrumentedCursor, report_query_stats
+
+
+class FakeCursor:
+    def execute(self, operation, params=None):
+        self.statement = operation
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self, *args, **kwargs):
+        return FakeCursor()
+
+
+# test statements that only differ in their values share a pattern
+def test_sql_pattern():
+    assert sql_pattern("SELECT * FROM tblUser WHERE Email = %s") == sql_pattern("SELECT *  FROM tblUser\n WHERE Email = 'a@b.edu'")
+    assert sql_pattern("SELECT * FROM tblGrades WHERE studentID IN (%s, %s, %s) LIMIT 10") == "SELECT * FROM tblGrades WHERE studentID IN (?) LIMIT ?"
+    assert sql_pattern("INSERT INTO tblTags (tagName) VALUES (%s), (%s)") == "INSERT INTO tblTags (tagName) VALUES (?)"
+
+
+# test cursors opened during a request are counted and reported in Server-Timing
+def test_request_stats():
+    connection = PooledConnection(None, FakeConnection(), 0, True)
+    with app.test_request_context('/assignInstructors', method='POST'):
+        cursor = connection.cursor(dictionary=True)
+        assert isinstance(cursor, InstrumentedCursor)
+        for instructor_id in [4, 5, 6]:
+            cursor.execute("SELECT * FROM tblInstructor WHERE instructorID = %s", (instructor_id,))
+        cursor.execute("INSERT INTO tblCourseInstructors (scheduleID, instructorID) VALUES (%s, %s)", (1, 4))
+        stats = g.sql_stats
+        assert stats.count == 4
+        assert stats.repeated() == {"SELECT * FROM tblInstructor WHERE instructorID = ?": 3}
+        response = report_query_stats(app.response_class())
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+        assert 'desc="4 statements"' in response.headers['Server-Timing']
@@ -0,0 +1,78 @@
+# Course Compass
+# Unit tests for the cached user lookup behind get_current_user
+
+import pytest
+from src.backend import app, get_current_user, reference_data, user_cache, User
+
+
+# tblUser rows by email, with the shared cache versions
+class Accounts(dict):
+    pass
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    accounts = Accounts({'student@unr.edu': {'userID': 7, 'Fname': 'Erin', 'Lname': 'Keith', 'DOB': None, 'Email': 'student@unr.edu',
+                                    'role': 'Student', 'majorID': 100, 'majorName': 'Computer Science', 'studentID': 3, 'instructorID': None}})
+    monkeypatch.setattr('src.backend.User.fetch_user_data', staticmethod(lambda email: dict(accounts[email]) if email in accounts else None))
+    monkeypatch.setattr('src.backend.get_jwt_identity', lambda: {'email': 'student@unr.edu', 'userID': 7, 'role': 'Student', 'enriched': True})
+    #tblReferenceVersions shared by every process
+    accounts.versions = {'users': 0}
+    def bump(names):
+        for name in names:
+            accounts.versions[name] += 1
+    monkeypatch.setattr('src.backend.bump_reference_versions', bump)
+    monkeypatch.setattr('src.backend.fetch_reference_rows', lambda query: [{'name': name, 'version': version} for name, version in accounts.versions.items()])
+    monkeypatch.setattr(reference_data, 'checked_at', 0)
+    user_cache.clear()
+    yield accounts
+    user_cache.clear()
+
+
+# test a token of an account that was deleted no longer gives a user
+def test_deleted_account(accounts):
+    with app.test_request_context('/getUserSchedule'):
+        assert get_current_user().studentID == 3
+    del accounts['student@unr.edu']
+    user_cache.clear()
+    with app.test_request_context('/getUserSchedule'):
+        assert get_current_user() is None
+
+
+# test a token issued before a role change no longer gives a user
+def test_changed_role(accounts):
+    accounts['student@unr.edu']['role'] = 'Instructor'
+    with app.test_request_context('/getUserSchedule'):
+        assert get_current_user() is None
+
+
+# test profiles are cached between requests and dropped by invalidate
+def test_profile_cache(accounts, monkeypatch):
+    fetches = []
+    fetch = User.fetch_user_data
+    monkeypatch.setattr('src.backend.User.fetch_user_data', staticmethod(lambda email: fetches.append(email) or fetch(email)))
+    for request in range(2):
+        with app.test_request_context('/profile'):
+            assert User.get_user_by_email('student@unr.edu').majorID == 100
+    assert len(fetches) == 1
+
+    accounts['student@unr.edu']['majorID'] = 200
+    with app.test_request_context('/profile'):
+        User.invalidate('student@unr.edu')
+        assert User.get_user_by_email('student@unr.edu').majorID == 200
+    assert accounts.versions['users'] == 1
+
+
+# test a profile changed by another process is reloaded once the shared version is read again
+def test_invalidated_by_other_process(accounts, monkeypatch):
+    with app.test_request_context('/profile'):
+        assert User.get_user_by_email('student@unr.edu').majorID == 100
+
+    accounts['student@unr.edu']['majorID'] = 200
+    accounts.versions['users'] += 1
+    with app.test_request_context('/profile'):
+        assert User.get_user_by_email('student@unr.edu').majorID == 100
+
+    monkeypatch.setattr(reference_data, 'checked_at', 0)
+    with app.test_request_context('/profile'):
+        assert User.get_user_by_email('student@unr.edu').majorID == 200